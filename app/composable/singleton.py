@@ -17,7 +17,7 @@ def singleton(cls: type) -> t.Any:
 
 class SingletonMeta(type):
     _instance: dict[type, t.Any] = {}
-    _lock: threading.Lock = threading.Lock()
+    _lock: threading.RLock = threading.RLock()
 
     def __call__(cls, *args: t.Any, **kwargs: t.Any) -> t.Any:
         with cls._lock:
@@ -0,0 +1,45 @@
+import json
+import os
+import typing as t
+
+from .config import Config
+
+DEFAULT_FOLDER: str = ".cache"
+
+
+def cache_folder() -> str:
+    folder: str = Config().get("cache.folder", DEFAULT_FOLDER) or DEFAULT_FOLDER
+    folder = os.path.abspath(os.path.expanduser(folder))
+    os.makedirs(folder, exist_ok=True)
+    return folder
+
+
+def cache_path(name: str) -> str:
+    return os.path.join(cache_folder(), name)
+
+
+class JsonStore:
+    def __init__(self, path: str) -> None:
+        self.path: str = path
+
+    def load(self) -> dict[str, t.Any]:
+        if not os.path.exists(self.path):
+            return {}
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        return data if isinstance(data, dict) else {}
+
+    def dump(self, data: dict[str, t.Any], sync: bool = False) -> None:
+        folder: str = os.path.dirname(self.path)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        temp: str = f"{self.path}.tmp"
+        with open(temp, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+            if sync:
+                f.flush()
+                os.fsync(f.fileno())
+        os.replace(temp, self.path)
@@ -7,13 +7,13 @@ class GPUDevice:
     @staticmethod
     def have_nvidia_gpu() -> bool:
         shell: ShellRunner = ShellRunner()
-        ret = shell.run("nvidia-smi")
+        ret = shell.run(["nvidia-smi"])
         return ret.get("code") == 0
 
     @staticmethod
     def have_amd_gpu() -> bool:
         shell: ShellRunner = ShellRunner()
-        ret = shell.run("rocm-smi")
+        ret = shell.run(["rocm-smi"])
         return ret.get("code") == 0
 
     @staticmethod
@@ -1,25 +1,32 @@
+import asyncio
 import json
 import logging
 import os
 import re
+import shlex
+import shutil
+import threading
+import time
 import typing as t
 from abc import ABC
-from dataclasses import dataclass
+from dataclasses import asdict, dataclass, field, replace
 
 import pydash
 
+from app.composable.singleton import SingletonMeta
 from app.core.device import GPUDevice
 
-from .shell import IExecuteResult, ShellRunner
+from .cache import JsonStore, cache_path
+from .config import Config
+from .shell import Command, IExecuteResult, ShellRunner
 
 logger = logging.getLogger(__name__)
 
 
 def find_codecs(name: str) -> list[str]:
     shell = ShellRunner()
-    command = f"ffmpeg -{name}"
-    ret = shell.run(command)
-    outputs: list[str] = ret.get("stdout", "").split("\n")
+    ret = shell.run(["ffmpeg", "-hide_banner", f"-{name}"])
+    outputs: list[str] = (ret.get("stdout", "") or "").split("\n")
     index = next((i for i, s in enumerate(outputs) if "------" in s), -1)
     decoders = outputs[index + 1 :]
     pattern = re.compile(r"^.*?[A-Z\.]\s{1}(.*?)\s{1}", re.S)
@@ -30,40 +37,114 @@ def find_codecs(name: str) -> list[str]:
     return supported_decoders
 
 
-ENCODERS: list[str] = find_codecs("decoders")
-DECODERS: list[str] = find_codecs("encoders")
+@dataclass
+class Capabilities:
+    key: str = ""
+    encoders: list[str] = field(default_factory=list)
+    decoders: list[str] = field(default_factory=list)
+    have_nvidia_gpu: bool = False
+    have_amd_gpu: bool = False
 
+    @property
+    def have_gpu(self) -> bool:
+        return self.have_nvidia_gpu or self.have_amd_gpu
+
+
+class CapabilityRegistry(metaclass=SingletonMeta):
+    _binaries: t.ClassVar[tuple[str, ...]] = ("ffmpeg", "ffprobe")
+    _filename: t.ClassVar[str] = "capabilities.json"
+
+    def __init__(self) -> None:
+        self.lock: threading.Lock = threading.Lock()
+        self.path: str | None = None
+        self.capabilities: Capabilities | None = None
+
+    @property
+    def store(self) -> JsonStore:
+        return JsonStore(self.path or cache_path(self._filename))
+
+    def fingerprint(self) -> str:
+        items: list[str] = []
+        for name in self._binaries:
+            path: str | None = shutil.which(name)
+            if path is None:
+                items.append(f"{name}:missing")
+                continue
+            path = os.path.realpath(path)
+            items.append(f"{path}:{os.stat(path).st_mtime_ns}")
+        return "|".join(items)
+
+    def discover(self, key: str) -> Capabilities:
+        logger.info(f"Discovering ffmpeg capabilities <key = {key}>")
+        return Capabilities(
+            key=key,
+            encoders=find_codecs("encoders"),
+            decoders=find_codecs("decoders"),
+            have_nvidia_gpu=GPUDevice.have_nvidia_gpu(),
+            have_amd_gpu=GPUDevice.have_amd_gpu(),
+        )
+
+    def load(self) -> Capabilities:
+        with self.lock:
+            if self.capabilities is not None:
+                return self.capabilities
+            key: str = self.fingerprint()
+            store: JsonStore = self.store
+            data: dict[str, t.Any] = store.load()
+            if data.get("key") == key:
+                self.capabilities = Capabilities(**data)
+                return self.capabilities
+            self.capabilities = self.discover(key)
+            try:
+                store.dump(asdict(self.capabilities))
+            except OSError as e:
+                logger.warning(f"Capabilities not persisted <error = {e}>")
+            return self.capabilities
+
+    def invalidate(self) -> None:
+        with self.lock:
+            self.capabilities = None
+
+    @property
+    def encoders(self) -> list[str]:
+        return self.load().encoders
+
+    @property
+    def decoders(self) -> list[str]:
+        return self.load().decoders
+
+    @property
+    def have_nvidia_gpu(self) -> bool:
+        return self.load().have_nvidia_gpu
+
+    @property
+    def have_amd_gpu(self) -> bool:
+        return self.load().have_amd_gpu
+
+    @property
+    def have_gpu(self) -> bool:
+        return self.load().have_gpu
 
-class DecoderFinder:
-    _command: str = 'ffprobe -v quiet -of json -show_streams -show_format -i "{}"'
-    _have_nvidia_gpu: bool = GPUDevice.have_nvidia_gpu()
-    _have_amd_gpu: bool = GPUDevice.have_amd_gpu()
 
+class DecoderFinder:
     def __init__(self) -> None:
-        self.shell: ShellRunner = ShellRunner()
+        from .probe import Prober
+
+        self.registry: CapabilityRegistry = CapabilityRegistry()
+        self.prober: Prober = Prober()
 
     def defense(self, path: str) -> bool:
         return all([os.path.exists(path), not os.path.isdir(path)])
 
     def find_codec(self, path) -> str | None:
-        probe: FFProbe = FFProbe()
-        probe.option("v", "quiet")
-        probe.option("of", "json")
-        probe.option("show_streams")
-        probe.option("i", path)
-        command = probe.command
-
-        ret = self.shell.run(command, "gbk")
-        out = ret.get("stdout", "{}") or "{}"
-        shell_output = json.loads(out)
-        codec = pydash.get(shell_output, "streams.0.codec_name")
+        codec = pydash.get(self.prober.probe(path), "streams.0.codec_name")
         if not codec:
-            print(command)
+            logger.warning(f"Codec not found <from = {path}>")
             return None
         return codec
 
     def find_supported_coders(self, name: str) -> list[str]:
-        return [decoder for decoder in DECODERS if name in decoder]
+        return [decoder for decoder in self.registry.decoders if name in decoder]
 
     def find(self, path: str) -> str | None:
         if not self.defense(path):
@@ -75,7 +156,9 @@ class DecoderFinder:
         supp = self.find_supported_coders(codec)
 
         key = (
-            "cuvid" if self._have_nvidia_gpu else "amf" if self._have_amd_gpu else None
+            "cuvid"
+            if self.registry.have_nvidia_gpu
+            else "amf" if self.registry.have_amd_gpu else None
         )
         if key:
             for d in supp:
@@ -84,9 +167,131 @@ class DecoderFinder:
         return codec
 
 
+@dataclass
+class EncoderProfile:
+    name: str
+    hardware: bool = False
+    input_options: list[tuple[str, str]] = field(default_factory=list)
+    output_options: list[tuple[str, str]] = field(default_factory=list)
+
+
+YUV420P: tuple[str, str] = ("pix_fmt", "yuv420p")
+
+ENCODER_PROFILES: list[EncoderProfile] = [
+    EncoderProfile(
+        "h264_nvenc",
+        True,
+        [("hwaccel", "cuda")],
+        [YUV420P, ("preset", "p4"), ("cq", "23")],
+    ),
+    EncoderProfile(
+        "hevc_nvenc",
+        True,
+        [("hwaccel", "cuda")],
+        [YUV420P, ("preset", "p4"), ("cq", "28")],
+    ),
+    EncoderProfile(
+        "h264_qsv", True, [], [("preset", "faster"), ("global_quality", "23")]
+    ),
+    EncoderProfile(
+        "h264_vaapi",
+        True,
+        [("vaapi_device", "/dev/dri/renderD128")],
+        [("vf", "format=nv12,hwupload"), ("qp", "23")],
+    ),
+    EncoderProfile("h264_amf", True, [], [("quality", "speed")]),
+    EncoderProfile(
+        "libx264", False, [], [YUV420P, ("preset", "veryfast"), ("crf", "23")]
+    ),
+    EncoderProfile(
+        "libx265", False, [], [YUV420P, ("preset", "fast"), ("crf", "28")]
+    ),
+]
+
+
+def find_profile(name: str) -> EncoderProfile:
+    return next((p for p in ENCODER_PROFILES if p.name == name), EncoderProfile(name))
+
+
 class EncoderFinder:
+    _filename: t.ClassVar[str] = "encoders.json"
+    _source: t.ClassVar[str] = "testsrc2=size=1280x720:rate=30"
+
+    def __init__(self) -> None:
+        self.registry: CapabilityRegistry = CapabilityRegistry()
+        self.path: str | None = None
+        self.duration: float = Config().get("encoder.benchmark_duration", 2)
+        self.timeout: float = Config().get("encoder.benchmark_timeout", 30)
+
+    @property
+    def store(self) -> JsonStore:
+        return JsonStore(self.path or cache_path(self._filename))
+
+    def candidates(self) -> list[EncoderProfile]:
+        encoders: list[str] = self.registry.encoders
+        return [p for p in ENCODER_PROFILES if p.name in encoders]
+
+    def benchmark(self, profile: EncoderProfile) -> float | None:
+        ffmpeg: FFMpeg = FFMpeg()
+        ffmpeg.option("hide_banner")
+        for key, value in profile.input_options:
+            ffmpeg.option(key, value)
+        ffmpeg.option("f", "lavfi")
+        ffmpeg.option("i", self._source)
+        ffmpeg.option("t", str(self.duration))
+        ffmpeg.option("c:v", profile.name)
+        for key, value in profile.output_options:
+            ffmpeg.option(key, value)
+        ffmpeg.option("f", "null")
+        ffmpeg.option("y", "-")
+
+        start: float = time.perf_counter()
+        if ffmpeg.execute(ffmpeg.arguments, timeout=self.timeout)["code"] != 0:
+            return None
+        return time.perf_counter() - start
+
+    def matrix(self) -> dict[str, float | None]:
+        key: str = self.registry.load().key
+        store: JsonStore = self.store
+        data: dict[str, t.Any] = store.load()
+        if data.get("key") == key:
+            return data.get("results", {})
+
+        results: dict[str, float | None] = {}
+        for profile in self.candidates():
+            results[profile.name] = self.benchmark(profile)
+            logger.info(
+                f"Encoder benchmark <name = {profile.name}, "
+                f"seconds = {results[profile.name]}>"
+            )
+        try:
+            store.dump({"key": key, "results": results})
+        except OSError as e:
+            logger.warning(f"Encoder benchmark not persisted <error = {e}>")
+        return results
+
+    def select(self, name: str | None = None) -> EncoderProfile | None:
+        if not name or name == "auto":
+            name = Config().get("encoder.name", "auto") or "auto"
+        if name != "auto":
+            if name not in self.registry.encoders:
+                logger.error(f"Encoder not supported <name = {name}>")
+                return None
+            return find_profile(name)
+
+        working: dict[str, float] = {
+            k: v for k, v in self.matrix().items() if v is not None
+        }
+        if not working:
+            logger.error("No working encoder found")
+            return None
+        profile: EncoderProfile = find_profile(min(working, key=working.__getitem__))
+        logger.info(f"Encoder selected <name = {profile.name}>")
+        return profile
+
     def find(self, path: str) -> str:
-        return "h264_nvenc"
+        profile: EncoderProfile | None = self.select()
+        return profile.name if profile else "libx264"
 
 
 class MediaProcessor(ABC):
@@ -95,27 +300,68 @@ class MediaProcessor(ABC):
         self.options: list[tuple[str, str]] = []
 
     def option(self, key: str, value: str = "") -> t.Self:
-        if key in ("i", "y"):
-            value = f'"{value}"'
         self.options.append((key, value))
         return self
 
+    def build(self, options: list[tuple[str, str]]) -> str:
+        items: list[str] = [
+            f"{'-'+key+' ' if key else ''}{self.quote(key, value)}"
+            for key, value in options
+        ]
+        return f"{self.head} {' '.join(items)}"
+
+    def build_arguments(self, options: list[tuple[str, str]]) -> list[str]:
+        arguments: list[str] = [self.head]
+        for key, value in options:
+            if key:
+                arguments.append(f"-{key}")
+            if value:
+                arguments.append(value)
+        return arguments
+
+    @staticmethod
+    def quote(key: str, value: str) -> str:
+        return f'"{value}"' if key in ("i", "y") else value
+
     @property
     def command(self) -> str:
-        options: list[str] = [
-            f"{'-'+key+' ' if key else ''}{value}" for key, value in self.options
-        ]
-        return f"{self.head} {' '.join(options)}"
+        return self.build(self.options)
+
+    @property
+    def arguments(self) -> list[str]:
+        return self.build_arguments(self.options)
+
+    @staticmethod
+    def express(command: Command) -> str:
+        return command if isinstance(command, str) else shlex.join(command)
 
-    def execute(self, command: str, encoding: str = "utf-8") -> IExecuteResult:
+    def execute(
+        self, command: Command, encoding: str = "utf-8", timeout: float | None = None
+    ) -> IExecuteResult:
         shell: ShellRunner = ShellRunner()
-        ret = shell.run(command, encoding)
+        ret = shell.run(command, encoding, timeout)
         if ret["code"] != 0:
-            print(command)
+            logger.warning(
+                f"Command failed <code = {ret['code']}, command = {self.express(command)}>"
+            )
         return ret
 
-    def invoke(self) -> t.Any:
-        return self.execute(self.command)
+    def invoke(self, timeout: float | None = None) -> t.Any:
+        return self.execute(self.arguments, timeout=timeout)
+
+    async def execute_async(
+        self, command: Command, encoding: str = "utf-8", timeout: float | None = None
+    ) -> IExecuteResult:
+        shell: ShellRunner = ShellRunner()
+        ret = await shell.run_async(command, encoding, timeout)
+        if ret["code"] != 0:
+            logger.warning(
+                f"Command failed <code = {ret['code']}, command = {self.express(command)}>"
+            )
+        return ret
+
+    async def invoke_async(self, timeout: float | None = None) -> t.Any:
+        return await self.execute_async(self.arguments, timeout=timeout)
 
 
 class FFProbe(MediaProcessor):
@@ -123,9 +369,13 @@ class FFProbe(MediaProcessor):
         super().__init__()
         self.head = "ffprobe"
 
-    def invoke(self) -> dict[str, str]:
-        result = super().invoke()
-        return json.loads(result.get("stdout", "{}"))
+    def invoke(self, timeout: float | None = None) -> dict[str, str]:
+        result = super().invoke(timeout)
+        return json.loads(result.get("stdout", "{}") or "{}")
+
+    async def invoke_async(self, timeout: float | None = None) -> dict[str, str]:
+        result = await super().invoke_async(timeout)
+        return json.loads(result.get("stdout", "{}") or "{}")
 
 
 CODEC_TYPE = t.Literal["Decoder", "Encoder"]
@@ -133,22 +383,77 @@ CODECS = t.Literal["decoders", "encoders"]
 
 
 @dataclass
-class FFMpegProgressInfo:
+class ProgressEvent:
     this: "FFMpeg"
-    duration: str
-    current: str
-    percentage: float
+    frame: int = 0
+    fps: float = 0.0
+    bitrate: str = "N/A"
+    total_size: int = 0
+    out_time_us: int = 0
+    speed: float = 0.0
+    duration_us: int = 0
+    finished: bool = False
+
+    @staticmethod
+    def format_us(value: int) -> str:
+        seconds, micro = divmod(max(value, 0), 1_000_000)
+        minutes, seconds = divmod(seconds, 60)
+        hours, minutes = divmod(minutes, 60)
+        return f"{hours:02d}:{minutes:02d}:{seconds:02d}.{micro // 10_000:02d}"
+
+    @property
+    def current(self) -> str:
+        return self.format_us(self.out_time_us)
+
+    @property
+    def duration(self) -> str:
+        return self.format_us(self.duration_us)
+
+    @property
+    def percentage(self) -> float:
+        if self.finished:
+            return 100
+        if not self.duration_us:
+            return 0
+        return min(self.out_time_us / self.duration_us * 100, 100)
+
+
+def to_number(value: str, cast: t.Callable[[str], t.Any], default: t.Any = 0) -> t.Any:
+    try:
+        return cast(value.strip().rstrip("x"))
+    except ValueError:
+        return default
+
+
+class ProgressThrottle:
+    def __init__(self, interval: float = 0.5) -> None:
+        self.interval: float = interval
+        self.last: float = float("-inf")
+
+    def ready(self, event: ProgressEvent) -> bool:
+        now: float = time.monotonic()
+        if event.finished or now - self.last >= self.interval:
+            self.last = now
+            return True
+        return False
 
 
 class FFMpeg(MediaProcessor):
-    duration_pattern: re.Pattern = re.compile(r"Duration: (\d{2}:\d{2}:\d{2}\.\d{2})")
-    current_pattern: re.Pattern = re.compile(r"time=(\d{2}:\d{2}:\d{2}\.\d{2})")
+    duration_pattern: re.Pattern = re.compile(r"Duration: (\d{2}):(\d{2}):(\d{2}\.\d+)")
     file_pattern: re.Pattern = re.compile(r"""-i ["'](.*?)['"]""")
+    _progress_options: t.ClassVar[list[tuple[str, str]]] = [
+        ("progress", "pipe:1"),
+        ("nostats", ""),
+    ]
 
     def __init__(self) -> None:
         super().__init__()
         self.head: str = "ffmpeg"
         self.length_info: str = ""
+        self.duration_us: int = 0
+        self.throttle: ProgressThrottle = ProgressThrottle(
+            Config().get("ffmpeg.progress_interval", 0.5)
+        )
 
         self.progress_action: list = []
         self.after_action: list = []
@@ -159,45 +464,102 @@ class FFMpeg(MediaProcessor):
     def add_after(self, action) -> None:
         self.after_action.append(action)
 
-    def refine_info(self, line: str, info: FFMpegProgressInfo) -> None:
+    @property
+    def progress_command(self) -> str:
+        return self.build([*self._progress_options, *self.options])
 
-        if matched := self.duration_pattern.search(line):
-            info.duration = matched.group(1)
-        if matched := self.current_pattern.search(line):
-            info.current = matched.group(1)
+    @property
+    def progress_arguments(self) -> list[str]:
+        return self.build_arguments([*self._progress_options, *self.options])
+
+    def refine_info(self, line: str, event: ProgressEvent) -> bool:
+        key, sep, value = line.strip().partition("=")
+        if not sep or " " in key or "=" in value:
+            if not event.duration_us and (
+                matched := self.duration_pattern.search(line)
+            ):
+                hours, minutes, seconds = matched.groups()
+                total = int(hours) * 3600 + int(minutes) * 60 + float(seconds)
+                event.duration_us = round(total * 1_000_000)
+            return False
+
+        match key:
+            case "frame":
+                event.frame = to_number(value, int)
+            case "fps":
+                event.fps = to_number(value, float)
+            case "bitrate":
+                event.bitrate = value.strip()
+            case "total_size":
+                event.total_size = to_number(value, int)
+            case "out_time_us":
+                event.out_time_us = max(to_number(value, int, event.out_time_us), 0)
+            case "speed":
+                event.speed = to_number(value, float)
+            case "progress":
+                event.finished = value == "end"
+                return True
+        return False
+
+    def dispatch(self, event: ProgressEvent) -> None:
+        if not self.progress_action or not self.throttle.ready(event):
+            return
+        snapshot: ProgressEvent = replace(event)
+        for action in self.progress_action:
+            action(snapshot)
+
+    def execute(
+        self, command: Command, encoding: str = "utf-8", timeout: float | None = None
+    ) -> IExecuteResult:
+        shell: ShellRunner = ShellRunner()
 
-        trans_2_seconds = lambda x: sum(
-            float(x) * 60**i for i, x in enumerate(reversed(x.split(":")))
-        )
+        event = ProgressEvent(self, duration_us=self.duration_us)
 
-        duration_seconds = trans_2_seconds(info.duration)
-        current_seconds = trans_2_seconds(info.current)
-        info.percentage = (
-            (current_seconds / duration_seconds) * 100 if duration_seconds else 0
-        )
+        with shell.stream(command, encoding=encoding, timeout=timeout) as stream:
+            for line in stream:
+                if self.refine_info(line, event):
+                    self.dispatch(event)
+        for action in self.after_action:
+            action(self)
+        assert stream.result is not None
+        return stream.result
 
-    def execute(self, command, encoding="utf-8") -> IExecuteResult:
-        shell: ShellRunner = ShellRunner()
+    def invoke(self, timeout: float | None = None) -> IExecuteResult:
+        return self.execute(self.progress_arguments, timeout=timeout)
 
-        process = shell.open(command, encoding=encoding)
+    async def execute_async(
+        self, command: Command, encoding: str = "utf-8", timeout: float | None = None
+    ) -> IExecuteResult:
+        shell: ShellRunner = ShellRunner()
 
-        info = FFMpegProgressInfo(self, "00:00:00.00", "00:00:00.00", 0)
+        process = await shell.open_async(command)
+
+        event = ProgressEvent(self, duration_us=self.duration_us)
+
+        try:
+            async with asyncio.timeout(timeout):
+                assert process.stdout is not None
+                async for raw in process.stdout:
+                    if self.refine_info(raw.decode(encoding, "ignore"), event):
+                        self.dispatch(event)
+                await process.wait()
+        except TimeoutError:
+            await shell.terminate(process)
+            logger.warning(f"Command timeout <timeout = {timeout}, command = {command}>")
+            return {"code": process.returncode or -1, "stdout": "", "stderr": "timeout"}
+        except asyncio.CancelledError:
+            await shell.terminate(process)
+            raise
 
-        for line in process.stdout or []:
-            self.refine_info(line, info)
-            for action in self.progress_action:
-                action(info)
         for action in self.after_action:
             action(self)
-        process.wait()
-        return {
-            "code": process.returncode,
-            "stdout": str(process.stdout),
-            "stderr": str(process.stderr),
-        }
+        return {"code": t.cast(int, process.returncode), "stdout": "", "stderr": ""}
+
+    async def invoke_async(self, timeout: float | None = None) -> IExecuteResult:
+        return await self.execute_async(self.progress_arguments, timeout=timeout)
 
     @staticmethod
     def is_installed() -> bool:
         shell: ShellRunner = ShellRunner()
-        ret = shell.run("ffmpeg -version")
+        ret = shell.run(["ffmpeg", "-version"])
         return ret["code"] == 0
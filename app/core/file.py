@@ -1,3 +1,6 @@
+import contextlib
+import mmap
+import os
 import typing as t
 
 
@@ -5,3 +8,14 @@ class Reader:
     def read(self, path: str) -> str:
         with open(path, "r", encoding="utf-8") as f:
             return f.read()
+
+    @contextlib.contextmanager
+    def map(self, path: str) -> t.Iterator[bytes | mmap.mmap]:
+        with open(path, "rb") as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                yield b""
+                return
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+                if hasattr(buffer, "madvise") and hasattr(mmap, "MADV_SEQUENTIAL"):
+                    buffer.madvise(mmap.MADV_SEQUENTIAL)
+                yield buffer
@@ -1,12 +1,22 @@
 import logging
 import os
 import re
+import typing as t
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
 
+from .config import Config
+from .snapshot import StatCache
 
 logger = logging.getLogger(__name__)
 
+ScanResult: t.TypeAlias = tuple[list[os.DirEntry], list[tuple[str, int]]]
+
 
 class FileFinder:
+    def __init__(self, workers: int | None = None) -> None:
+        self.workers: int = workers or Config().get("finder.workers", 8)
+        self.cache: StatCache = StatCache()
+
     @staticmethod
     def determine_depth(path: str) -> int:
         if not path:
@@ -14,23 +24,94 @@ class FileFinder:
         normalized_path = os.path.normpath(path)
         return normalized_path.count(os.sep)
 
-    def find(self, path: str, depth: int = -1) -> list[str]:
-        result: list[str] = []
+    @staticmethod
+    def normalize(extensions: t.Iterable[str] | None) -> tuple[str, ...] | None:
+        if extensions is None:
+            return None
+        return tuple(e.lower() for e in extensions)
 
-        path = os.path.normpath(path)
+    def scan(
+        self, folder: str, level: int, depth: int, extensions: tuple[str, ...] | None
+    ) -> ScanResult:
+        files: list[os.DirEntry] = []
+        folders: list[tuple[str, int]] = []
+        names: list[str] | None = [] if self.cache.active else None
+        try:
+            with os.scandir(folder) as it:
+                for entry in it:
+                    if names is not None:
+                        names.append(entry.name)
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            if depth < 0 or level < depth:
+                                folders.append((entry.path, level + 1))
+                        elif extensions is None or entry.name.lower().endswith(
+                            extensions
+                        ):
+                            if entry.is_file():
+                                files.append(entry)
+                    except OSError:
+                        continue
+            if names is not None:
+                self.cache.seed(folder, names, files)
+        except OSError as e:
+            logger.debug(f"Scan failed <from = {folder}, error = {e}>")
+        return files, folders
 
+    def entries(
+        self,
+        path: str,
+        depth: int = -1,
+        extensions: t.Iterable[str] | None = None,
+    ) -> t.Iterator[os.DirEntry]:
+        exts: tuple[str, ...] | None = self.normalize(extensions)
+        if self.workers <= 1:
+            stack: list[tuple[str, int]] = [(path, 0)]
+            while stack:
+                files, folders = self.scan(*stack.pop(), depth, exts)
+                yield from files
+                stack.extend(reversed(folders))
+            return
+
+        with ThreadPoolExecutor(
+            max_workers=self.workers, thread_name_prefix="finder"
+        ) as executor:
+            pending: set[Future[ScanResult]] = {
+                executor.submit(self.scan, path, 0, depth, exts)
+            }
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    files, folders = future.result()
+                    for folder, level in folders:
+                        pending.add(
+                            executor.submit(self.scan, folder, level, depth, exts)
+                        )
+                    yield from files
+
+    def iter(
+        self,
+        path: str,
+        depth: int = -1,
+        extensions: t.Iterable[str] | None = None,
+    ) -> t.Iterator[str]:
+        path = os.path.normpath(path)
         if not os.path.exists(path):
-            return result
+            return
         logger.info(f"Collecting <from = {path}>")
         if os.path.isfile(path):
-            return [path]
-        for root, _, files in os.walk(path):
-            for file in files:
-                fp: str = os.path.join(root, file)
-                if depth > 0 and self.determine_depth(fp) > depth:
-                    continue
-                result.append(os.path.normpath(fp))
+            yield path
+            return
+        for entry in self.entries(path, depth, extensions):
+            yield os.path.normpath(entry.path)
 
+    def find(
+        self,
+        path: str,
+        depth: int = -1,
+        extensions: t.Iterable[str] | None = None,
+    ) -> list[str]:
+        result: list[str] = list(self.iter(path, depth, extensions))
         logger.info(f"Collected <files = {len(result)}>")
         return result
 
@@ -49,6 +130,8 @@ class FilePathCollapse:
 
     def do_windows_path(self, path: str, sep: str) -> str:
         driver_sep: str = ":"
+        if driver_sep not in path:
+            return self.do_python_module_path(path, sep)
         driver = path.split(driver_sep)[0]
         path = path.split(driver_sep)[1]
         names = path.split(sep)
@@ -0,0 +1,226 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+import typing as t
+from fractions import Fraction
+
+from app.composable.singleton import SingletonMeta
+
+from .cache import cache_path
+from .config import Config
+from .ffmpeg import FFProbe
+from .snapshot import StatCache
+
+try:
+    import av  # type: ignore
+except ImportError:
+    av = None
+
+logger = logging.getLogger(__name__)
+
+ProbeResult: t.TypeAlias = dict[str, t.Any]
+
+
+class ProbeBackend(t.Protocol):
+    name: str
+
+    def probe(self, path: str) -> ProbeResult: ...
+
+
+class SubprocessProbeBackend:
+    name: str = "ffprobe"
+
+    def probe(self, path: str) -> ProbeResult:
+        probe: FFProbe = FFProbe()
+        probe.option("v", "quiet")
+        probe.option("of", "json")
+        probe.option("show_streams")
+        probe.option("show_format")
+        probe.option("i", path)
+        ret = probe.execute(probe.arguments)
+        if ret["code"] != 0:
+            return {}
+        return json.loads(ret.get("stdout", "{}") or "{}")
+
+
+class PyAVProbeBackend:
+    name: str = "pyav"
+
+    @staticmethod
+    def is_available() -> bool:
+        return av is not None
+
+    @staticmethod
+    def seconds(value: int | None, time_base: Fraction | None) -> str | None:
+        if value is None or time_base is None:
+            return None
+        return f"{float(value * time_base):.6f}"
+
+    @staticmethod
+    def rate(value: Fraction | None) -> str:
+        if not value:
+            return "0/0"
+        return f"{value.numerator}/{value.denominator}"
+
+    def refine_stream(self, stream: t.Any) -> dict[str, t.Any]:
+        codec = stream.codec_context
+        ret: dict[str, t.Any] = {
+            "index": stream.index,
+            "codec_name": codec.name,
+            "codec_type": stream.type,
+            "profile": codec.profile,
+            "time_base": self.rate(stream.time_base),
+            "duration": self.seconds(stream.duration, stream.time_base),
+            "bit_rate": str(codec.bit_rate) if codec.bit_rate else None,
+            "tags": dict(stream.metadata),
+        }
+        if stream.type == "video":
+            ret["width"] = codec.width
+            ret["height"] = codec.height
+            ret["pix_fmt"] = codec.pix_fmt
+            ret["avg_frame_rate"] = self.rate(stream.average_rate)
+        elif stream.type == "audio":
+            ret["sample_rate"] = str(codec.sample_rate)
+            ret["channels"] = codec.channels
+            ret["channel_layout"] = codec.layout.name if codec.layout else None
+        return {k: v for k, v in ret.items() if v is not None}
+
+    def probe(self, path: str) -> ProbeResult:
+        with av.open(path) as container:
+            streams = [self.refine_stream(s) for s in container.streams]
+            time_base = Fraction(1, av.time_base)
+            fmt: dict[str, t.Any] = {
+                "filename": path,
+                "nb_streams": len(streams),
+                "format_name": container.format.name,
+                "duration": self.seconds(container.duration, time_base),
+                "size": str(os.path.getsize(path)),
+                "bit_rate": str(container.bit_rate) if container.bit_rate else None,
+                "tags": dict(container.metadata),
+            }
+        return {
+            "streams": streams,
+            "format": {k: v for k, v in fmt.items() if v is not None},
+        }
+
+
+class FallbackProbeBackend:
+    def __init__(self, primary: ProbeBackend, fallback: ProbeBackend) -> None:
+        self.primary: ProbeBackend = primary
+        self.fallback: ProbeBackend = fallback
+        self.name: str = f"{primary.name}+{fallback.name}"
+
+    def probe(self, path: str) -> ProbeResult:
+        try:
+            if data := self.primary.probe(path):
+                return data
+        except Exception as e:
+            logger.debug(f"Probe fallback <from = {path}, error = {e}>")
+        return self.fallback.probe(path)
+
+
+def create_backend(name: str | None = None) -> ProbeBackend:
+    name = name or Config().get("probe.backend", "auto")
+    if name == SubprocessProbeBackend.name or not PyAVProbeBackend.is_available():
+        return SubprocessProbeBackend()
+    if name == PyAVProbeBackend.name:
+        return PyAVProbeBackend()
+    return FallbackProbeBackend(PyAVProbeBackend(), SubprocessProbeBackend())
+
+
+class ProbeCache:
+    _filename: t.ClassVar[str] = "probe.sqlite3"
+    _schema: t.ClassVar[str] = (
+        "CREATE TABLE IF NOT EXISTS probe ("
+        "path TEXT PRIMARY KEY, size INTEGER NOT NULL, "
+        "mtime_ns INTEGER NOT NULL, data TEXT NOT NULL)"
+    )
+
+    def __init__(self, path: str | None = None) -> None:
+        self.path: str | None = path
+        self.lock: threading.Lock = threading.Lock()
+        self._connection: sqlite3.Connection | None = None
+
+    @property
+    def connection(self) -> sqlite3.Connection:
+        if self._connection is None:
+            self._connection = sqlite3.connect(
+                self.path or cache_path(self._filename), check_same_thread=False
+            )
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute(self._schema)
+        return self._connection
+
+    def get(self, path: str, size: int, mtime_ns: int) -> ProbeResult | None:
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT data FROM probe WHERE path = ? AND size = ? AND mtime_ns = ?",
+                (path, size, mtime_ns),
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def put(self, path: str, size: int, mtime_ns: int, data: ProbeResult) -> None:
+        with self.lock, self.connection:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO probe VALUES (?, ?, ?, ?)",
+                (path, size, mtime_ns, json.dumps(data, ensure_ascii=False)),
+            )
+
+    def invalidate(self, path: str) -> None:
+        with self.lock, self.connection:
+            self.connection.execute("DELETE FROM probe WHERE path = ?", (path,))
+
+    def clear(self) -> None:
+        with self.lock, self.connection:
+            self.connection.execute("DELETE FROM probe")
+
+    def close(self) -> None:
+        with self.lock:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
+
+
+class Prober(metaclass=SingletonMeta):
+    def __init__(self) -> None:
+        self.cache: ProbeCache = ProbeCache()
+        self.backend: ProbeBackend = create_backend()
+        self.refresh: bool = False
+        self.refreshed: set[str] = set()
+        self.lock: threading.Lock = threading.Lock()
+
+    def set_refresh(self, refresh: bool) -> t.Self:
+        self.refresh = refresh
+        self.refreshed.clear()
+        return self
+
+    def invoke(self, path: str) -> ProbeResult:
+        return self.backend.probe(path)
+
+    def should_refresh(self, path: str) -> bool:
+        with self.lock:
+            if not self.refresh or path in self.refreshed:
+                return False
+            self.refreshed.add(path)
+            return True
+
+    def probe(self, path: str) -> ProbeResult:
+        path = os.path.abspath(path)
+        stat: os.stat_result | None = StatCache().stat(path)
+        if stat is None:
+            return {}
+
+        if not self.should_refresh(path):
+            cached = self.cache.get(path, stat.st_size, stat.st_mtime_ns)
+            if cached is not None:
+                return cached
+
+        data: ProbeResult = self.invoke(path)
+        if data:
+            self.cache.put(path, stat.st_size, stat.st_mtime_ns, data)
+        return data
+
+    def forget(self, path: str) -> None:
+        self.cache.invalidate(os.path.abspath(path))
@@ -1,42 +1,323 @@
+import asyncio
 import locale
-from os import error
+import logging
+import os
+import shlex
+import signal
 import subprocess
+import threading
+import time
 import typing as t
+from collections import deque
+from dataclasses import dataclass
+
+logger = logging.getLogger(__name__)
+
+Command: t.TypeAlias = str | list[str]
+
+
+@dataclass
+class CommandMetrics:
+    program: str
+    spawn: float = 0.0
+    runtime: float = 0.0
+    code: int = 0
+    timed_out: bool = False
+    dropped: int = 0
+
 
 IExecuteResult = t.TypedDict(
-    "IExecuteResult", {"stdout": str, "stderr": str, "code": int}
+    "IExecuteResult",
+    {
+        "stdout": str,
+        "stderr": str,
+        "code": int,
+        "metrics": t.NotRequired[CommandMetrics],
+    },
 )
 
 
 _encoding = locale.getpreferredencoding()
 
+OUTPUT_LIMIT: int = 16 * 1024 * 1024
+STREAM_LIMIT: int = 64 * 1024
+NOT_FOUND: int = 127
+
+
+class RingBuffer:
+    def __init__(self, limit: int | None = OUTPUT_LIMIT) -> None:
+        self.limit: int | None = limit
+        self.chunks: deque[str] = deque()
+        self.size: int = 0
+        self.dropped: int = 0
+
+    def write(self, data: str) -> None:
+        self.chunks.append(data)
+        self.size += len(data)
+        while self.limit is not None and self.size > self.limit and self.chunks:
+            excess: int = self.size - self.limit
+            head: str = self.chunks[0]
+            if len(head) <= excess:
+                self.chunks.popleft()
+                excess = len(head)
+            else:
+                self.chunks[0] = head[excess:]
+            self.size -= excess
+            self.dropped += excess
+
+    def getvalue(self) -> str:
+        return "".join(self.chunks)
+
+
+class ProcessStream:
+    def __init__(
+        self,
+        runner: "ShellRunner",
+        command: Command,
+        encoding: str,
+        timeout: float | None = None,
+        limit: int | None = STREAM_LIMIT,
+    ) -> None:
+        self.runner: ShellRunner = runner
+        self.command: Command = command
+        self.encoding: str = encoding
+        self.timeout: float | None = timeout
+        self.buffer: RingBuffer = RingBuffer(limit)
+        self.process: subprocess.Popen | None = None
+        self.timer: threading.Timer | None = None
+        self.metrics: CommandMetrics = CommandMetrics(self.runner.program(command))
+        self.result: IExecuteResult | None = None
+        self.started: float = 0.0
+
+    def expire(self) -> None:
+        self.metrics.timed_out = True
+        if self.process is not None:
+            self.runner.kill(self.process)
+
+    def __enter__(self) -> t.Self:
+        self.started = time.perf_counter()
+        try:
+            self.process = self.runner.spawn(
+                self.command, self.encoding, subprocess.STDOUT
+            )
+        except OSError as e:
+            self.result = {"stdout": "", "stderr": str(e), "code": NOT_FOUND}
+            return self
+        self.metrics.spawn = time.perf_counter() - self.started
+        if self.timeout is not None:
+            self.timer = threading.Timer(self.timeout, self.expire)
+            self.timer.daemon = True
+            self.timer.start()
+        return self
+
+    def __iter__(self) -> t.Iterator[str]:
+        if self.process is None:
+            return
+        for line in self.process.stdout or []:
+            self.buffer.write(line)
+            yield line
+
+    def __exit__(self, exc_type: t.Any, *args: t.Any) -> None:
+        if self.process is None:
+            return
+        if exc_type is not None:
+            self.runner.kill(self.process)
+        self.process.wait()
+        if self.timer is not None:
+            self.timer.cancel()
+        if self.process.stdout is not None:
+            self.process.stdout.close()
+
+        self.metrics.runtime = time.perf_counter() - self.started
+        self.metrics.code = self.process.returncode
+        self.metrics.dropped = self.buffer.dropped
+        self.runner.record(self.metrics)
+        self.result = {
+            "stdout": self.buffer.getvalue(),
+            "stderr": "timeout" if self.metrics.timed_out else "",
+            "code": self.process.returncode,
+            "metrics": self.metrics,
+        }
+
 
 class ShellRunner:
-    def run(self, command: str, encoding: str | None = None) -> IExecuteResult:
-        encoding = encoding or _encoding
-        process = subprocess.run(
-            command,
-            shell=True,
+    history: t.ClassVar[deque[CommandMetrics]] = deque(maxlen=1024)
+
+    @staticmethod
+    def split(command: Command) -> list[str]:
+        if isinstance(command, list):
+            return command
+        return shlex.split(command, posix=os.name != "nt")
+
+    @classmethod
+    def program(cls, command: Command) -> str:
+        argv: list[str] = cls.split(command)
+        return os.path.basename(argv[0]) if argv else ""
+
+    @classmethod
+    def record(cls, metrics: CommandMetrics) -> None:
+        cls.history.append(metrics)
+        logger.debug(
+            f"Command <program = {metrics.program}, code = {metrics.code}, "
+            f"spawn = {metrics.spawn * 1000:.1f}ms, runtime = {metrics.runtime:.3f}s>"
+        )
+
+    @staticmethod
+    def group_options() -> dict[str, t.Any]:
+        if os.name == "nt":
+            return {"creationflags": subprocess.CREATE_NEW_PROCESS_GROUP}
+        return {"start_new_session": True}
+
+    @staticmethod
+    def signal(pid: int, sig: int) -> None:
+        try:
+            if os.name == "nt":
+                os.kill(pid, sig)
+            else:
+                os.killpg(pid, sig)
+        except (ProcessLookupError, PermissionError):
+            pass
+
+    def kill(self, process: subprocess.Popen) -> None:
+        if process.poll() is None:
+            self.signal(process.pid, getattr(signal, "SIGKILL", signal.SIGTERM))
+
+    def spawn(self, command: Command, encoding: str, stderr: int) -> subprocess.Popen:
+        return subprocess.Popen(
+            self.split(command),
+            stdin=subprocess.DEVNULL,
             stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            text=True,
+            stderr=stderr,
             encoding=encoding,
+            text=True,
             errors="replace",
+            **self.group_options(),
         )
+
+    @staticmethod
+    def pump(stream: t.Iterable[str] | None, buffer: RingBuffer) -> None:
+        for chunk in stream or []:
+            buffer.write(chunk)
+
+    def run(
+        self,
+        command: Command,
+        encoding: str | None = None,
+        timeout: float | None = None,
+        limit: int | None = OUTPUT_LIMIT,
+    ) -> IExecuteResult:
+        encoding = encoding or _encoding
+        metrics: CommandMetrics = CommandMetrics(self.program(command))
+        started: float = time.perf_counter()
+        try:
+            process = self.spawn(command, encoding, subprocess.PIPE)
+        except OSError as e:
+            return {"stdout": "", "stderr": str(e), "code": NOT_FOUND}
+        metrics.spawn = time.perf_counter() - started
+
+        stdout, stderr = RingBuffer(limit), RingBuffer(limit)
+        pumps: list[threading.Thread] = [
+            threading.Thread(target=self.pump, args=(process.stdout, stdout)),
+            threading.Thread(target=self.pump, args=(process.stderr, stderr)),
+        ]
+        with process:
+            for pump in pumps:
+                pump.start()
+            try:
+                process.wait(timeout)
+            except subprocess.TimeoutExpired:
+                metrics.timed_out = True
+                self.kill(process)
+                process.wait()
+            except BaseException:
+                self.kill(process)
+                raise
+            finally:
+                for pump in pumps:
+                    pump.join()
+
+        metrics.runtime = time.perf_counter() - started
+        metrics.code = process.returncode
+        metrics.dropped = stdout.dropped + stderr.dropped
+        self.record(metrics)
         return {
-            "stdout": process.stdout,
-            "stderr": process.stderr,
+            "stdout": stdout.getvalue(),
+            "stderr": "timeout" if metrics.timed_out else stderr.getvalue(),
             "code": process.returncode,
+            "metrics": metrics,
         }
 
-    def open(self, command: str, encoding: str | None = None) -> subprocess.Popen:
-        encoding = encoding or _encoding
-        return subprocess.Popen(
-            command,
-            shell=False,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.STDOUT,
-            encoding=encoding,
-            text=True,
-            errors="ignore",
+    def stream(
+        self,
+        command: Command,
+        encoding: str | None = None,
+        timeout: float | None = None,
+        limit: int | None = STREAM_LIMIT,
+    ) -> ProcessStream:
+        return ProcessStream(self, command, encoding or _encoding, timeout, limit)
+
+    def open(self, command: Command, encoding: str | None = None) -> subprocess.Popen:
+        return self.spawn(command, encoding or _encoding, subprocess.STDOUT)
+
+    async def open_async(self, command: Command) -> asyncio.subprocess.Process:
+        return await asyncio.create_subprocess_exec(
+            *self.split(command),
+            stdin=asyncio.subprocess.DEVNULL,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.STDOUT,
+            **self.group_options(),
         )
+
+    @classmethod
+    async def terminate(
+        cls, process: asyncio.subprocess.Process, grace: float = 5
+    ) -> None:
+        if process.returncode is not None:
+            return
+        cls.signal(process.pid, signal.SIGTERM)
+        try:
+            await asyncio.wait_for(process.wait(), grace)
+        except TimeoutError:
+            cls.signal(process.pid, getattr(signal, "SIGKILL", signal.SIGTERM))
+            await process.wait()
+
+    async def run_async(
+        self,
+        command: Command,
+        encoding: str | None = None,
+        timeout: float | None = None,
+    ) -> IExecuteResult:
+        encoding = encoding or _encoding
+        metrics: CommandMetrics = CommandMetrics(self.program(command))
+        started: float = time.perf_counter()
+        try:
+            process = await asyncio.create_subprocess_exec(
+                *self.split(command),
+                stdin=asyncio.subprocess.DEVNULL,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE,
+                **self.group_options(),
+            )
+        except OSError as e:
+            return {"stdout": "", "stderr": str(e), "code": NOT_FOUND}
+        metrics.spawn = time.perf_counter() - started
+
+        try:
+            stdout, stderr = await asyncio.wait_for(process.communicate(), timeout)
+        except TimeoutError:
+            await self.terminate(process)
+            metrics.timed_out = True
+            stdout, stderr = b"", b"timeout"
+        except asyncio.CancelledError:
+            await self.terminate(process)
+            raise
+
+        metrics.runtime = time.perf_counter() - started
+        metrics.code = t.cast(int, process.returncode)
+        self.record(metrics)
+        return {
+            "stdout": stdout.decode(encoding, errors="replace"),
+            "stderr": stderr.decode(encoding, errors="replace"),
+            "code": t.cast(int, process.returncode) or (-1 if metrics.timed_out else 0),
+            "metrics": metrics,
+        }
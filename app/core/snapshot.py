@@ -0,0 +1,125 @@
+import contextlib
+import logging
+import os
+import threading
+import typing as t
+
+from app.composable.singleton import SingletonMeta
+
+logger = logging.getLogger(__name__)
+
+StatEntry: t.TypeAlias = os.DirEntry | os.stat_result | None
+
+
+class StatCache(metaclass=SingletonMeta):
+    def __init__(self) -> None:
+        self.lock: threading.Lock = threading.Lock()
+        self.depth: int = 0
+        self.stats: dict[str, StatEntry] = {}
+        self.listings: dict[str, frozenset[str]] = {}
+        self.stale: set[str] = set()
+        self.hits: int = 0
+        self.misses: int = 0
+
+    @property
+    def active(self) -> bool:
+        return self.depth > 0
+
+    @staticmethod
+    def key(path: str) -> str:
+        return os.path.normcase(os.path.abspath(path))
+
+    @contextlib.contextmanager
+    def scope(self) -> t.Iterator[t.Self]:
+        with self.lock:
+            self.depth += 1
+        try:
+            yield self
+        finally:
+            with self.lock:
+                self.depth -= 1
+                if not self.depth:
+                    logger.info(
+                        f"StatCache <hits = {self.hits}, misses = {self.misses}>"
+                    )
+                    self.reset()
+
+    def reset(self) -> None:
+        self.stats.clear()
+        self.listings.clear()
+        self.stale.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def clear(self) -> None:
+        with self.lock:
+            self.stats.clear()
+            self.listings.clear()
+            self.stale.clear()
+
+    def seed(
+        self, folder: str, names: t.Iterable[str], files: t.Iterable[os.DirEntry]
+    ) -> None:
+        if not self.active:
+            return
+        with self.lock:
+            self.listings[self.key(folder)] = frozenset(
+                os.path.normcase(name) for name in names
+            )
+            for entry in files:
+                key: str = self.key(entry.path)
+                self.stats[key] = entry
+                self.stale.discard(key)
+
+    def invalidate(self, *paths: str) -> None:
+        if not self.active:
+            return
+        with self.lock:
+            for path in paths:
+                key: str = self.key(path)
+                self.stats.pop(key, None)
+                self.stale.add(key)
+
+    def lookup(self, key: str) -> tuple[bool, StatEntry]:
+        with self.lock:
+            if key in self.stats:
+                self.hits += 1
+                return True, self.stats[key]
+            if key not in self.stale:
+                folder, name = os.path.split(key)
+                listing: frozenset[str] | None = self.listings.get(folder)
+                if listing is not None and name not in listing:
+                    self.hits += 1
+                    return True, None
+            self.misses += 1
+            return False, None
+
+    def stat(self, path: str) -> os.stat_result | None:
+        if not self.active:
+            try:
+                return os.stat(path)
+            except OSError:
+                return None
+
+        key: str = self.key(path)
+        found, value = self.lookup(key)
+        if isinstance(value, os.DirEntry):
+            try:
+                return value.stat()
+            except OSError:
+                return None
+        if found:
+            return value
+
+        try:
+            value = os.stat(path)
+        except OSError:
+            value = None
+        with self.lock:
+            self.stats[key] = value
+        return value
+
+    def exists(self, path: str) -> bool:
+        if not self.active:
+            return os.path.exists(path)
+        return self.stat(path) is not None
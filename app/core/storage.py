@@ -0,0 +1,124 @@
+import logging
+import os
+import threading
+import typing as t
+
+from app.composable.singleton import SingletonMeta
+
+from .config import Config
+from .snapshot import StatCache
+
+logger = logging.getLogger(__name__)
+
+StorageKind: t.TypeAlias = t.Literal["ssd", "hdd", "network", "unknown"]
+
+NETWORK_FILESYSTEMS: frozenset[str] = frozenset(
+    {
+        "nfs",
+        "nfs4",
+        "cifs",
+        "smb3",
+        "smbfs",
+        "9p",
+        "afs",
+        "ceph",
+        "glusterfs",
+        "fuse.sshfs",
+        "fuse.rclone",
+    }
+)
+DEFAULT_LIMITS: dict[str, int] = {"ssd": 0, "hdd": 1, "network": 2, "unknown": 0}
+
+
+class Storage(metaclass=SingletonMeta):
+    _mountinfo: t.ClassVar[str] = "/proc/self/mountinfo"
+    _sysfs: t.ClassVar[str] = "/sys/dev/block"
+
+    def __init__(self) -> None:
+        self.lock: threading.Lock = threading.Lock()
+        self.kinds: dict[int, StorageKind] = {}
+        self.filesystems: dict[int, str] | None = None
+        self.limits: dict[str, int] = {
+            **DEFAULT_LIMITS,
+            **(Config().get("storage.limits", {}) or {}),
+        }
+        self.readahead: int = Config().get("storage.readahead", 64 * 1024 * 1024)
+
+    def read_filesystems(self) -> dict[int, str]:
+        filesystems: dict[int, str] = {}
+        try:
+            with open(self._mountinfo, "r", encoding="utf-8") as f:
+                for line in f:
+                    fields, _, rest = line.partition(" - ")
+                    major, _, minor = fields.split()[2].partition(":")
+                    filesystems[os.makedev(int(major), int(minor))] = rest.split()[0]
+        except (OSError, ValueError, IndexError):
+            pass
+        return filesystems
+
+    def rotational(self, dev: int) -> bool | None:
+        node: str = os.path.realpath(
+            os.path.join(self._sysfs, f"{os.major(dev)}:{os.minor(dev)}")
+        )
+        for folder in (node, os.path.dirname(node)):
+            try:
+                with open(os.path.join(folder, "queue", "rotational")) as f:
+                    return f.read().strip() == "1"
+            except OSError:
+                continue
+        return None
+
+    def classify(self, dev: int) -> StorageKind:
+        if self.filesystems is None:
+            self.filesystems = self.read_filesystems()
+        if self.filesystems.get(dev, "") in NETWORK_FILESYSTEMS:
+            return "network"
+        rotational: bool | None = self.rotational(dev)
+        if rotational is None:
+            return "unknown"
+        return "hdd" if rotational else "ssd"
+
+    def kind(self, dev: int) -> StorageKind:
+        with self.lock:
+            if dev not in self.kinds:
+                self.kinds[dev] = self.classify(dev)
+                logger.info(f"Storage <dev = {dev}, kind = {self.kinds[dev]}>")
+            return self.kinds[dev]
+
+    def limit(self, dev: int) -> int:
+        return self.limits.get(self.kind(dev), 0)
+
+    @staticmethod
+    def device(path: str) -> int | None:
+        path = os.path.abspath(path)
+        while True:
+            stat: os.stat_result | None = StatCache().stat(path)
+            if stat is not None:
+                return stat.st_dev
+            parent: str = os.path.dirname(path)
+            if parent == path:
+                return None
+            path = parent
+
+    def devices(self, *paths: str) -> tuple[int, ...]:
+        devices: list[int] = []
+        for path in paths:
+            dev: int | None = self.device(path)
+            if dev is not None and dev not in devices:
+                devices.append(dev)
+        return tuple(devices)
+
+    def advise(self, path: str) -> None:
+        if not self.readahead or not hasattr(os, "posix_fadvise"):
+            return
+        try:
+            fd: int = os.open(path, os.O_RDONLY)
+        except OSError:
+            return
+        try:
+            os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_SEQUENTIAL)
+            os.posix_fadvise(fd, 0, self.readahead, os.POSIX_FADV_WILLNEED)
+        except OSError as e:
+            logger.debug(f"Readahead hint failed <from = {path}, error = {e}>")
+        finally:
+            os.close(fd)
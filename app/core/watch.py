@@ -0,0 +1,245 @@
+import ctypes
+import ctypes.util
+import logging
+import os
+import select
+import struct
+import sys
+import threading
+import time
+import typing as t
+
+from .config import Config
+from .path import FileFinder
+
+logger = logging.getLogger(__name__)
+
+Signature: t.TypeAlias = tuple[int, int]
+
+IN_MODIFY: int = 0x00000002
+IN_CLOSE_WRITE: int = 0x00000008
+IN_MOVED_TO: int = 0x00000080
+IN_CREATE: int = 0x00000100
+IN_Q_OVERFLOW: int = 0x00004000
+IN_IGNORED: int = 0x00008000
+IN_ISDIR: int = 0x40000000
+IN_MASK: int = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE
+
+
+def is_hidden(name: str) -> bool:
+    return name.startswith(".")
+
+
+def signature(stat: os.stat_result) -> Signature:
+    return stat.st_size, stat.st_mtime_ns
+
+
+class WatchBackend(t.Protocol):
+    name: str
+
+    def poll(self, timeout: float) -> list[str]: ...
+
+    def close(self) -> None: ...
+
+
+class InotifyWatcher:
+    name: str = "inotify"
+    _event: t.ClassVar[struct.Struct] = struct.Struct("iIII")
+
+    def __init__(self, root: str, recursive: bool = True) -> None:
+        self.root: str = os.path.abspath(root)
+        self.recursive: bool = recursive
+        self.libc: t.Any = ctypes.CDLL(
+            ctypes.util.find_library("c") or "libc.so.6", use_errno=True
+        )
+        self.fd: int = self.libc.inotify_init1(os.O_CLOEXEC | os.O_NONBLOCK)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self.folders: dict[int, str] = {}
+        self.add_tree(self.root)
+
+    @staticmethod
+    def is_available() -> bool:
+        if not sys.platform.startswith("linux"):
+            return False
+        try:
+            libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6")
+        except OSError:
+            return False
+        return hasattr(libc, "inotify_init1")
+
+    def add(self, folder: str) -> None:
+        wd: int = self.libc.inotify_add_watch(
+            self.fd, os.fsencode(folder), ctypes.c_uint32(IN_MASK)
+        )
+        if wd < 0:
+            logger.warning(
+                f"Watch failed <from = {folder}, errno = {ctypes.get_errno()}>"
+            )
+            return
+        self.folders[wd] = folder
+
+    def add_tree(self, folder: str) -> list[str]:
+        self.add(folder)
+        files: list[str] = []
+        try:
+            with os.scandir(folder) as it:
+                for entry in it:
+                    if is_hidden(entry.name):
+                        continue
+                    if entry.is_dir(follow_symlinks=False):
+                        if self.recursive:
+                            files.extend(self.add_tree(entry.path))
+                    else:
+                        files.append(entry.path)
+        except OSError as e:
+            logger.debug(f"Scan failed <from = {folder}, error = {e}>")
+        return files
+
+    def parse(self, data: bytes) -> list[str]:
+        paths: list[str] = []
+        offset: int = 0
+        while offset + self._event.size <= len(data):
+            wd, mask, _, length = self._event.unpack_from(data, offset)
+            offset += self._event.size
+            name: str = os.fsdecode(data[offset : offset + length].rstrip(b"\0"))
+            offset += length
+
+            if mask & IN_Q_OVERFLOW:
+                logger.warning(f"Watch queue overflow, rescanning <root = {self.root}>")
+                paths.extend(self.add_tree(self.root))
+                continue
+            if mask & IN_IGNORED:
+                self.folders.pop(wd, None)
+                continue
+            folder: str | None = self.folders.get(wd)
+            if folder is None or not name or is_hidden(name):
+                continue
+            path: str = os.path.join(folder, name)
+            if mask & IN_ISDIR:
+                if self.recursive and mask & (IN_CREATE | IN_MOVED_TO):
+                    paths.extend(self.add_tree(path))
+                continue
+            paths.append(path)
+        return paths
+
+    def poll(self, timeout: float) -> list[str]:
+        readable, _, _ = select.select([self.fd], [], [], timeout)
+        if not readable:
+            return []
+        try:
+            return self.parse(os.read(self.fd, 64 * 1024))
+        except BlockingIOError:
+            return []
+
+    def close(self) -> None:
+        if self.fd >= 0:
+            os.close(self.fd)
+            self.fd = -1
+
+
+class PollingWatcher:
+    name: str = "polling"
+
+    def __init__(self, root: str, recursive: bool = True) -> None:
+        self.root: str = os.path.abspath(root)
+        self.depth: int = -1 if recursive else 0
+        self.finder: FileFinder = FileFinder()
+        self.snapshot: dict[str, Signature] = self.scan()
+
+    def visible(self, path: str) -> bool:
+        relative: str = os.path.relpath(path, self.root)
+        return not any(is_hidden(part) for part in relative.split(os.sep))
+
+    def scan(self) -> dict[str, Signature]:
+        snapshot: dict[str, Signature] = {}
+        for entry in self.finder.entries(self.root, self.depth):
+            if not self.visible(entry.path):
+                continue
+            try:
+                snapshot[entry.path] = signature(entry.stat())
+            except OSError:
+                continue
+        return snapshot
+
+    def poll(self, timeout: float) -> list[str]:
+        time.sleep(timeout)
+        snapshot: dict[str, Signature] = self.scan()
+        changed: list[str] = [
+            path for path, sig in snapshot.items() if self.snapshot.get(path) != sig
+        ]
+        self.snapshot = snapshot
+        return changed
+
+    def close(self) -> None:
+        self.snapshot.clear()
+
+
+class Debouncer:
+    def __init__(self, settle: float) -> None:
+        self.settle: float = settle
+        self.pending: dict[str, tuple[Signature, float]] = {}
+
+    def add(self, path: str, now: float | None = None) -> None:
+        now = time.monotonic() if now is None else now
+        try:
+            self.pending[path] = (signature(os.stat(path)), now)
+        except OSError:
+            self.pending.pop(path, None)
+
+    def ready(self, now: float | None = None) -> list[str]:
+        now = time.monotonic() if now is None else now
+        settled: list[str] = []
+        for path, (sig, since) in list(self.pending.items()):
+            try:
+                current: Signature = signature(os.stat(path))
+            except OSError:
+                del self.pending[path]
+                continue
+            if current != sig:
+                self.pending[path] = (current, now)
+            elif now - since >= self.settle:
+                del self.pending[path]
+                settled.append(path)
+        return settled
+
+
+def create_watcher(root: str, recursive: bool = True) -> WatchBackend:
+    name: str = Config().get("watch.backend", "auto")
+    if name != PollingWatcher.name and InotifyWatcher.is_available():
+        try:
+            return InotifyWatcher(root, recursive)
+        except OSError as e:
+            logger.warning(f"Inotify unavailable, polling instead <error = {e}>")
+    return PollingWatcher(root, recursive)
+
+
+class DirectoryWatcher:
+    def __init__(
+        self,
+        root: str,
+        recursive: bool = True,
+        settle: float | None = None,
+        interval: float | None = None,
+    ) -> None:
+        self.root: str = root
+        self.recursive: bool = recursive
+        self.settle: float = settle or Config().get("watch.settle", 5)
+        self.interval: float = interval or Config().get("watch.interval", 2)
+        self.stopped: threading.Event = threading.Event()
+
+    def stop(self) -> None:
+        self.stopped.set()
+
+    def watch(self) -> t.Iterator[list[str]]:
+        backend: WatchBackend = create_watcher(self.root, self.recursive)
+        debouncer: Debouncer = Debouncer(self.settle)
+        logger.info(f"Watching <from = {self.root}, backend = {backend.name}>")
+        try:
+            while not self.stopped.is_set():
+                for path in backend.poll(self.interval):
+                    debouncer.add(path)
+                if settled := debouncer.ready():
+                    yield settled
+        finally:
+            backend.close()
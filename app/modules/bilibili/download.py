@@ -1,11 +1,19 @@
 import logging
 import os
+import time
 import typing as t
-from concurrent.futures import ALL_COMPLETED, ThreadPoolExecutor, wait
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass
 
 import requests
 
+from app.core.config import Config
+
+from .governor import Governor
+from .journal import DownloadJournal
+from .segment import Segment, Segmenter
+from .session import RemoteFile, SessionPool
+
 logger: logging.Logger = logging.getLogger(__name__)
 
 
@@ -25,78 +33,152 @@ DownloadScope = t.NamedTuple("DownloadScope", [("start", int), ("end", int)])
 
 class Downloader:
     def __init__(self) -> None:
-        pass
+        self.sessions: SessionPool = SessionPool()
+        self.governor: Governor = self.sessions.governor
+        self.workers: int = self.sessions.workers
+        self.retries: int = self.sessions.retries
+        config: Config = Config()
+        p: t.Callable[[str], str] = lambda x: ".".join(["crawler_config.download", x])
+        self.min_segment: int = config.get(p("min_segment"), 1024 * 1024)
+        self.block_size: int = config.get(p("block_size"), 256 * 1024)
+        self.sync_interval: float = config.get(p("sync_interval"), 2.0)
 
     def async_download(self, op: DownloadOptions) -> str:
-        resp: requests.Response = requests.get(op.url, headers=op.headers, stream=True)
-        resp.raise_for_status()
-        return resp.text
-
-    def refine_chunk(self, size: int, chunk_size: int) -> list[DownloadScope]:
-        step = size // chunk_size
-        ret = [
-            DownloadScope(i * chunk_size, (i + 1) * chunk_size - 1) for i in range(step)
-        ]
-        if size % chunk_size != 0 or step == 0:
-            ret.append(DownloadScope(step * chunk_size, size - 1))
-        return ret
+        resp: requests.Response
+        with self.sessions.get(op.url, headers=op.headers) as resp:
+            resp.raise_for_status()
+            self.governor.transfer(op.url, len(resp.content))
+            return resp.text
+
+    @staticmethod
+    def ensure_folder(path: str) -> None:
+        folder: str = os.path.dirname(path)
+        if folder and not os.path.exists(folder):
+            os.makedirs(folder)
+
+    def probe(self, op: StreamDownloadOptions) -> RemoteFile:
+        return self.sessions.probe(op.url, op.headers)
 
     def find_total_size(self, op: StreamDownloadOptions) -> int:
-        resp = requests.get(op.url, headers=op.headers)
-        resp.raise_for_status()
-        return int(resp.headers.get("content-length", 0))
+        return self.probe(op).size
 
-    def prepare_download(self, op: StreamDownloadOptions) -> list[DownloadScope]:
+    def prepare_download(
+        self, op: StreamDownloadOptions, journal: DownloadJournal
+    ) -> list[DownloadScope]:
         if not op.url:
             return []
-        folder: str = os.path.dirname(op.save_path)
-        if not os.path.exists(folder):
-            os.makedirs(folder)
+        self.ensure_folder(op.save_path)
         try:
-            scopes: list[DownloadScope] = self.refine_chunk(
-                self.find_total_size(op), 1024 * 1024
-            )  # 1MB
-            if os.path.exists(op.save_path):
-                downloaded_size: int = os.path.getsize(op.save_path)
-                scopes = [
-                    DownloadScope(start, end)
-                    for start, end in scopes
-                    if start >= downloaded_size
-                ]
-            else:
-                with open(op.save_path, "wb") as f:
-                    pass
-            return scopes
+            journal.open()
+            return [DownloadScope(start, end) for start, end in journal.missing()]
         except Exception as e:
             logger.error(e)
             return []
 
-    def do_download(self, op: StreamDownloadOptions, scope: DownloadScope) -> bool:
+    def do_download(
+        self,
+        op: StreamDownloadOptions,
+        segmenter: Segmenter,
+        segment: Segment,
+        journal: DownloadJournal,
+    ) -> None:
         headers = op.headers.copy()
-        headers["Range"] = f"bytes={scope.start}-{scope.end}"
+        headers["Range"] = f"bytes={segment.position}-{segment.end}"
         try:
-            resp = requests.get(op.url, headers=headers, stream=True)
-            resp.raise_for_status()
-            with open(op.save_path, "rb+") as f:
-                f.seek(scope.start)
-                for chunk in resp.iter_content(chunk_size=1024 * 64):
-                    if chunk:
-                        f.write(chunk)
+            requested: float = time.monotonic()
+            with self.sessions.get(op.url, headers=headers, stream=True) as resp:
+                resp.raise_for_status()
+                if resp.status_code != 206:
+                    raise requests.HTTPError(
+                        f"Range ignored <status = {resp.status_code}>"
+                    )
+                segmenter.observe(time.monotonic() - requested)
+                with open(journal.part_path, "rb+") as f:
+                    f.seek(segment.position)
+                    for chunk in resp.iter_content(chunk_size=1024 * 64):
+                        self.governor.transfer(op.url, len(chunk))
+                        size: int = segmenter.allowance(segment, len(chunk))
+                        f.write(chunk[:size])
+                        f.flush()
+                        journal.mark(segment.position, size)
+                        segmenter.advance(segment, size)
+                        journal.flush()
+                        if size < len(chunk) or not segment.remaining:
+                            break
+        except Exception as e:
+            logger.error(e)
+        finally:
+            segmenter.release(segment)
+
+    def work(
+        self, op: StreamDownloadOptions, segmenter: Segmenter, journal: DownloadJournal
+    ) -> None:
+        while segment := segmenter.acquire():
+            self.do_download(op, segmenter, segment, journal)
+
+    def single_download(self, op: StreamDownloadOptions) -> bool:
+        logger.info(f"Ranges unsupported, streaming whole file <to = {op.save_path}>")
+        stream_path: str = f"{op.save_path}.stream"
+        try:
+            with self.sessions.get(op.url, headers=op.headers, stream=True) as resp:
+                resp.raise_for_status()
+                with open(stream_path, "wb") as f:
+                    for chunk in resp.iter_content(chunk_size=1024 * 64):
+                        self.governor.transfer(op.url, len(chunk))
+                        if chunk:
+                            f.write(chunk)
+            os.replace(stream_path, op.save_path)
             return True
         except Exception as e:
             logger.error(e)
             return False
+        finally:
+            if os.path.exists(stream_path):
+                os.remove(stream_path)
 
     def stream_download(self, op: StreamDownloadOptions) -> bool:
-        scopes: list[DownloadScope] = self.prepare_download(op)
-        if len(scopes) == 0:
+        if not op.url:
             return False
-
         try:
-            with ThreadPoolExecutor() as pool:
-                tasks = [pool.submit(self.do_download, op, scope) for scope in scopes]
-                wait(tasks, return_when=ALL_COMPLETED)
+            remote: RemoteFile = self.probe(op)
+        except Exception as e:
+            logger.error(e)
+            return False
+        if not remote.ranges or not remote.size:
+            self.ensure_folder(op.save_path)
+            return self.single_download(op)
+
+        journal: DownloadJournal = DownloadJournal(
+            op.save_path, remote, self.block_size, self.sync_interval
+        )
+        scopes: list[DownloadScope] = self.prepare_download(op, journal)
+        if not scopes:
+            if not journal.complete:
+                return False
+            journal.finish()
             return True
+
+        segmenter: Segmenter = Segmenter(
+            scopes,
+            self.workers,
+            self.min_segment,
+            self.retries,
+            align=journal.block,
+        )
+        try:
+            with ThreadPoolExecutor(self.workers) as pool:
+                for _ in range(self.workers):
+                    pool.submit(self.work, op, segmenter, journal)
         except Exception as e:
             logger.error(e)
             return False
+        finished: bool = segmenter.finished and journal.complete
+        logger.info(
+            f"Downloaded <to = {op.save_path}, size = {remote.size}, "
+            f"splits = {segmenter.splits}, finished = {finished}>"
+        )
+        if not finished:
+            journal.flush(force=True)
+            return False
+        journal.finish()
+        return True
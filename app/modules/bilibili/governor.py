@@ -0,0 +1,152 @@
+import logging
+import threading
+import time
+import typing as t
+from urllib.parse import urlsplit
+
+from app.composable.singleton import SingletonMeta
+from app.core.config import Config
+
+logger: logging.Logger = logging.getLogger(__name__)
+
+THROTTLE_STATUSES: frozenset[int] = frozenset({412, 429})
+
+
+class TokenBucket:
+    def __init__(self, rate: float = 0, burst: float = 1.0) -> None:
+        self.lock: threading.Lock = threading.Lock()
+        self.rate: float = rate
+        self.burst: float = burst
+        self.tokens: float = self.capacity
+        self.updated: float = time.monotonic()
+
+    @property
+    def capacity(self) -> float:
+        return max(self.rate * self.burst, 1.0)
+
+    def refill(self, now: float) -> None:
+        self.tokens = min(
+            self.capacity, self.tokens + (now - self.updated) * self.rate
+        )
+        self.updated = now
+
+    def reserve(self, amount: float) -> float:
+        with self.lock:
+            if self.rate <= 0:
+                return 0.0
+            self.refill(time.monotonic())
+            self.tokens -= amount
+            return -self.tokens / self.rate if self.tokens < 0 else 0.0
+
+    def set_rate(self, rate: float) -> None:
+        with self.lock:
+            limited: bool = self.rate > 0
+            self.refill(time.monotonic())
+            self.rate = rate
+            self.tokens = min(self.tokens, self.capacity) if limited else self.capacity
+
+
+class HostLimit:
+    def __init__(self, bandwidth: float, requests: float, burst: float) -> None:
+        self.base: float = requests
+        self.bandwidth: TokenBucket = TokenBucket(bandwidth, burst)
+        self.requests: TokenBucket = TokenBucket(requests, burst)
+        self.paused: float = 0.0
+        self.throttled: float = 0.0
+        self.window: float = time.monotonic()
+        self.count: int = 0
+        self.observed: float = 0.0
+
+    def count_request(self, now: float) -> None:
+        self.count += 1
+        elapsed: float = now - self.window
+        if elapsed >= 1.0:
+            self.observed = self.count / elapsed
+            self.window, self.count = now, 0
+
+
+class Governor(metaclass=SingletonMeta):
+    def __init__(self) -> None:
+        self.lock: threading.Lock = threading.Lock()
+        self.configure(Config().get("crawler_config.limits", {}) or {})
+
+    def configure(self, limits: dict[str, t.Any]) -> None:
+        with self.lock:
+            self.limits: dict[str, t.Any] = limits
+            self.burst: float = limits.get("burst", 1.0)
+            self.backoff: float = limits.get("backoff", 30.0)
+            self.recover: float = limits.get("recover", 0.1)
+            self.floor: float = limits.get("min_requests", 0.2)
+            self.bandwidth: TokenBucket = TokenBucket(
+                limits.get("bandwidth", 0), self.burst
+            )
+            self.requests: TokenBucket = TokenBucket(
+                limits.get("requests", 0), self.burst
+            )
+            self.hosts: dict[str, HostLimit] = {}
+
+    def host(self, url: str) -> HostLimit:
+        name: str = urlsplit(url).hostname or ""
+        with self.lock:
+            if name not in self.hosts:
+                caps: dict[str, t.Any] = {}
+                for key, value in (self.limits.get("hosts", {}) or {}).items():
+                    if name == key or name.endswith(f".{key}"):
+                        caps = value or {}
+                        break
+                self.hosts[name] = HostLimit(
+                    caps.get("bandwidth", 0), caps.get("requests", 0), self.burst
+                )
+            return self.hosts[name]
+
+    def request(self, url: str) -> None:
+        limit: HostLimit = self.host(url)
+        now: float = time.monotonic()
+        with self.lock:
+            self.recovered(limit, now)
+            limit.count_request(now)
+        delay: float = max(
+            limit.paused - now,
+            self.requests.reserve(1),
+            limit.requests.reserve(1),
+        )
+        if delay > 0:
+            time.sleep(delay)
+
+    def transfer(self, url: str, size: int) -> None:
+        if size <= 0:
+            return
+        limit: HostLimit = self.host(url)
+        delay: float = max(
+            self.bandwidth.reserve(size), limit.bandwidth.reserve(size)
+        )
+        if delay > 0:
+            time.sleep(delay)
+
+    def throttle(
+        self, url: str, status: int, retry_after: float | None = None
+    ) -> None:
+        limit: HostLimit = self.host(url)
+        now: float = time.monotonic()
+        pause: float = self.backoff if retry_after is None else retry_after
+        with self.lock:
+            current: float = limit.requests.rate or limit.observed or 1.0
+            rate: float = max(current / 2, self.floor)
+            limit.requests.set_rate(rate)
+            limit.paused = max(limit.paused, now + pause)
+            limit.throttled = now
+        logger.warning(
+            f"Throttled <host = {urlsplit(url).hostname}, status = {status}, "
+            f"requests = {rate:.2f}/s, pause = {pause}s>"
+        )
+
+    def recovered(self, limit: HostLimit, now: float) -> None:
+        if not limit.throttled or now - limit.throttled < self.backoff:
+            return
+        rate: float = limit.requests.rate * (1 + self.recover)
+        if limit.base and rate >= limit.base:
+            rate = limit.base
+        limit.requests.set_rate(rate)
+        limit.throttled = now
+        if limit.base and rate == limit.base:
+            limit.throttled = 0.0
@@ -0,0 +1,142 @@
+import base64
+import logging
+import math
+import os
+import threading
+import time
+import typing as t
+
+from app.core.cache import JsonStore
+
+from .session import RemoteFile
+
+logger: logging.Logger = logging.getLogger(__name__)
+
+
+class DownloadJournal:
+    def __init__(
+        self,
+        path: str,
+        remote: RemoteFile,
+        block: int = 256 * 1024,
+        interval: float = 2.0,
+    ) -> None:
+        self.path: str = path
+        self.remote: RemoteFile = remote
+        self.block: int = block
+        self.interval: float = interval
+        self.blocks: int = math.ceil(remote.size / block)
+        self.bitmap: bytearray = bytearray(math.ceil(self.blocks / 8))
+        self.store: JsonStore = JsonStore(f"{path}.part.json")
+        self.lock: threading.Lock = threading.Lock()
+        self.dirty: bool = False
+        self.flushed: float = time.monotonic()
+
+    @property
+    def part_path(self) -> str:
+        return f"{self.path}.part"
+
+    @property
+    def completed(self) -> int:
+        return sum(self.is_done(i) for i in range(self.blocks))
+
+    @property
+    def complete(self) -> bool:
+        return self.completed == self.blocks
+
+    def is_done(self, index: int) -> bool:
+        return bool(self.bitmap[index >> 3] & (1 << (index & 7)))
+
+    def matches(self, data: dict[str, t.Any]) -> bool:
+        remote: RemoteFile = self.remote
+        if data.get("size") != remote.size or data.get("block") != self.block:
+            return False
+        if remote.etag or data.get("etag"):
+            return data.get("etag") == remote.etag
+        return data.get("last_modified") == remote.last_modified
+
+    def load(self) -> bool:
+        data: dict[str, t.Any] = self.store.load()
+        if not data or not self.matches(data):
+            return False
+        try:
+            if os.path.getsize(self.part_path) != self.remote.size:
+                return False
+            bitmap: bytes = base64.b64decode(data.get("bitmap", ""))
+        except (OSError, ValueError):
+            return False
+        if len(bitmap) != len(self.bitmap):
+            return False
+        self.bitmap[:] = bitmap
+        return True
+
+    def open(self) -> "DownloadJournal":
+        if self.load():
+            logger.info(
+                f"Resuming download <to = {self.path}, "
+                f"blocks = {self.completed}/{self.blocks}>"
+            )
+            return self
+        if os.path.exists(self.store.path):
+            logger.info(f"Discarding stale partial download <to = {self.path}>")
+        with open(self.part_path, "wb") as f:
+            f.truncate(self.remote.size)
+        self.bitmap[:] = bytes(len(self.bitmap))
+        self.flush(force=True)
+        return self
+
+    def last_byte(self, index: int) -> int:
+        return min((index + 1) * self.block, self.remote.size) - 1
+
+    def mark(self, start: int, size: int) -> None:
+        if size <= 0:
+            return
+        end: int = start + size - 1
+        with self.lock:
+            for index in range(start // self.block, end // self.block + 1):
+                if self.last_byte(index) <= end:
+                    self.bitmap[index >> 3] |= 1 << (index & 7)
+                    self.dirty = True
+
+    def missing(self) -> list[tuple[int, int]]:
+        ranges: list[tuple[int, int]] = []
+        first: int | None = None
+        for index in range(self.blocks + 1):
+            done: bool = index == self.blocks or self.is_done(index)
+            if not done and first is None:
+                first = index
+            elif done and first is not None:
+                ranges.append((first * self.block, self.last_byte(index - 1)))
+                first = None
+        return ranges
+
+    def sync(self) -> None:
+        with open(self.part_path, "rb+") as f:
+            os.fsync(f.fileno())
+
+    def flush(self, force: bool = False) -> None:
+        with self.lock:
+            if not force and (
+                not self.dirty or time.monotonic() - self.flushed < self.interval
+            ):
+                return
+            self.sync()
+            self.store.dump(
+                {
+                    "size": self.remote.size,
+                    "etag": self.remote.etag,
+                    "last_modified": self.remote.last_modified,
+                    "block": self.block,
+                    "bitmap": base64.b64encode(self.bitmap).decode("ascii"),
+                },
+                sync=True,
+            )
+            self.dirty = False
+            self.flushed = time.monotonic()
+
+    def finish(self) -> None:
+        with self.lock:
+            self.sync()
+            os.replace(self.part_path, self.path)
+            if os.path.exists(self.store.path):
+                os.remove(self.store.path)
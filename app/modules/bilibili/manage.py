@@ -3,6 +3,7 @@ from DrissionPage import ChromiumOptions, ChromiumPage  # type: ignore
 from app.core.config import Config
 
 from .entity import CrawlerQO, ManageOptions, AuthorOptions
+from .session import SessionPool
 from .task import AuthorTask
 import typing as t
 
@@ -44,6 +45,9 @@ class Manage:
         op.headless(self.query.headless)
         browser: ChromiumPage = ChromiumPage(op)
 
-        for task in self.tasks:
-            task.set_browser(browser)
-            task.start()
+        try:
+            for task in self.tasks:
+                task.set_browser(browser)
+                task.start()
+        finally:
+            SessionPool().close()
@@ -0,0 +1,127 @@
+import math
+import threading
+import time
+import typing as t
+from collections import deque
+from dataclasses import dataclass
+
+
+@dataclass(eq=False)
+class Segment:
+    start: int
+    end: int
+    position: int = -1
+    started: float = 0.0
+    attempts: int = 0
+
+    def __post_init__(self) -> None:
+        if self.position < 0:
+            self.position = self.start
+
+    @property
+    def remaining(self) -> int:
+        return max(self.end - self.position + 1, 0)
+
+    def rate(self, now: float) -> float:
+        elapsed: float = now - self.started
+        return (self.position - self.start) / elapsed if elapsed > 0 else 0.0
+
+    def eta(self, now: float) -> float:
+        rate: float = self.rate(now)
+        return self.remaining / rate if rate else math.inf
+
+
+class Segmenter:
+    def __init__(
+        self,
+        ranges: t.Iterable[tuple[int, int]],
+        connections: int,
+        min_size: int = 1024 * 1024,
+        retries: int = 3,
+        align: int = 1,
+    ) -> None:
+        self.lock: threading.Lock = threading.Lock()
+        self.align: int = max(align, 1)
+        self.min_size: int = max(min_size, 64 * 1024, self.align)
+        self.retries: int = retries
+        self.pending: deque[Segment] = deque()
+        self.active: list[Segment] = []
+        self.failed: bool = False
+        self.splits: int = 0
+        self.latency: float = 0.0
+
+        spans: list[tuple[int, int]] = [(s, e) for s, e in ranges if e >= s]
+        total: int = sum(e - s + 1 for s, e in spans)
+        size: int = self.aligned(
+            max(math.ceil(total / max(connections, 1)), self.min_size)
+        )
+        for start, end in spans:
+            while start <= end:
+                stop: int = min(start + size - 1, end)
+                if end - stop < self.min_size:
+                    stop = end
+                self.pending.append(Segment(start, stop))
+                start = stop + 1
+
+    @property
+    def finished(self) -> bool:
+        with self.lock:
+            return not self.failed and not self.pending and not self.active
+
+    def aligned(self, offset: int) -> int:
+        return math.ceil(offset / self.align) * self.align
+
+    def observe(self, latency: float) -> None:
+        with self.lock:
+            if not self.latency:
+                self.latency = latency
+            else:
+                self.latency = self.latency * 0.8 + latency * 0.2
+
+    def steal(self, now: float) -> Segment | None:
+        candidates: list[Segment] = [
+            s
+            for s in self.active
+            if s.remaining >= 2 * self.min_size and s.eta(now) > 2 * self.latency
+        ]
+        if not candidates:
+            return None
+        victim: Segment = max(candidates, key=lambda s: (s.eta(now), s.remaining))
+        middle: int = self.aligned(victim.position + victim.remaining // 2)
+        segment: Segment = Segment(middle, victim.end)
+        victim.end = middle - 1
+        self.splits += 1
+        return segment
+
+    def acquire(self) -> Segment | None:
+        with self.lock:
+            if self.failed:
+                return None
+            now: float = time.monotonic()
+            segment: Segment | None = (
+                self.pending.popleft() if self.pending else self.steal(now)
+            )
+            if segment is not None:
+                segment.started = now
+                self.active.append(segment)
+            return segment
+
+    def allowance(self, segment: Segment, size: int) -> int:
+        with self.lock:
+            return min(size, segment.remaining)
+
+    def advance(self, segment: Segment, size: int) -> None:
+        with self.lock:
+            segment.position += size
+
+    def release(self, segment: Segment) -> None:
+        with self.lock:
+            self.active.remove(segment)
+            if not segment.remaining:
+                return
+            if segment.attempts >= self.retries:
+                self.failed = True
+                return
+            self.pending.append(
+                Segment(segment.position, segment.end, attempts=segment.attempts + 1)
+            )
@@ -0,0 +1,177 @@
+import datetime
+import email.utils
+import logging
+import re
+import threading
+import typing as t
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from app.composable.singleton import SingletonMeta
+from app.core.config import Config
+
+from .governor import THROTTLE_STATUSES, Governor
+
+logger: logging.Logger = logging.getLogger(__name__)
+
+
+class PoolStats(t.NamedTuple):
+    requests: int
+    connections: int
+
+    @property
+    def reused(self) -> int:
+        return max(self.requests - self.connections, 0)
+
+
+class RemoteFile(t.NamedTuple):
+    size: int = 0
+    ranges: bool = False
+    etag: str = ""
+    last_modified: str = ""
+
+
+class SessionPool(metaclass=SingletonMeta):
+    _content_range: t.ClassVar[re.Pattern] = re.compile(r"bytes\s+\d+-\d+/(\d+)")
+
+    def __init__(self) -> None:
+        config: Config = Config()
+        p: t.Callable[[str], str] = lambda x: ".".join(["crawler_config.download", x])
+        self.workers: int = config.get(p("workers"), 8)
+        self.maxsize: int = config.get(p("pool_size"), 0) or self.workers * 4
+        self.retries: int = config.get(p("retries"), 3)
+        timeout: t.Any = config.get(p("timeout"), (10, 60))
+        self.timeout: float | tuple[float, float] = (
+            timeout if isinstance(timeout, (int, float)) else tuple(timeout)
+        )
+        self.lock: threading.Lock = threading.Lock()
+        self.sessions: dict[str, requests.Session] = {}
+        self.remotes: dict[str, RemoteFile] = {}
+        self.governor: Governor = Governor()
+
+    @staticmethod
+    def host(url: str) -> str:
+        parts = urlsplit(url)
+        return f"{parts.scheme}://{parts.netloc}"
+
+    def create(self) -> requests.Session:
+        retry: Retry = Retry(
+            total=self.retries,
+            backoff_factor=0.5,
+            status_forcelist=(500, 502, 503, 504),
+            allowed_methods=("GET", "HEAD"),
+            raise_on_status=False,
+            respect_retry_after_header=False,
+        )
+        adapter: HTTPAdapter = HTTPAdapter(
+            pool_connections=1, pool_maxsize=self.maxsize, max_retries=retry
+        )
+        session: requests.Session = requests.Session()
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        return session
+
+    def session(self, url: str) -> requests.Session:
+        host: str = self.host(url)
+        with self.lock:
+            if host not in self.sessions:
+                self.sessions[host] = self.create()
+            return self.sessions[host]
+
+    @staticmethod
+    def retry_after(resp: requests.Response) -> float | None:
+        value: str = resp.headers.get("Retry-After", "")
+        if value.isdigit():
+            return float(value)
+        try:
+            moment: datetime.datetime = email.utils.parsedate_to_datetime(value)
+        except (TypeError, ValueError):
+            return None
+        now = datetime.datetime.now(moment.tzinfo)
+        return max((moment - now).total_seconds(), 0.0)
+
+    def request(self, method: str, url: str, **kwargs: t.Any) -> requests.Response:
+        kwargs.setdefault("timeout", self.timeout)
+        attempts: int = 0
+        while True:
+            self.governor.request(url)
+            resp: requests.Response = self.session(url).request(method, url, **kwargs)
+            if resp.status_code not in THROTTLE_STATUSES or attempts >= self.retries:
+                return resp
+            attempts += 1
+            self.governor.throttle(url, resp.status_code, self.retry_after(resp))
+            resp.close()
+
+    def get(self, url: str, **kwargs: t.Any) -> requests.Response:
+        return self.request("GET", url, **kwargs)
+
+    @staticmethod
+    def describe(resp: requests.Response, size: int, ranges: bool) -> RemoteFile:
+        return RemoteFile(
+            size=size,
+            ranges=ranges,
+            etag=resp.headers.get("ETag", ""),
+            last_modified=resp.headers.get("Last-Modified", ""),
+        )
+
+    def probe_head(self, url: str, headers: dict) -> RemoteFile | None:
+        with self.request("HEAD", url, headers=headers, allow_redirects=True) as resp:
+            size: int = int(resp.headers.get("Content-Length", 0) or 0)
+            if not resp.ok or not size:
+                return None
+            ranges: bool = resp.headers.get("Accept-Ranges", "").lower() == "bytes"
+            return self.describe(resp, size, ranges)
+
+    def probe_range(self, url: str, headers: dict) -> RemoteFile:
+        headers = {**headers, "Range": "bytes=0-0"}
+        with self.get(url, headers=headers, stream=True) as resp:
+            resp.raise_for_status()
+            if resp.status_code == 206:
+                m = self._content_range.match(resp.headers.get("Content-Range", ""))
+                if m:
+                    return self.describe(resp, int(m.group(1)), True)
+            size: int = int(resp.headers.get("Content-Length", 0) or 0)
+            return self.describe(resp, size, False)
+
+    def probe(self, url: str, headers: dict) -> RemoteFile:
+        with self.lock:
+            if url in self.remotes:
+                return self.remotes[url]
+        remote: RemoteFile | None = None
+        try:
+            remote = self.probe_head(url, headers)
+        except requests.RequestException as e:
+            logger.debug(f"HEAD failed <url = {url}, error = {e}>")
+        if remote is None or not remote.ranges:
+            remote = self.probe_range(url, headers)
+        with self.lock:
+            self.remotes[url] = remote
+        return remote
+
+    def stats(self) -> dict[str, PoolStats]:
+        ret: dict[str, PoolStats] = {}
+        with self.lock:
+            sessions = list(self.sessions.items())
+        for host, session in sessions:
+            manager = session.get_adapter(host).poolmanager  # type: ignore
+            pools = [manager.pools[key] for key in manager.pools.keys()]
+            ret[host] = PoolStats(
+                sum(pool.num_requests for pool in pools),
+                sum(pool.num_connections for pool in pools),
+            )
+        return ret
+
+    def close(self) -> None:
+        for host, stats in self.stats().items():
+            logger.info(
+                f"SessionPool <host = {host}, requests = {stats.requests}, "
+                f"connections = {stats.connections}, reused = {stats.reused}>"
+            )
+        with self.lock:
+            for session in self.sessions.values():
+                session.close()
+            self.sessions.clear()
+            self.remotes.clear()
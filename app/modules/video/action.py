@@ -6,6 +6,7 @@ from dataclasses import dataclass
 
 import send2trash
 
+from app.core.snapshot import StatCache
 from app.modules.video.marker import Marker
 
 logger = logging.getLogger(__name__)
@@ -53,13 +54,14 @@ class RemoveCacheAction(Action):
 
     @t.override
     def met(self, /, options: ActionOptions) -> bool:
-        return os.path.exists(options.output_path)
+        return StatCache().exists(options.output_path)
 
     @t.override
     def invoke(self, /, options: ActionOptions) -> bool:
         if options.verbose:
             logger.info(f"Removing <from = {options.output_path}>")
         send2trash.send2trash(options.output_path)
+        StatCache().invalidate(options.output_path)
         return True
 
 
@@ -71,13 +73,14 @@ class BrandMarkerAction(Action):
 
     @t.override
     def met(self, /, options: ActionOptions) -> bool:
-        return os.path.exists(options.output_path)
+        return StatCache().exists(options.output_path)
 
     @t.override
     def invoke(self, /, options: ActionOptions) -> bool:
         if options.verbose:
             logger.info(f"Branding <from = {options.output_path}>")
         flag: bool = self.marker.brand(options.output_path)
+        StatCache().invalidate(options.output_path)
         if options.verbose:
             logger.info(f"Branding <status = {flag}>")
         return flag
@@ -87,21 +90,26 @@ class RemoveOldFileAction(Action):
 
     @t.override
     def met(self, /, options: ActionOptions) -> bool:
-        return options.clean and os.path.exists(options.input_path)
+        return options.clean and StatCache().exists(options.input_path)
 
     @t.override
     def invoke(self, /, options: ActionOptions) -> bool:
         if options.verbose:
             logger.info(f"Removing <from = {options.input_path}>")
         send2trash.send2trash(options.input_path)
+        StatCache().invalidate(options.input_path)
         return True
 
 
 class RenameAction(Action):
 
+    def __init__(self, priority: int = 0) -> None:
+        super().__init__(priority)
+        self.marker: Marker = Marker()
+
     @t.override
     def met(self, /, options: ActionOptions) -> bool:
-        return options.swap and not os.path.exists(options.swap_path)
+        return options.swap and not StatCache().exists(options.swap_path)
 
     @t.override
     def invoke(self, /, options: ActionOptions) -> bool:
@@ -111,4 +119,6 @@ class RenameAction(Action):
             )
             logger.info(message)
         os.rename(options.output_path, options.swap_path)
+        self.marker.rename(options.output_path, options.swap_path)
+        StatCache().invalidate(options.output_path, options.swap_path)
         return True
@@ -1,14 +1,31 @@
+import hashlib
 import logging
 import os
+import shutil
+import threading
+import time
 import typing as t
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import asdict
 
+import pydash
 from tqdm import tqdm
 
+from app.core.config import Config
 from app.core.path import FileFinder, FilePathCollapse
+from app.core.probe import Prober
+from app.core.snapshot import StatCache
+from app.core.storage import Storage
+from app.core.watch import DirectoryWatcher
 
-from app.core.device import GPUDevice
-from app.core.ffmpeg import DecoderFinder, FFMpeg, FFMpegProgressInfo
+from app.core.ffmpeg import (
+    DecoderFinder,
+    EncoderFinder,
+    EncoderProfile,
+    FFMpeg,
+    ProgressEvent,
+    find_profile,
+)
 from .action import (
     Action,
     ActionOptions,
@@ -17,25 +34,30 @@ from .action import (
     RemoveOldFileAction,
     RenameAction,
 )
-from .filter import Filter
+from .filter import Filter, VideoFilter
+from .journal import ConversionJournal, JournalEntry
 from .marker import Marker
+from .remux import RemuxPlanner, StreamPlan
+from .scheduler import DeviceLimiter, JobScheduler
 from .types import ManagerOptions, TaskOptions
 
 logger = logging.getLogger(__name__)
 
 
 class Mp4Converter:
-    def __init__(self) -> None:
+    def __init__(self, position: int | None = None) -> None:
         self.options: TaskOptions | None = None
         self.bar: tqdm | None = None
+        self.position: int | None = position
 
-    def on_progress(self, info: FFMpegProgressInfo) -> None:
+    def on_progress(self, info: ProgressEvent) -> None:
         if self.bar is None:
             return
         self.bar.set_postfix_str(
             f"< {info.current} / {info.duration}> | < {info.this.length_info} >"
         )
         self.bar.n = round(info.percentage, 2)
+        self.bar.refresh()
 
     def on_after(self, ffmpeg: FFMpeg) -> None:
         if self.bar is None:
@@ -43,39 +65,212 @@ class Mp4Converter:
         self.bar.n = 100
         self.bar.close()
 
-    def convert(self, options: TaskOptions) -> bool:
-        self.options = options
-
+    def create_bar(self, options: TaskOptions) -> tqdm:
         collapse: FilePathCollapse = FilePathCollapse()
-
-        self.bar = tqdm(
+        return tqdm(
             total=100.0,
             unit="%",
             desc=collapse(options.input_path, sep=os.sep),
             dynamic_ncols=True,
+            position=self.position,
+            leave=self.position is None,
         )
+
+    def add_decode_options(self, ffmpeg: FFMpeg, options: TaskOptions) -> None:
+        profile: EncoderProfile = find_profile(options.encoder)
+        for key, value in profile.input_options:
+            ffmpeg.option(key, value)
+        ffmpeg.option("c:v", options.decoder)
+
+    def add_encode_options(self, ffmpeg: FFMpeg, options: TaskOptions) -> None:
+        profile: EncoderProfile = find_profile(options.encoder)
+        ffmpeg.option("c:v", profile.name)
+        for key, value in profile.output_options:
+            if key == "preset" and options.preset:
+                continue
+            ffmpeg.option(key, value)
+        if options.preset:
+            ffmpeg.option("preset", options.preset)
+
+    def convert(self, options: TaskOptions) -> bool:
+        self.options = options
+        self.bar = self.create_bar(options)
+
         ffmpeg = FFMpeg()
         ffmpeg.add_progress(self.on_progress)
         ffmpeg.add_after(self.on_after)
 
-        ffmpeg.length_info = f"{options.current}/{options.total}"
+        ffmpeg.length_info = f"{options.current}/{options.total or '?'}"
 
-        ffmpeg.option("hwaccel", "cuda")
-        ffmpeg.option("c:v", options.decoder)
+        plan: StreamPlan = options.plan
+        if not plan.copy_video:
+            self.add_decode_options(ffmpeg, options)
         ffmpeg.option("i", options.input_path)
-        ffmpeg.option("c:v", options.encoder)
-        ffmpeg.option("c:a", "aac")
+        if plan.video_index is not None:
+            ffmpeg.option("map", f"0:{plan.video_index}")
+        if plan.audio_index is not None:
+            ffmpeg.option("map", f"0:{plan.audio_index}")
+        if plan.copy_video:
+            ffmpeg.option("c:v", "copy")
+            if plan.video_codec == "hevc":
+                ffmpeg.option("tag:v", "hvc1")
+        else:
+            self.add_encode_options(ffmpeg, options)
+        ffmpeg.option("c:a", "copy" if plan.copy_audio else "aac")
         ffmpeg.option("y", options.output_path)
 
         return ffmpeg.invoke()["code"] == 0
 
 
+class SegmentedConverter(Mp4Converter):
+    def __init__(self, position: int | None = None) -> None:
+        super().__init__(position)
+        self.prober: Prober = Prober()
+        self.lock: threading.Lock = threading.Lock()
+        self.elapsed: dict[int, int] = {}
+        self.duration_us: int = 0
+        self.tolerance: float = Config().get("segment.tolerance", 0.5)
+
+    @staticmethod
+    def work_dir(options: TaskOptions) -> str:
+        digest: str = hashlib.sha1(options.input_path.encode()).hexdigest()[:12]
+        return os.path.join(options.folder, f".segments-{digest}")
+
+    @staticmethod
+    def duration(data: dict[str, t.Any]) -> float:
+        try:
+            return float(pydash.get(data, "format.duration") or 0)
+        except (TypeError, ValueError):
+            return 0.0
+
+    def on_segment(self, index: int, info: ProgressEvent) -> None:
+        if self.bar is None or not self.duration_us:
+            return
+        with self.lock:
+            self.elapsed[index] = info.out_time_us
+            elapsed: int = sum(self.elapsed.values())
+            self.bar.set_postfix_str(
+                f"< {ProgressEvent.format_us(elapsed)} / "
+                f"{ProgressEvent.format_us(self.duration_us)}> | "
+                f"< {len(self.elapsed)} segments >"
+            )
+            self.bar.n = round(min(elapsed / self.duration_us * 100, 99), 2)
+            self.bar.refresh()
+
+    def split(self, options: TaskOptions, folder: str, duration: float) -> list[str]:
+        count: int = options.segments
+        times: list[str] = [f"{duration * i / count:.3f}" for i in range(1, count)]
+        video: int | None = options.plan.video_index
+
+        ffmpeg: FFMpeg = FFMpeg()
+        ffmpeg.option("hide_banner")
+        ffmpeg.option("i", options.input_path)
+        ffmpeg.option("map", "0:v:0" if video is None else f"0:{video}")
+        ffmpeg.option("c", "copy")
+        ffmpeg.option("f", "segment")
+        ffmpeg.option("segment_times", ",".join(times))
+        ffmpeg.option("reset_timestamps", "1")
+        ffmpeg.option("y", os.path.join(folder, "source_%03d.mkv"))
+        if ffmpeg.execute(ffmpeg.arguments)["code"] != 0:
+            return []
+        return sorted(
+            os.path.join(folder, name)
+            for name in os.listdir(folder)
+            if name.startswith("source_")
+        )
+
+    def encode_segment(self, index: int, path: str, options: TaskOptions) -> str | None:
+        output: str = os.path.join(
+            os.path.dirname(path),
+            os.path.basename(path).replace("source_", "encoded_", 1),
+        )
+        ffmpeg: FFMpeg = FFMpeg()
+        ffmpeg.add_progress(lambda info: self.on_segment(index, info))
+        self.add_decode_options(ffmpeg, options)
+        ffmpeg.option("i", path)
+        self.add_encode_options(ffmpeg, options)
+        ffmpeg.option("an")
+        ffmpeg.option("y", output)
+        return output if ffmpeg.invoke()["code"] == 0 else None
+
+    def concat(self, options: TaskOptions, folder: str, segments: list[str]) -> bool:
+        listing: str = os.path.join(folder, "segments.txt")
+        with open(listing, "w", encoding="utf-8") as f:
+            for segment in segments:
+                name: str = os.path.basename(segment).replace("'", "'\\''")
+                f.write(f"file '{name}'\n")
+
+        plan: StreamPlan = options.plan
+        audio: str = "1:a:0?" if plan.audio_index is None else f"1:{plan.audio_index}"
+        ffmpeg: FFMpeg = FFMpeg()
+        ffmpeg.option("hide_banner")
+        ffmpeg.option("f", "concat")
+        ffmpeg.option("safe", "0")
+        ffmpeg.option("i", listing)
+        ffmpeg.option("i", options.input_path)
+        ffmpeg.option("map", "0:v:0")
+        ffmpeg.option("map", audio)
+        ffmpeg.option("c:v", "copy")
+        ffmpeg.option("c:a", "copy" if plan.copy_audio else "aac")
+        ffmpeg.option("y", options.output_path)
+        return ffmpeg.execute(ffmpeg.arguments)["code"] == 0
+
+    def verify(self, options: TaskOptions, expected: float) -> bool:
+        actual: float = self.duration(self.prober.invoke(options.output_path))
+        if abs(actual - expected) > max(self.tolerance, expected * 0.01):
+            logger.warning(
+                f"Duration mismatch <from = {options.input_path}, "
+                f"expected = {expected:.3f}, actual = {actual:.3f}>"
+            )
+            return False
+        return True
+
+    def convert(self, options: TaskOptions) -> bool:
+        duration: float = self.duration(self.prober.probe(options.input_path))
+        if options.segments < 2 or duration < options.segment_min_duration:
+            return super().convert(options)
+
+        self.options = options
+        self.duration_us = round(duration * 1_000_000)
+        self.bar = self.create_bar(options)
+        self.bar.set_postfix_str(f"< {options.current}/{options.total or '?'} >")
+        folder: str = self.work_dir(options)
+        shutil.rmtree(folder, ignore_errors=True)
+        os.makedirs(folder)
+        try:
+            sources: list[str] = self.split(options, folder, duration)
+            if not sources:
+                return False
+            with ThreadPoolExecutor(max_workers=len(sources)) as executor:
+                encoded = list(
+                    executor.map(
+                        lambda item: self.encode_segment(*item, options),
+                        enumerate(sources),
+                    )
+                )
+            if not all(encoded):
+                return False
+            if not self.concat(options, folder, t.cast(list[str], encoded)):
+                return False
+            return self.verify(options, duration)
+        finally:
+            shutil.rmtree(folder, ignore_errors=True)
+            self.bar.n = 100
+            self.bar.close()
+
+
 class ConverterManager:
     def __init__(self) -> None:
         self.filters: list[Filter] = []
         self.decoder_finder: DecoderFinder = DecoderFinder()
-        self.converter: Mp4Converter = Mp4Converter()
+        self.encoder_finder: EncoderFinder = EncoderFinder()
+        self.encoder: EncoderProfile | None = None
+        self.planner: RemuxPlanner = RemuxPlanner()
         self.marker: Marker = Marker()
+        self.journal: ConversionJournal = ConversionJournal()
+        self.storage: Storage = Storage()
+        self.stat_cache: StatCache = StatCache()
+        self.resumed: set[str] = set()
 
         self.after_actions: list[Action] = [
             BrandMarkerAction(),
@@ -86,17 +281,42 @@ class ConverterManager:
     def set_filter(self, filter: Filter) -> None:
         self.filters.append(filter)
 
-    def do_convert(
+    def prepare(
         self, file: str, index: int, options: ManagerOptions, total: int = 1
-    ) -> bool:
-        file = os.path.normpath(file)
+    ) -> TaskOptions | None:
+        file = os.path.abspath(file)
         o = {"input_path": file, "current": index + 1, "total": total}
+        if self.encoder is not None:
+            o["encoder"] = self.encoder.name
         if decoder := self.decoder_finder.find(file):
             o["decoder"] = decoder
         else:
-            return False
-        task_options: TaskOptions = TaskOptions(**{**asdict(options), **o})
+            return None
+        if options.remux:
+            o["plan"] = self.planner.plan(
+                self.decoder_finder.prober.probe(file), options.ext
+            )
+            if options.verbose:
+                logger.info(f"Stream plan <from = {file}, plan = {o['plan']}>")
+        return TaskOptions(**{**asdict(options), **o})
+
+    def encode(self, task_options: TaskOptions, position: int | None = None) -> bool:
+        self.journal.mark(task_options.input_path, "encoding")
+        self.storage.advise(task_options.input_path)
+        converter: Mp4Converter = (
+            SegmentedConverter(position)
+            if task_options.segments > 1 and not task_options.plan.copy_video
+            else Mp4Converter(position)
+        )
+        try:
+            return converter.convert(options=task_options)
+        finally:
+            self.stat_cache.invalidate(task_options.output_path)
 
+    def finish(
+        self, task_options: TaskOptions, encoded: bool, start: int = 0
+    ) -> bool:
+        path: str = task_options.input_path
         op: ActionOptions = ActionOptions(
             swap=task_options.swap,
             verbose=task_options.verbose,
@@ -105,22 +325,134 @@ class ConverterManager:
             output_path=task_options.output_path,
             swap_path=task_options.swap_path,
         )
-        if not self.converter.convert(options=task_options):
+        if not encoded:
+            self.journal.mark(path, "failed", "encode")
             return RemoveCacheAction()(options=op)
 
-        for action in sorted(self.after_actions, key=lambda x: x.priority):
+        self.journal.mark(path, "finishing")
+        actions: list[Action] = sorted(self.after_actions, key=lambda x: x.priority)
+        for index, action in enumerate(actions[start:], start):
+            if not action.met(options=op):
+                if task_options.verbose:
+                    logger.info(f"Action <{action.__class__.__name__}> <skip rest>")
+                break
             flag = action(options=op)
-            if options.verbose:
+            if task_options.verbose:
                 logger.info(f"Action <{action.__class__.__name__}> <status = {flag}>")
             if not flag:
+                self.journal.mark(path, "failed", action.__class__.__name__)
                 return False
+            self.journal.advance(path, index + 1)
 
+        if task_options.clean:
+            self.decoder_finder.prober.forget(task_options.input_path)
+        self.journal.mark(path, "done")
         return True
 
-    def start(self, options: ManagerOptions) -> bool:
+    def do_convert(
+        self, file: str, index: int, options: ManagerOptions, total: int = 1
+    ) -> bool:
+        task_options: TaskOptions | None = self.prepare(file, index, options, total)
+        if task_options is None:
+            return False
+        self.journal.queue(task_options)
+        return self.finish(task_options, self.encode(task_options))
+
+    def submit(
+        self,
+        scheduler: JobScheduler,
+        task_options: TaskOptions,
+        start: int | None = None,
+    ) -> None:
+        if start is None:
+            scheduler.submit(
+                task_options.input_path,
+                lambda slot: self.encode(task_options, slot),
+                lambda encoded: self.finish(task_options, encoded),
+                self.storage.devices(task_options.input_path, task_options.folder),
+            )
+            return
+        scheduler.submit(
+            task_options.input_path,
+            lambda slot: True,
+            lambda encoded: self.finish(task_options, encoded, start),
+        )
+
+    def clean_partial(self, task_options: TaskOptions) -> None:
+        if os.path.exists(task_options.output_path):
+            logger.info(f"Removing partial output <from = {task_options.output_path}>")
+            os.remove(task_options.output_path)
+            self.stat_cache.invalidate(task_options.output_path)
+        shutil.rmtree(SegmentedConverter.work_dir(task_options), ignore_errors=True)
+
+    def resume(self, scheduler: JobScheduler, options: ManagerOptions) -> int:
+        entries: list[JournalEntry] = self.journal.unfinished(options.root)
+        for entry in entries:
+            task_options: TaskOptions = entry.task
+            self.resumed.add(task_options.input_path)
+            logger.info(
+                f"Resuming <from = {task_options.input_path}, state = {entry.state}>"
+            )
+            if entry.state == "finishing":
+                self.submit(scheduler, task_options, entry.action)
+                continue
+            self.clean_partial(task_options)
+            if not self.stat_cache.exists(task_options.input_path):
+                self.journal.mark(task_options.input_path, "failed", "missing")
+                continue
+            self.journal.queue(task_options)
+            self.submit(scheduler, task_options)
+        return len(entries)
+
+    def schedule(
+        self,
+        scheduler: JobScheduler,
+        file: str,
+        index: int,
+        options: ManagerOptions,
+        total: int = 1,
+    ) -> bool:
+        if os.path.abspath(file) in self.resumed:
+            return False
+        task_options: TaskOptions | None = self.prepare(file, index, options, total)
+        if task_options is None:
+            return False
+        self.journal.queue(task_options)
+        self.submit(scheduler, task_options)
+        return True
 
-        if not GPUDevice.have():
+    def create_scheduler(self, options: ManagerOptions) -> JobScheduler:
+        return JobScheduler(options.jobs, limiter=DeviceLimiter(self.storage.limit))
+
+    def pushdown(self) -> tuple[str, ...] | None:
+        for f in self.filters:
+            if isinstance(f, VideoFilter):
+                return f.extensions
+        return None
+
+    def watch(self, options: ManagerOptions) -> bool:
+        watcher: DirectoryWatcher = DirectoryWatcher(options.root, options.deep)
+        index: int = 0
+        with self.create_scheduler(options) as scheduler:
+            self.resume(scheduler, options)
+            try:
+                for batch in watcher.watch():
+                    self.stat_cache.clear()
+                    files: t.Iterable[str] = batch
+                    for f in self.filters:
+                        files = f.stream(files, options)
+                    for file in files:
+                        if self.schedule(scheduler, file, index, options, 0):
+                            index += 1
+            except KeyboardInterrupt:
+                logger.info(f"Watch stopped <from = {options.root}>")
+        return True
+
+    def run(self, options: ManagerOptions) -> bool:
+        self.encoder = self.encoder_finder.select(options.encoder)
+        if self.encoder is None:
             return False
+        self.decoder_finder.prober.set_refresh(options.refresh_probe)
         if not os.path.exists(options.root):
             return False
         if os.path.isfile(options.root):
@@ -128,26 +460,30 @@ class ConverterManager:
         if not os.path.isdir(options.root):
             return False
 
+        if options.watch:
+            return self.watch(options)
+
         finder: FileFinder = FileFinder()
+        files: t.Iterable[str] = finder.iter(
+            options.root, -1 if options.deep else 0, self.pushdown()
+        )
+        for f in self.filters:
+            files = f.stream(files, options)
 
-        if not options.deep:
-            files = finder.find(options.root, 0)
-            for f in self.filters:
-                files = f.filter(files, options)
-            for index, file in enumerate(files):
-                if not self.do_convert(file, index, options, len(files)):
-                    continue
-        else:
-            for root, _, files in os.walk(options.root):
-                logger.info(f"Collecting <from = {root}>")
-                n_files = [os.path.join(root, file) for file in files]
-                for f in self.filters:
-                    n_files = f.filter(n_files, options)
-                for index, file in enumerate(n_files):
-                    if not self.do_convert(file, index, options, len(n_files)):
-                        continue
+        started: float = time.time()
+        with self.create_scheduler(options) as scheduler:
+            self.resume(scheduler, options)
+            if not options.resume:
+                for index, file in enumerate(files):
+                    self.schedule(scheduler, file, index, options, 0)
+        retention: float = Config().get("journal.retention", 7) * 86400
+        self.journal.prune(started, started - retention)
         return True
 
+    def start(self, options: ManagerOptions) -> bool:
+        with self.stat_cache.scope():
+            return self.run(options)
+
 
 class Converter(t.Protocol):
     def convert(self, *args: t.Any, **kwargs: t.Any) -> t.Any:
@@ -1,7 +1,10 @@
 import logging
 import os
 import typing as t
-from concurrent.futures import ThreadPoolExecutor
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from app.core.config import Config
 
 from .marker import Marker
 from .types import ManagerOptions
@@ -11,25 +14,38 @@ logger = logging.getLogger(__name__)
 
 class MarkerFilter:
 
-    def __init__(self):
+    def __init__(self, workers: int | None = None):
         self.marker = Marker()
+        self.workers: int = workers or Config().get("filter.workers", 16)
 
     def _filter(self, file: str, options: ManagerOptions) -> bool:
         base_name = os.path.basename(file)
-        return not self.marker.is_branded(file) and not base_name.startswith(
-            options.prefix
+        return not base_name.startswith(options.prefix) and not self.marker.is_branded(
+            file
         )
 
-    def filter(self, files: list[str], options: ManagerOptions) -> list[str]:
-        items: list[str] = []
-        with ThreadPoolExecutor() as executor:
-            items = list(
-                filter(
-                    lambda file: executor.submit(self._filter, file, options).result(),
-                    files,
-                )
-            )
+    def stream(
+        self, files: t.Iterable[str], options: ManagerOptions
+    ) -> t.Iterator[str]:
+        window: deque[tuple[str, Future[bool]]] = deque()
+        with ThreadPoolExecutor(
+            max_workers=self.workers, thread_name_prefix="marker"
+        ) as executor:
+            for file in files:
+                window.append((file, executor.submit(self._filter, file, options)))
+                while window and (
+                    window[0][1].done() or len(window) >= self.workers * 2
+                ):
+                    head, future = window.popleft()
+                    if future.result():
+                        yield head
+            while window:
+                file, future = window.popleft()
+                if future.result():
+                    yield file
 
+    def filter(self, files: list[str], options: ManagerOptions) -> list[str]:
+        items: list[str] = list(self.stream(files, options))
         logger.info(f"MarkerFilter <files = {len(items)}>")
         return items
 
@@ -50,9 +66,16 @@ class VideoFilter:
         "m4a",
     )
 
+    @property
+    def extensions(self) -> tuple[str, ...]:
+        return self._EXTENSIONS
+
     def is_video(self, file: str) -> bool:
         return file.endswith(self._EXTENSIONS)
 
+    def stream(self, files: t.Iterable[str], *args, **kwargs) -> t.Iterator[str]:
+        return filter(self.is_video, files)
+
     def filter(self, files: list[str], *args, **kwargs) -> list[str]:
         items: list[str] = []
         if isinstance(files, str):
@@ -69,6 +92,9 @@ class Ef2Filter:
     def is_ef2_file(self, file: str) -> bool:
         return file.endswith(".ef2")
 
+    def stream(self, files: t.Iterable[str], *args, **kwargs) -> t.Iterator[str]:
+        return filter(self.is_ef2_file, files)
+
     def filter(self, files: list[str]) -> list[str]:
         items = list(filter(self.is_ef2_file, files))
         logger.info(f"{self.__class__.__name__} <files = {len(items)}>")
@@ -78,3 +104,8 @@ class Ef2Filter:
 class Filter(t.Protocol):
     def filter(self, *args: t.Any, **kwargs: t.Any) -> t.Any:
         raise NotImplementedError()
+
+    def stream(
+        self, files: t.Iterable[str], *args: t.Any, **kwargs: t.Any
+    ) -> t.Iterator[str]:
+        raise NotImplementedError()
@@ -0,0 +1,120 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import typing as t
+from dataclasses import asdict
+
+from app.core.cache import cache_path
+
+from .remux import StreamPlan
+from .types import TaskOptions
+
+logger = logging.getLogger(__name__)
+
+JobState: t.TypeAlias = t.Literal["queued", "encoding", "finishing", "done", "failed"]
+
+
+class JournalEntry(t.NamedTuple):
+    task: TaskOptions
+    state: JobState
+    action: int
+
+
+class ConversionJournal:
+    _filename: t.ClassVar[str] = "journal.sqlite3"
+    _schema: t.ClassVar[str] = (
+        "CREATE TABLE IF NOT EXISTS jobs ("
+        "input_path TEXT PRIMARY KEY, state TEXT NOT NULL, "
+        "action INTEGER NOT NULL DEFAULT 0, task TEXT NOT NULL, "
+        "updated REAL NOT NULL, error TEXT)"
+    )
+    _unfinished: t.ClassVar[tuple[str, ...]] = ("queued", "encoding", "finishing")
+
+    def __init__(self, path: str | None = None) -> None:
+        self.path: str | None = path
+        self.lock: threading.Lock = threading.Lock()
+        self._connection: sqlite3.Connection | None = None
+
+    @property
+    def connection(self) -> sqlite3.Connection:
+        if self._connection is None:
+            self._connection = sqlite3.connect(
+                self.path or cache_path(self._filename), check_same_thread=False
+            )
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute("PRAGMA synchronous=NORMAL")
+            self._connection.execute(self._schema)
+        return self._connection
+
+    @staticmethod
+    def dumps(task: TaskOptions) -> str:
+        return json.dumps(asdict(task), ensure_ascii=False)
+
+    @staticmethod
+    def loads(data: str) -> TaskOptions:
+        values: dict[str, t.Any] = json.loads(data)
+        plan: StreamPlan = StreamPlan(**values.pop("plan", {}))
+        return TaskOptions(**values, plan=plan)
+
+    def queue(self, task: TaskOptions) -> None:
+        with self.lock, self.connection:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO jobs VALUES (?, 'queued', 0, ?, ?, NULL)",
+                (task.input_path, self.dumps(task), time.time()),
+            )
+
+    def mark(self, path: str, state: JobState, error: str | None = None) -> None:
+        with self.lock, self.connection:
+            self.connection.execute(
+                "UPDATE jobs SET state = ?, error = ?, updated = ? "
+                "WHERE input_path = ?",
+                (state, error, time.time(), path),
+            )
+
+    def advance(self, path: str, action: int) -> None:
+        with self.lock, self.connection:
+            self.connection.execute(
+                "UPDATE jobs SET action = ?, updated = ? WHERE input_path = ?",
+                (action, time.time(), path),
+            )
+
+    def get(self, path: str) -> JournalEntry | None:
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT task, state, action FROM jobs WHERE input_path = ?", (path,)
+            ).fetchone()
+        return JournalEntry(self.loads(row[0]), row[1], row[2]) if row else None
+
+    def unfinished(self, root: str) -> list[JournalEntry]:
+        root = os.path.join(os.path.abspath(root), "")
+        marks: str = ", ".join("?" for _ in self._unfinished)
+        with self.lock:
+            rows = self.connection.execute(
+                f"SELECT task, state, action FROM jobs WHERE state IN ({marks}) "
+                "AND substr(input_path, 1, ?) = ? ORDER BY updated",
+                (*self._unfinished, len(root), root),
+            ).fetchall()
+        return [
+            JournalEntry(self.loads(task), state, action)
+            for task, state, action in rows
+        ]
+
+    def prune(self, before: float, failed_before: float | None = None) -> None:
+        with self.lock, self.connection:
+            self.connection.execute(
+                "DELETE FROM jobs WHERE state = 'done' AND updated < ?", (before,)
+            )
+            if failed_before is not None:
+                self.connection.execute(
+                    "DELETE FROM jobs WHERE state = 'failed' AND updated < ?",
+                    (failed_before,),
+                )
+
+    def close(self) -> None:
+        with self.lock:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
@@ -1,7 +1,28 @@
+import logging
 import os
+import threading
+import time
+import typing as t
 
+from app.core.cache import JsonStore
+from app.core.config import Config
+from app.core.snapshot import StatCache
 
-class Marker:
+logger = logging.getLogger(__name__)
+
+
+class MarkerBackend(t.Protocol):
+    name: str
+
+    def brand(self, path: str) -> bool: ...
+
+    def is_branded(self, path: str) -> bool: ...
+
+    def rename(self, source: str, target: str) -> bool: ...
+
+
+class ByteMarker:
+    name: str = "byte"
     _SYMBOL: bytes = b"C"
 
     @property
@@ -53,3 +74,151 @@ class Marker:
                 return file.read(1) == symbol
         except Exception:
             return False
+
+    def rename(self, source: str, target: str) -> bool:
+        return True
+
+
+class XattrMarker:
+    name: str = "xattr"
+    _KEY: t.ClassVar[str] = "user.sometools.converted"
+
+    @staticmethod
+    def is_available() -> bool:
+        return hasattr(os, "setxattr") and hasattr(os, "getxattr")
+
+    def brand(self, path: str) -> bool:
+        if not self.is_available():
+            return False
+        try:
+            os.setxattr(path, self._KEY, str(int(time.time())).encode())
+            return True
+        except OSError as e:
+            logger.debug(f"Xattr unsupported <from = {path}, error = {e}>")
+            return False
+
+    def is_branded(self, path: str) -> bool:
+        if not self.is_available():
+            return False
+        try:
+            return bool(os.getxattr(path, self._KEY))
+        except OSError:
+            return False
+
+    def rename(self, source: str, target: str) -> bool:
+        return True
+
+
+class SidecarMarker:
+    name: str = "sidecar"
+    _FILENAME: t.ClassVar[str] = ".sometools-marker.json"
+    lock: t.ClassVar[threading.Lock] = threading.Lock()
+    indexes: t.ClassVar[dict[str, tuple[int, dict[str, str]]]] = {}
+
+    @staticmethod
+    def fingerprint(stat: os.stat_result) -> str:
+        return f"{stat.st_size}:{stat.st_mtime_ns}"
+
+    def store(self, folder: str) -> JsonStore:
+        return JsonStore(os.path.join(folder, self._FILENAME))
+
+    def version(self, folder: str) -> int:
+        try:
+            return os.stat(os.path.join(folder, self._FILENAME)).st_mtime_ns
+        except OSError:
+            return -1
+
+    def index(self, folder: str) -> dict[str, str]:
+        version: int = self.version(folder)
+        with self.lock:
+            cached: tuple[int, dict[str, str]] | None = self.indexes.get(folder)
+            if cached is None or cached[0] != version:
+                files: dict[str, str] = self.store(folder).load().get("files", {})
+                cached = self.indexes[folder] = (version, dict(files))
+            return cached[1]
+
+    def update(self, path: str, fingerprint: str | None) -> None:
+        folder, name = os.path.split(path)
+        store: JsonStore = self.store(folder)
+        data: dict[str, t.Any] = store.load()
+        files: dict[str, str] = data.setdefault("files", {})
+        if fingerprint is None:
+            files.pop(name, None)
+        else:
+            files[name] = fingerprint
+        store.dump(data)
+        self.indexes[folder] = (self.version(folder), dict(files))
+
+    def brand(self, path: str) -> bool:
+        path = os.path.abspath(path)
+        try:
+            fingerprint: str = self.fingerprint(os.stat(path))
+            with self.lock:
+                self.update(path, fingerprint)
+            return True
+        except OSError as e:
+            logger.warning(f"Sidecar not written <from = {path}, error = {e}>")
+            return False
+
+    def is_branded(self, path: str) -> bool:
+        path = os.path.abspath(path)
+        stat: os.stat_result | None = StatCache().stat(path)
+        if stat is None:
+            return False
+        folder, name = os.path.split(path)
+        return self.index(folder).get(name) == self.fingerprint(stat)
+
+    def rename(self, source: str, target: str) -> bool:
+        source, target = os.path.abspath(source), os.path.abspath(target)
+        folder, name = os.path.split(source)
+        fingerprint: str | None = self.index(folder).get(name)
+        if fingerprint is None:
+            return False
+        try:
+            with self.lock:
+                self.update(source, None)
+                self.update(target, fingerprint)
+            return True
+        except OSError as e:
+            logger.warning(f"Sidecar not moved <from = {source}, error = {e}>")
+            return False
+
+
+def create_backends(name: str | None = None) -> list[MarkerBackend]:
+    name = name or Config().get("marker.backend", "auto")
+    if name == ByteMarker.name:
+        return [ByteMarker()]
+    if name == XattrMarker.name:
+        return [XattrMarker()]
+    if name == SidecarMarker.name:
+        return [SidecarMarker()]
+    return [XattrMarker(), SidecarMarker()]
+
+
+class Marker:
+    def __init__(
+        self,
+        backends: list[MarkerBackend] | None = None,
+        legacy: bool | None = None,
+    ) -> None:
+        self.backends: list[MarkerBackend] = (
+            create_backends() if backends is None else backends
+        )
+        if legacy is None:
+            legacy = Config().get("marker.legacy", True)
+        self.legacy: ByteMarker | None = ByteMarker() if legacy else None
+
+    def brand(self, path: str) -> bool:
+        for backend in self.backends:
+            if backend.brand(path):
+                return True
+        return False
+
+    def is_branded(self, path: str) -> bool:
+        if any(backend.is_branded(path) for backend in self.backends):
+            return True
+        return self.legacy is not None and self.legacy.is_branded(path)
+
+    def rename(self, source: str, target: str) -> None:
+        for backend in self.backends:
+            backend.rename(source, target)
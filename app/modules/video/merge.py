@@ -1,19 +1,27 @@
+import logging
 import os
+import typing as t
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
 from dataclasses import asdict
 
+from app.core.config import Config
 from app.core.ffmpeg import FFMpeg
-from app.core.file import Reader
 from app.core.path import FileFinder
+from app.core.probe import Prober
+from app.core.snapshot import StatCache
 
 from .action import ActionOptions, RemoveCacheAction
 from .filter import Ef2Filter
 from .refiner import BiliBiliEf2Refiner
 from .types import BiliBiliEf2Info, MergeManagerOptions, ZipperInfo
 
+logger = logging.getLogger(__name__)
+
 
 class Zipper:
     def invoke(
-        self, infos: list[BiliBiliEf2Info], options: MergeManagerOptions
+        self, infos: t.Iterable[BiliBiliEf2Info], options: MergeManagerOptions
     ) -> list[ZipperInfo]:
         zipped_files: dict[str, list[BiliBiliEf2Info]] = {}
 
@@ -32,34 +40,87 @@ class MergeManager:
         self.finder: FileFinder = FileFinder()
         self.ef2_refiner: BiliBiliEf2Refiner = BiliBiliEf2Refiner()
         self.ef2_filter: Ef2Filter = Ef2Filter()
-        self.ef2_reader: Reader = Reader()
         self.zipper = Zipper()
+        self.prober: Prober = Prober()
 
     def find_ef2_paths(self, options: MergeManagerOptions) -> list[str]:
-        paths: list[str] = self.finder.find(options.ef2_input)
+        paths: list[str] = self.finder.find(options.ef2_input, extensions=(".ef2",))
         paths = self.ef2_filter.filter(paths)
         return paths
 
-    def find_ef2_infos(
-        self, paths: list[str], options: MergeManagerOptions
+    def read_ef2_infos(
+        self, path: str, options: MergeManagerOptions
     ) -> list[BiliBiliEf2Info]:
-        files: list[str] = [self.ef2_reader.read(file) for file in paths]
-        infos: list[BiliBiliEf2Info] = [
-            refined_info
-            for info in files
-            for refined_info in self.ef2_refiner.refine(info, options)
-        ]
-        return infos
+        return list(self.ef2_refiner.parse(path, options))
 
-    def do_zipper(self, task: ZipperInfo, options: MergeManagerOptions) -> bool:
-        ffmpeg = FFMpeg()
-        for video in task.videos:
-            ffmpeg.option("i", os.path.abspath(video.input_path))
-        ffmpeg.option("c:v", "copy")
-        ffmpeg.option("c:a", "copy")
+    def find_ef2_infos(
+        self, paths: t.Iterable[str], options: MergeManagerOptions
+    ) -> t.Iterator[BiliBiliEf2Info]:
+        workers: int = self.workers(options)
+        window: deque[Future[list[BiliBiliEf2Info]]] = deque()
+        with ThreadPoolExecutor(workers, thread_name_prefix="ef2") as executor:
+            for path in paths:
+                window.append(executor.submit(self.read_ef2_infos, path, options))
+                if len(window) >= workers * 2:
+                    yield from window.popleft().result()
+            while window:
+                yield from window.popleft().result()
+
+    @staticmethod
+    def workers(options: MergeManagerOptions) -> int:
+        return max(options.jobs or Config().get("merge.workers", 4), 1)
+
+    def is_mergeable(self, task: ZipperInfo) -> bool:
+        return all(
+            self.prober.probe(video.input_path).get("streams")
+            for video in task.videos
+        )
+
+    def codec_types(self, video: BiliBiliEf2Info) -> set[str]:
+        streams: list[dict] = self.prober.probe(video.input_path).get("streams", [])
+        return {stream.get("codec_type", "") for stream in streams}
+
+    def is_complementary(self, task: ZipperInfo) -> bool:
+        types: list[set[str]] = [self.codec_types(video) for video in task.videos]
+        return len(types) > 1 and sum(map(len, types)) == len(set().union(*types))
+
+    @staticmethod
+    def listing_path(task: ZipperInfo) -> str:
+        return os.path.join(task.output, f".{task.name}.concat.txt")
+
+    def write_listing(self, task: ZipperInfo) -> str:
+        listing: str = self.listing_path(task)
+        with open(listing, "w", encoding="utf-8") as f:
+            for video in task.videos:
+                path: str = os.path.abspath(video.input_path).replace("'", "'\\''")
+                f.write(f"file '{path}'\n")
+        return listing
+
+    def build(self, task: ZipperInfo) -> FFMpeg:
+        ffmpeg: FFMpeg = FFMpeg()
+        ffmpeg.option("hide_banner")
+        if self.is_complementary(task):
+            for video in task.videos:
+                ffmpeg.option("i", os.path.abspath(video.input_path))
+            for index in range(len(task.videos)):
+                ffmpeg.option("map", str(index))
+        else:
+            ffmpeg.option("f", "concat")
+            ffmpeg.option("safe", "0")
+            ffmpeg.option("i", self.write_listing(task))
+            ffmpeg.option("map", "0")
+        ffmpeg.option("c", "copy")
         ffmpeg.option("y", os.path.abspath(task.output_path))
+        return ffmpeg
 
-        flag = ffmpeg.invoke()
+    def do_zipper(self, task: ZipperInfo, options: MergeManagerOptions) -> bool:
+        try:
+            flag: bool = self.build(task).invoke()["code"] == 0
+        finally:
+            StatCache().invalidate(task.output_path)
+            if os.path.exists(self.listing_path(task)):
+                os.remove(self.listing_path(task))
+        logger.info(f"Merged <name = {task.name}, status = {flag}>")
 
         paths_to_remove = (
             [task.output_path]
@@ -72,9 +133,29 @@ class MergeManager:
             )
         return flag
 
-    def start(self, options: MergeManagerOptions):
+    def do_task(self, task: ZipperInfo, options: MergeManagerOptions) -> bool:
+        if not self.is_mergeable(task):
+            logger.info(f"Skipping <name = {task.name}, reason = unreadable>")
+            return False
+        return self.do_zipper(task, options)
+
+    def start(self, options: MergeManagerOptions) -> bool:
+        with StatCache().scope():
+            return self.run(options)
+
+    def run(self, options: MergeManagerOptions) -> bool:
+        self.prober.set_refresh(options.refresh_probe)
         paths: list[str] = self.find_ef2_paths(options)
-        infos: list[BiliBiliEf2Info] = self.find_ef2_infos(paths, options)
+        infos: t.Iterable[BiliBiliEf2Info] = self.find_ef2_infos(paths, options)
+        tasks: list[ZipperInfo] = self.zipper.invoke(infos, options)
 
-        for task in self.zipper.invoke(infos, options):
-            self.do_zipper(task, options)
+        workers: int = self.workers(options)
+        with ThreadPoolExecutor(workers, thread_name_prefix="merge") as executor:
+            results: list[bool] = list(
+                executor.map(lambda task: self.do_task(task, options), tasks)
+            )
+        logger.info(
+            f"MergeManager <tasks = {len(tasks)}, merged = {sum(results)}, "
+            f"workers = {workers}>"
+        )
+        return all(results)
@@ -1,38 +1,58 @@
 import os
 import re
+import typing as t
 from dataclasses import asdict
 
+from app.core.file import Reader
+
 from .types import BiliBiliEf2Info, MergeManagerOptions
 
 
 class BiliBiliEf2Refiner:
-    _episode_pattern = re.compile(r"<(.*?)>", re.M | re.DOTALL)
-    _link_pattern = re.compile(r"(https://[^\s]+)")
-    _referer_pattern = re.compile(r"referer:\s*(\S+)")
-    _user_agent_pattern = re.compile(r"User-Agent:\s*(.*?)(?:\r?\n|$)", re.IGNORECASE)
-    _filename_pattern = re.compile(r"filename:\s*(.*?)(?:\r?\n|$)", re.IGNORECASE)
+    _scanner = re.compile(
+        rb"(?P<open><)|(?P<close>>)"
+        rb"|(?P<link>https://[^\s<>]+)"
+        rb"|referer:[ \t]*(?P<referer>[^\s<>]+)"
+        rb"|(?i:User-Agent):[ \t]*(?P<user_agent>[^\r\n>]*)"
+        rb"|(?i:filename):[ \t]*(?P<filename>[^\r\n>]*)"
+    )
     _download_name_pattern = re.compile(r"^http.*/(.*?)(?=\?e=)", re.S | re.M)
 
-    def _refine(self, info: str) -> dict[str, str]:
-        ret = {"filename": "", "referer": "", "link": "", "user_agent": ""}
-
-        if m := self._link_pattern.search(info):
-            ret["link"] = m.group(1)
-        if m := self._referer_pattern.search(info):
-            ret["referer"] = m.group(1)
-        if m := self._user_agent_pattern.search(info):
-            ret["user_agent"] = m.group(1)
-        if m := self._filename_pattern.search(info):
-            ret["filename"] = m.group(1)
+    def __init__(self) -> None:
+        self.reader: Reader = Reader()
+
+    def _refine(self, fields: dict[str, str]) -> dict[str, str]:
+        ret = {"filename": "", "referer": "", "link": "", "user_agent": "", **fields}
         if m := self._download_name_pattern.search(ret["link"]):
-            original = m.group(1)
-            name = os.path.splitext(original)[0]
+            name = os.path.splitext(m.group(1))[0]
             ext = os.path.splitext(ret["filename"])[1]
             ret["download_name"] = f"{name}{ext}"
-
         return ret
 
+    def scan(self, buffer: bytes | t.Any) -> t.Iterator[dict[str, str]]:
+        fields: dict[str, str] | None = None
+        for m in self._scanner.finditer(buffer):
+            kind: str | None = m.lastgroup
+            if kind == "open":
+                fields = {} if fields is None else fields
+            elif kind == "close":
+                if fields is not None:
+                    yield self._refine(fields)
+                fields = None
+            elif fields is not None and kind not in fields:
+                fields[kind] = m.group(kind).decode("utf-8", "replace").strip()
+
+    def parse(
+        self, path: str, options: MergeManagerOptions
+    ) -> t.Iterator[BiliBiliEf2Info]:
+        defaults: dict[str, t.Any] = asdict(options)
+        with self.reader.map(path) as buffer:
+            for o in self.scan(buffer):
+                yield BiliBiliEf2Info(**{**o, **defaults})
+
     def refine(self, info: str, options: MergeManagerOptions) -> list[BiliBiliEf2Info]:
-        eps = self._episode_pattern.findall(info)
-        infos = [self._refine(ep) for ep in eps]
-        return [BiliBiliEf2Info(**{**o, **asdict(options)}) for o in infos]
+        defaults: dict[str, t.Any] = asdict(options)
+        return [
+            BiliBiliEf2Info(**{**o, **defaults})
+            for o in self.scan(info.encode("utf-8"))
+        ]
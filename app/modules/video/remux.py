@@ -0,0 +1,59 @@
+import logging
+import typing as t
+from dataclasses import dataclass
+
+import pydash
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class StreamPlan:
+    video_index: int | None = None
+    audio_index: int | None = None
+    video_codec: str = ""
+    audio_codec: str = ""
+    copy_video: bool = False
+    copy_audio: bool = False
+
+    @property
+    def remux(self) -> bool:
+        return self.copy_video and (self.copy_audio or self.audio_index is None)
+
+
+class RemuxPlanner:
+    _CONTAINERS: t.ClassVar[dict[str, tuple[tuple[str, ...], tuple[str, ...]]]] = {
+        "mp4": (("h264", "hevc", "av1"), ("aac", "mp3", "ac3", "eac3", "alac")),
+        "m4v": (("h264", "hevc"), ("aac", "ac3")),
+        "mov": (("h264", "hevc", "prores"), ("aac", "mp3", "alac", "pcm_s16le")),
+        "mkv": (("h264", "hevc", "av1", "vp9"), ("aac", "mp3", "ac3", "opus", "flac")),
+    }
+    _PICTURES: t.ClassVar[tuple[str, ...]] = ("mjpeg", "png", "bmp", "gif")
+
+    def select(self, streams: list[dict[str, t.Any]], kind: str) -> dict | None:
+        for stream in streams:
+            if stream.get("codec_type") != kind:
+                continue
+            if kind == "video" and (
+                stream.get("codec_name") in self._PICTURES
+                or pydash.get(stream, "disposition.attached_pic")
+            ):
+                continue
+            return stream
+        return None
+
+    def plan(self, data: dict[str, t.Any], ext: str) -> StreamPlan:
+        streams: list[dict[str, t.Any]] = data.get("streams", [])
+        video, audio = self.select(streams, "video"), self.select(streams, "audio")
+        video_codecs, audio_codecs = self._CONTAINERS.get(ext.lower(), ((), ()))
+
+        plan: StreamPlan = StreamPlan()
+        if video is not None:
+            plan.video_index = video.get("index")
+            plan.video_codec = video.get("codec_name", "")
+            plan.copy_video = plan.video_codec in video_codecs
+        if audio is not None:
+            plan.audio_index = audio.get("index")
+            plan.audio_codec = audio.get("codec_name", "")
+            plan.copy_audio = plan.audio_codec in audio_codecs
+        return plan
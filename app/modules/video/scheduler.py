@@ -0,0 +1,186 @@
+import logging
+import queue
+import threading
+import time
+import typing as t
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class JobStats:
+    name: str
+    encoded: bool = False
+    finished: bool = False
+    encode_time: float = 0.0
+    finish_time: float = 0.0
+
+
+@dataclass
+class SchedulerStats:
+    jobs: list[JobStats] = field(default_factory=list)
+    started: float = field(default_factory=time.perf_counter)
+
+    @property
+    def wall_time(self) -> float:
+        return time.perf_counter() - self.started
+
+    @property
+    def encode_time(self) -> float:
+        return sum(job.encode_time for job in self.jobs)
+
+    @property
+    def succeeded(self) -> int:
+        return sum(1 for job in self.jobs if job.finished)
+
+    @property
+    def failed(self) -> int:
+        return len(self.jobs) - self.succeeded
+
+
+@dataclass
+class Job:
+    stats: JobStats
+    encode: t.Callable[[int], bool]
+    finish: t.Callable[[bool], bool]
+    devices: tuple[int, ...] = ()
+
+
+class DeviceLimiter:
+    def __init__(self, limit: t.Callable[[int], int] | None = None) -> None:
+        self.limit: t.Callable[[int], int] = limit or (lambda dev: 0)
+        self.running: dict[int, int] = {}
+
+    def available(self, devices: t.Iterable[int]) -> bool:
+        for dev in devices:
+            limit: int = self.limit(dev)
+            if limit > 0 and self.running.get(dev, 0) >= limit:
+                return False
+        return True
+
+    def take(self, devices: t.Iterable[int]) -> None:
+        for dev in devices:
+            self.running[dev] = self.running.get(dev, 0) + 1
+
+    def give(self, devices: t.Iterable[int]) -> None:
+        for dev in devices:
+            self.running[dev] -= 1
+
+
+class JobScheduler:
+    def __init__(
+        self,
+        jobs: int = 1,
+        backlog: int | None = None,
+        limiter: DeviceLimiter | None = None,
+    ) -> None:
+        self.jobs: int = max(jobs, 1)
+        self.encoders: ThreadPoolExecutor = ThreadPoolExecutor(
+            max_workers=self.jobs, thread_name_prefix="encode"
+        )
+        self.finishers: ThreadPoolExecutor = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="finish"
+        )
+        self.pending: threading.BoundedSemaphore = threading.BoundedSemaphore(
+            self.jobs + (self.jobs * 4 if backlog is None else max(backlog, 0))
+        )
+        self.slots: queue.SimpleQueue[int] = queue.SimpleQueue()
+        for slot in range(self.jobs):
+            self.slots.put(slot)
+        self.limiter: DeviceLimiter = limiter or DeviceLimiter()
+        self.waiting: list[Job] = []
+        self.running: int = 0
+        self.lock: threading.RLock = threading.RLock()
+        self.futures: list[Future] = []
+        self.stats: SchedulerStats = SchedulerStats()
+
+    def track(self, future: Future) -> Future:
+        with self.lock:
+            self.futures.append(future)
+        return future
+
+    def dispatch(self) -> None:
+        with self.lock:
+            for job in list(self.waiting):
+                if self.running >= self.jobs:
+                    break
+                if not self.limiter.available(job.devices):
+                    continue
+                self.waiting.remove(job)
+                self.limiter.take(job.devices)
+                self.running += 1
+                self.track(self.encoders.submit(self.do_encode, job))
+
+    def submit(
+        self,
+        name: str,
+        encode: t.Callable[[int], bool],
+        finish: t.Callable[[bool], bool],
+        devices: t.Sequence[int] = (),
+    ) -> None:
+        self.pending.acquire()
+        job: Job = Job(JobStats(name), encode, finish, tuple(devices))
+        with self.lock:
+            self.stats.jobs.append(job.stats)
+            self.waiting.append(job)
+            self.dispatch()
+
+    def do_encode(self, job: Job) -> bool:
+        stats: JobStats = job.stats
+        slot: int = self.slots.get()
+        start: float = time.perf_counter()
+        try:
+            stats.encoded = job.encode(slot)
+        except Exception as e:
+            logger.error(f"Encode failed <name = {stats.name}, error = {e}>")
+            stats.encoded = False
+        finally:
+            stats.encode_time = time.perf_counter() - start
+            self.slots.put(slot)
+            with self.lock:
+                self.running -= 1
+                self.limiter.give(job.devices)
+                self.dispatch()
+            self.pending.release()
+        self.track(self.finishers.submit(self.do_finish, stats, job.finish))
+        return stats.encoded
+
+    def do_finish(self, stats: JobStats, finish: t.Callable[[bool], bool]) -> bool:
+        start: float = time.perf_counter()
+        try:
+            stats.finished = finish(stats.encoded) and stats.encoded
+        except Exception as e:
+            logger.error(f"Finish failed <name = {stats.name}, error = {e}>")
+            stats.finished = False
+        finally:
+            stats.finish_time = time.perf_counter() - start
+        return stats.finished
+
+    def join(self) -> SchedulerStats:
+        while True:
+            with self.lock:
+                futures = [f for f in self.futures if not f.done()]
+                idle: bool = not futures and not self.waiting
+            if idle:
+                break
+            wait(futures)
+        return self.stats
+
+    def shutdown(self) -> SchedulerStats:
+        stats = self.join()
+        self.encoders.shutdown()
+        self.finishers.shutdown()
+        logger.info(
+            f"Scheduler <jobs = {len(stats.jobs)}, succeeded = {stats.succeeded}, "
+            f"failed = {stats.failed}, encode = {stats.encode_time:.1f}s, "
+            f"wall = {stats.wall_time:.1f}s>"
+        )
+        return stats
+
+    def __enter__(self) -> t.Self:
+        return self
+
+    def __exit__(self, *args: t.Any) -> None:
+        self.shutdown()
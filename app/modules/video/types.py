@@ -2,6 +2,9 @@ import os
 from dataclasses import dataclass, field
 
 from app.composable.repr import customer_repr
+from app.core.snapshot import StatCache
+
+from .remux import StreamPlan
 
 
 @customer_repr()
@@ -15,16 +18,25 @@ class ManagerOptions:
     prefix: str = "#"
     ext: str = "mp4"
     verbose: bool = False
+    refresh_probe: bool = False
+    jobs: int = 1
+    encoder: str = "auto"
+    preset: str = ""
+    remux: bool = True
+    segments: int = 0
+    segment_min_duration: float = 300
+    watch: bool = False
+    resume: bool = False
 
 
 @customer_repr()
 @dataclass
 class TaskOptions(ManagerOptions):
     input_path: str = ""
-    encoder: str = "h264_nvenc"
     decoder: str = "libx264"
     total: int = 0
     current: int = 0
+    plan: StreamPlan = field(default_factory=StreamPlan)
 
     @property
     def folder(self) -> str:
@@ -45,9 +57,9 @@ class TaskOptions(ManagerOptions):
         name = f"{self.filename}.{self.ext}"
         path = os.path.join(self.folder, name)
         path = os.path.abspath(path)
-        if os.path.exists(path):
+        if StatCache().exists(path):
             counter = 1
-            while not os.path.exists(path):
+            while not StatCache().exists(path):
                 path = os.path.join(
                     self.folder, f"{self.filename}_{counter}.{self.ext}"
                 )
@@ -62,6 +74,8 @@ class MergeManagerOptions:
     output: str = "."
     ext: str = "mp4"
     verbose: bool = False
+    refresh_probe: bool = False
+    jobs: int = 0
 
 
 @customer_repr(hidden=["link", "user_agent", "referer"])
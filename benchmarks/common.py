@@ -0,0 +1,78 @@
+import json
+import os
+import shutil
+import time
+import typing as t
+
+from app.core.ffmpeg import FFMpeg
+
+
+def make_clip(
+    path: str,
+    size: str = "320x240",
+    duration: float = 2,
+    rate: int = 25,
+    codec: str = "libx264",
+) -> bool:
+    if os.path.exists(path):
+        return True
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    ffmpeg: FFMpeg = FFMpeg()
+    ffmpeg.option("hide_banner")
+    ffmpeg.option("f", "lavfi")
+    ffmpeg.option("i", f"testsrc2=size={size}:rate={rate}")
+    ffmpeg.option("f", "lavfi")
+    ffmpeg.option("i", "sine=frequency=440:sample_rate=48000")
+    ffmpeg.option("t", str(duration))
+    ffmpeg.option("c:v", codec)
+    ffmpeg.option("pix_fmt", "yuv420p")
+    ffmpeg.option("c:a", "aac")
+    ffmpeg.option("y", path)
+    return ffmpeg.invoke()["code"] == 0
+
+
+def make_tree(seed: str, root: str, files: int, per_folder: int = 100) -> list[str]:
+    ext: str = os.path.splitext(seed)[1]
+    paths: list[str] = []
+    for i in range(files):
+        folder: str = os.path.join(root, f"d{i // per_folder:05d}")
+        os.makedirs(folder, exist_ok=True)
+        path: str = os.path.join(folder, f"f{i:07d}{ext}")
+        if not os.path.exists(path):
+            try:
+                os.link(seed, path)
+            except OSError:
+                shutil.copyfile(seed, path)
+        paths.append(path)
+    return paths
+
+
+class Timer:
+    def __init__(self) -> None:
+        self.wall: float = 0
+        self.cpu: float = 0
+        self.children: float = 0
+
+    @staticmethod
+    def children_time() -> float:
+        times = os.times()
+        return times.children_user + times.children_system
+
+    def __enter__(self) -> t.Self:
+        self._wall = time.perf_counter()
+        self._cpu = time.process_time()
+        self._children = self.children_time()
+        return self
+
+    def __exit__(self, *args: t.Any) -> None:
+        self.wall = time.perf_counter() - self._wall
+        self.cpu = time.process_time() - self._cpu
+        self.children = self.children_time() - self._children
+
+
+def report(data: t.Any, output: str | None = None) -> None:
+    text: str = json.dumps(data, indent=2, ensure_ascii=False)
+    if output:
+        with open(output, "w", encoding="utf-8") as f:
+            f.write(text)
+    print(text)
@@ -0,0 +1,61 @@
+import os
+import tempfile
+import typing as t
+
+import click
+
+from app.core.path import FileFinder
+
+from .common import Timer, make_tree, report
+
+
+def walk(root: str) -> t.Iterator[str]:
+    for folder, _, files in os.walk(root):
+        for file in files:
+            yield os.path.join(folder, file)
+
+
+def measure(name: str, iterator: t.Callable[[], t.Iterable[str]]) -> dict:
+    count: int = 0
+    with Timer() as timer:
+        for _ in iterator():
+            count += 1
+    return {
+        "finder": name,
+        "files": count,
+        "wall": round(timer.wall, 4),
+        "cpu": round(timer.cpu, 4),
+        "files_per_second": round(count / timer.wall, 2) if timer.wall else 0,
+    }
+
+
+@click.command()
+@click.option("--root", "-r", type=click.Path(), default=None)
+@click.option("--files", "-n", type=int, default=1_000_000)
+@click.option("--per-folder", "-p", "per_folder", type=int, default=1000)
+@click.option("--workers", "-w", type=int, multiple=True, default=(1, 8, 32))
+@click.option("--output", "-o", type=click.Path(), default=None)
+def main(
+    root: str | None,
+    files: int,
+    per_folder: int,
+    workers: tuple[int, ...],
+    output: str | None,
+) -> None:
+    root = root or os.path.join(tempfile.gettempdir(), "sometools-bench-finder")
+    seed: str = os.path.join(root, "seed.mp4")
+    if not os.path.exists(seed):
+        os.makedirs(root, exist_ok=True)
+        open(seed, "wb").close()
+    tree: str = os.path.join(root, "tree")
+    make_tree(seed, tree, files, per_folder)
+
+    results: list[dict] = [measure("os.walk", lambda: walk(tree))]
+    for n in workers:
+        finder: FileFinder = FileFinder(n)
+        results.append(measure(f"scandir[{n}]", lambda: finder.iter(tree)))
+    report(results, output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,49 @@
+import os
+import tempfile
+
+import click
+
+from app.core.probe import (
+    ProbeBackend,
+    PyAVProbeBackend,
+    SubprocessProbeBackend,
+)
+
+from .common import Timer, make_clip, make_tree, report
+
+
+def measure(backend: ProbeBackend, paths: list[str]) -> dict:
+    failures: int = 0
+    with Timer() as timer:
+        for path in paths:
+            if not backend.probe(path).get("streams"):
+                failures += 1
+    return {
+        "backend": backend.name,
+        "files": len(paths),
+        "failures": failures,
+        "wall": round(timer.wall, 4),
+        "cpu": round(timer.cpu, 4),
+        "files_per_second": round(len(paths) / timer.wall, 2) if timer.wall else 0,
+    }
+
+
+@click.command()
+@click.option("--root", "-r", type=click.Path(), default=None)
+@click.option("--files", "-n", type=int, default=500)
+@click.option("--output", "-o", type=click.Path(), default=None)
+def main(root: str | None, files: int, output: str | None) -> None:
+    root = root or os.path.join(tempfile.gettempdir(), "sometools-bench-probe")
+    seed: str = os.path.join(root, "seed.mkv")
+    if not make_clip(seed):
+        raise click.ClickException("ffmpeg is required to generate the seed clip")
+    paths: list[str] = make_tree(seed, os.path.join(root, "tree"), files)
+
+    backends: list[ProbeBackend] = [SubprocessProbeBackend()]
+    if PyAVProbeBackend.is_available():
+        backends.append(PyAVProbeBackend())
+    report([measure(backend, paths) for backend in backends], output)
+
+
+if __name__ == "__main__":
+    main()
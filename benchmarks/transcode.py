@@ -0,0 +1,146 @@
+import itertools
+import json
+import os
+import shutil
+import tempfile
+import typing as t
+
+import click
+
+from app.modules.video.converter import ConverterManager
+from app.modules.video.filter import VideoFilter
+from app.modules.video.journal import ConversionJournal
+from app.modules.video.types import ManagerOptions
+
+from .common import Timer, make_clip, report
+
+RATE: int = 25
+
+
+class Case(t.NamedTuple):
+    size: str
+    source: str
+    duration: float
+    encoder: str
+    preset: str
+    jobs: int
+
+    @property
+    def key(self) -> str:
+        return "/".join(str(x) for x in self)
+
+
+def prepare(root: str, case: Case, clips: int) -> str:
+    seed: str = os.path.join(
+        root, "clips", f"{case.size}-{case.source}-{case.duration:g}.mkv"
+    )
+    if not make_clip(seed, case.size, case.duration, RATE, case.source):
+        raise click.ClickException(f"Clip not generated <case = {case.key}>")
+    folder: str = os.path.join(root, "work", "in")
+    shutil.rmtree(os.path.join(root, "work"), ignore_errors=True)
+    os.makedirs(folder)
+    for i in range(clips):
+        shutil.copyfile(seed, os.path.join(folder, f"clip{i:03d}.mkv"))
+    return folder
+
+
+def measure(root: str, case: Case, clips: int, remux: bool) -> dict:
+    source: str = prepare(root, case, clips)
+    target: str = os.path.join(root, "work", "out")
+    os.makedirs(target)
+
+    manager: ConverterManager = ConverterManager()
+    manager.journal = ConversionJournal(os.path.join(root, "work", "journal.sqlite3"))
+    manager.set_filter(VideoFilter())
+    options: ManagerOptions = ManagerOptions(
+        root=source,
+        to=target,
+        encoder=case.encoder,
+        preset=case.preset,
+        jobs=case.jobs,
+        remux=remux,
+    )
+    with Timer() as timer:
+        manager.start(options)
+    manager.journal.close()
+
+    converted: int = len([n for n in os.listdir(target) if n.endswith(".mp4")])
+    frames: float = converted * case.duration * RATE
+    seconds: float = converted * case.duration
+    return {
+        "case": case.key,
+        **case._asdict(),
+        "files": clips,
+        "converted": converted,
+        "wall": round(timer.wall, 4),
+        "cpu": round(timer.cpu + timer.children, 4),
+        "fps": round(frames / timer.wall, 2) if timer.wall else 0,
+        "speed": round(seconds / timer.wall, 2) if timer.wall else 0,
+    }
+
+
+def compare(
+    results: list[dict], baseline: list[dict], tolerance: float
+) -> list[dict]:
+    previous: dict[str, dict] = {item["case"]: item for item in baseline}
+    regressions: list[dict] = []
+    for item in results:
+        base: dict | None = previous.get(item["case"])
+        if base is None or not base.get("wall"):
+            continue
+        ratio: float = item["wall"] / base["wall"]
+        item["baseline_wall"] = base["wall"]
+        item["ratio"] = round(ratio, 3)
+        if ratio > 1 + tolerance:
+            regressions.append(item)
+    return regressions
+
+
+@click.command()
+@click.option("--root", "-r", type=click.Path(), default=None)
+@click.option("--size", "-s", "sizes", multiple=True, default=("320x240", "1280x720"))
+@click.option("--source", "sources", multiple=True, default=("mpeg4", "libx264"))
+@click.option("--duration", "-d", "durations", type=float, multiple=True, default=(5,))
+@click.option("--encoder", "-e", "encoders", multiple=True, default=("libx264",))
+@click.option("--preset", "-p", "presets", multiple=True, default=("",))
+@click.option("--jobs", "-j", "jobs", type=int, multiple=True, default=(1, 2))
+@click.option("--clips", "-n", type=int, default=4)
+@click.option("--remux/--no-remux", default=True)
+@click.option("--baseline", "-b", type=click.Path(exists=True), default=None)
+@click.option("--tolerance", type=float, default=0.1)
+@click.option("--output", "-o", type=click.Path(), default=None)
+def main(
+    root: str | None,
+    sizes: tuple[str, ...],
+    sources: tuple[str, ...],
+    durations: tuple[float, ...],
+    encoders: tuple[str, ...],
+    presets: tuple[str, ...],
+    jobs: tuple[int, ...],
+    clips: int,
+    remux: bool,
+    baseline: str | None,
+    tolerance: float,
+    output: str | None,
+) -> None:
+    root = root or os.path.join(tempfile.gettempdir(), "sometools-bench-transcode")
+    cases: list[Case] = [
+        Case(*values)
+        for values in itertools.product(
+            sizes, sources, durations, encoders, presets, jobs
+        )
+    ]
+    results: list[dict] = [measure(root, case, clips, remux) for case in cases]
+
+    regressions: list[dict] = []
+    if baseline:
+        with open(baseline, "r", encoding="utf-8") as f:
+            regressions = compare(results, json.load(f), tolerance)
+    report(results, output)
+    if regressions:
+        names: str = ", ".join(item["case"] for item in regressions)
+        raise click.ClickException(f"Regressions <cases = {names}>")
+
+
+if __name__ == "__main__":
+    main()
@@ -32,38 +32,57 @@ def main():
 #     decompress_main(path, to, deep, clean)
 
 
-# @main.command()
-# @click.option("--path", "-p", required=True, type=click.Path())
-# @click.option("--to", "-t", required=False, type=click.Path())
-# @click.option("--deep", "-d", is_flag=True)
-# @click.option("--clean", "-c", is_flag=True)
-# @click.option("--swap", "-s", is_flag=True)
-# @click.option("--prefix", "-x", default="#")
-# @click.option("--ext", "-e", default="mp4")
-# @click.option("--verbose", "-v", is_flag=False)
-# def video_convert(path: str, **kwargs) -> None:
-#     options: ManagerOptions = ManagerOptions(**kwargs, root=path)
-#     m: ConverterManager = ConverterManager()
-#     m.set_filter(VideoFilter())
-#     m.set_filter(MarkerFilter())
-
-#     m.start(options)
+@main.command()
+@click.option("--path", "-p", required=True, type=click.Path())
+@click.option("--to", "-t", required=False, type=click.Path())
+@click.option("--deep", "-d", is_flag=True)
+@click.option("--clean", "-c", is_flag=True)
+@click.option("--swap", "-s", is_flag=True)
+@click.option("--prefix", "-x", default="#")
+@click.option("--ext", "-e", default="mp4")
+@click.option("--verbose", "-v", is_flag=True)
+@click.option("--refresh-probe", "refresh_probe", is_flag=True)
+@click.option("--jobs", "-j", type=int, default=1)
+@click.option("--encoder", default="auto")
+@click.option("--preset", default="")
+@click.option("--remux/--no-remux", default=True)
+@click.option("--segments", type=int, default=0)
+@click.option("--watch", "-w", is_flag=True)
+@click.option("--resume", is_flag=True)
+def video_convert(path: str, **kwargs) -> None:
+    options: ManagerOptions = ManagerOptions(**kwargs, root=path)
+    m: ConverterManager = ConverterManager()
+    m.set_filter(VideoFilter())
+    m.set_filter(MarkerFilter())
+
+    m.start(options)
 
 
-# @main.command()
-# @click.option("--video_input", "-vi", required=True, type=click.Path())
-# @click.option("--ef2_input", "-ei", required=False, type=click.Path())
-# @click.option("--to", "-t", required=False, type=click.Path())
-# @click.option("--verbose", "-v", is_flag=False)
-# def merge(video_input: str, ef2_input, to: str, verbose: bool) -> None:
-#     options: MergeManagerOptions = MergeManagerOptions(
-#         video_input=video_input,
-#         ef2_input=ef2_input or video_input,
-#         output=to or video_input,
-#         verbose=verbose,
-#     )
-#     m: MergeManager = MergeManager()
-#     m.start(options)
+@main.command()
+@click.option("--video_input", "-vi", required=True, type=click.Path())
+@click.option("--ef2_input", "-ei", required=False, type=click.Path())
+@click.option("--to", "-t", required=False, type=click.Path())
+@click.option("--verbose", "-v", is_flag=True)
+@click.option("--refresh-probe", "refresh_probe", is_flag=True)
+@click.option("--jobs", "-j", type=int, default=0)
+def merge(
+    video_input: str,
+    ef2_input,
+    to: str,
+    verbose: bool,
+    refresh_probe: bool,
+    jobs: int,
+) -> None:
+    options: MergeManagerOptions = MergeManagerOptions(
+        video_input=video_input,
+        ef2_input=ef2_input or video_input,
+        output=to or video_input,
+        verbose=verbose,
+        refresh_probe=refresh_probe,
+        jobs=jobs,
+    )
+    m: MergeManager = MergeManager()
+    m.start(options)
 
 
 # @main.command()
@@ -0,0 +1,390 @@
+import os
+import re
+import threading
+import time
+import typing as t
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from app.core.config import Config
+from app.modules.bilibili.download import Downloader, StreamDownloadOptions
+from app.modules.bilibili.governor import Governor
+from app.modules.bilibili.journal import DownloadJournal
+from app.modules.bilibili.segment import Segmenter
+from app.modules.bilibili.session import RemoteFile, SessionPool
+
+PAYLOAD: bytes = os.urandom(3 * 1024 * 1024 + 123)
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    payload: t.ClassVar[bytes] = PAYLOAD
+    log: t.ClassVar[list[tuple[str, str | None]]] = []
+    ranges: t.ClassVar[bool] = True
+    head: t.ClassVar[bool] = True
+    etag: t.ClassVar[str] = '"v1"'
+    drop: t.ClassVar[int] = 0
+    truncate: t.ClassVar[int] = 0
+    throttle: t.ClassVar[int] = 0
+    delay: t.ClassVar[float] = 0.0
+
+    def log_message(self, *args: t.Any) -> None:
+        pass
+
+    def send_body(self, body: bytes, head: bool) -> None:
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("ETag", self.etag)
+        self.send_header("Last-Modified", "Mon, 01 Jan 2024 00:00:00 GMT")
+        if self.ranges:
+            self.send_header("Accept-Ranges", "bytes")
+        self.end_headers()
+        if head:
+            return
+        try:
+            if Handler.drop > 0 and "Range" in self.headers and len(body) > 1:
+                Handler.drop -= 1
+                self.wfile.write(body[: len(body) // 2])
+                self.close_connection = True
+                return
+            if Handler.truncate > 0 and "Range" not in self.headers:
+                Handler.truncate -= 1
+                self.wfile.write(body[: len(body) // 2])
+                self.close_connection = True
+                return
+            slow: bool = self.headers.get("Range", "").startswith("bytes=0-")
+            for offset in range(0, len(body), 64 * 1024):
+                self.wfile.write(body[offset : offset + 64 * 1024])
+                if slow:
+                    time.sleep(self.delay)
+        except ConnectionError:
+            pass
+
+    def respond(self, head: bool) -> None:
+        Handler.log.append((self.command, self.headers.get("Range")))
+        if Handler.throttle > 0:
+            Handler.throttle -= 1
+            self.send_response(429)
+            self.send_header("Retry-After", "0")
+            self.send_body(b"", head)
+            return
+        if head and not self.head:
+            self.send_response(405)
+            self.send_body(b"", head)
+            return
+        m = re.match(r"bytes=(\d+)-(\d*)", self.headers.get("Range", ""))
+        if m and self.ranges:
+            start: int = int(m.group(1))
+            last: int = len(self.payload) - 1
+            end: int = min(int(m.group(2) or last), last)
+            self.send_response(206)
+            self.send_header(
+                "Content-Range", f"bytes {start}-{end}/{len(self.payload)}"
+            )
+            self.send_body(self.payload[start : end + 1], head)
+            return
+        self.send_response(200)
+        self.send_body(self.payload, head)
+
+    def do_GET(self) -> None:
+        self.respond(False)
+
+    def do_HEAD(self) -> None:
+        self.respond(True)
+
+
+@pytest.fixture
+def server() -> t.Iterator[str]:
+    Handler.log = []
+    Handler.ranges = True
+    Handler.head = True
+    Handler.etag = '"v1"'
+    Handler.drop = 0
+    Handler.truncate = 0
+    Handler.throttle = 0
+    Handler.delay = 0.0
+    Governor().configure({"backoff": 0.01})
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{httpd.server_address[1]}/video.m4s"
+    httpd.shutdown()
+    httpd.server_close()
+    SessionPool().close()
+    Governor().configure({})
+
+
+class TestSessionPool:
+    def test_should_share_session_per_host(self) -> None:
+        pool = SessionPool()
+
+        assert pool.session("https://a.example/1") is pool.session(
+            "https://a.example/2"
+        )
+        assert pool.session("https://a.example/1") is not pool.session(
+            "https://b.example/1"
+        )
+        pool.close()
+
+    @pytest.mark.parametrize("value, expected", [(30, 30), ([5, 20], (5, 20))])
+    def test_should_accept_scalar_or_pair_timeout(
+        self, mocker, value: t.Any, expected: t.Any
+    ) -> None:
+        mocker.patch.object(
+            Config,
+            "get",
+            side_effect=lambda key, default=None: (
+                value if key.endswith(".timeout") else default
+            ),
+        )
+        pool = object.__new__(SessionPool)
+        pool.__init__()
+
+        assert pool.timeout == expected
+
+    def test_should_reuse_connections(self, server: str) -> None:
+        pool = SessionPool()
+        for _ in range(5):
+            with pool.get(server, headers={"Range": "bytes=0-9"}) as resp:
+                assert resp.content == PAYLOAD[:10]
+
+        stats = pool.stats()[SessionPool.host(server)]
+        assert stats.requests == 5
+        assert stats.connections == 1
+        assert stats.reused == 4
+
+    def test_should_retry_throttled_requests(self, server: str) -> None:
+        Governor().configure({"hosts": {"127.0.0.1": {"requests": 100}}})
+        Handler.throttle = 2
+
+        with SessionPool().get(server, headers={"Range": "bytes=0-9"}) as resp:
+            assert resp.status_code == 206
+            assert resp.content == PAYLOAD[:10]
+
+        assert len(Handler.log) == 3
+        assert Governor().host(server).requests.rate == 25
+
+
+class TestDownloader:
+    def test_should_download_ranges_over_pool(self, server: str, tmp_path) -> None:
+        path = str(tmp_path / "video.m4s")
+        downloader = Downloader()
+
+        assert downloader.stream_download(
+            StreamDownloadOptions(url=server, headers={}, save_path=path)
+        )
+
+        with open(path, "rb") as f:
+            assert f.read() == PAYLOAD
+        stats = downloader.sessions.stats()[SessionPool.host(server)]
+        assert stats.connections <= downloader.workers
+
+    def test_should_probe_with_head(self, server: str) -> None:
+        remote = Downloader().probe(
+            StreamDownloadOptions(url=server, headers={}, save_path="")
+        )
+
+        assert remote.size == len(PAYLOAD)
+        assert remote.ranges
+        assert remote.etag == '"v1"'
+        assert remote.last_modified.startswith("Mon")
+        assert Handler.log == [("HEAD", None)]
+
+    def test_should_probe_with_single_byte_range(self, server: str) -> None:
+        Handler.head = False
+        downloader = Downloader()
+        op = StreamDownloadOptions(url=server, headers={}, save_path="")
+
+        assert downloader.probe(op).size == len(PAYLOAD)
+        assert downloader.probe(op).ranges
+        assert Handler.log == [("HEAD", None), ("GET", "bytes=0-0")]
+
+    def test_should_fall_back_to_single_stream(self, server: str, tmp_path) -> None:
+        Handler.ranges = False
+        path = str(tmp_path / "a" / "video.m4s")
+
+        assert Downloader().stream_download(
+            StreamDownloadOptions(url=server, headers={}, save_path=path)
+        )
+
+        with open(path, "rb") as f:
+            assert f.read() == PAYLOAD
+        assert [command for command, _ in Handler.log].count("GET") == 2
+
+    def test_should_not_leave_truncated_single_stream(
+        self, server: str, tmp_path
+    ) -> None:
+        Handler.ranges = False
+        Handler.truncate = 1
+        path = str(tmp_path / "video.m4s")
+
+        assert not Downloader().stream_download(
+            StreamDownloadOptions(url=server, headers={}, save_path=path)
+        )
+
+        assert not os.path.exists(path)
+        assert not os.path.exists(path + ".stream")
+
+    def test_should_keep_ranged_partial_on_fallback(
+        self, server: str, tmp_path
+    ) -> None:
+        path = str(tmp_path / "video.m4s")
+        for suffix in (".part", ".part.json"):
+            with open(path + suffix, "wb") as f:
+                f.write(b"partial")
+        Handler.ranges = False
+
+        assert Downloader().stream_download(
+            StreamDownloadOptions(url=server, headers={}, save_path=path)
+        )
+
+        with open(path, "rb") as f:
+            assert f.read() == PAYLOAD
+        with open(path + ".part", "rb") as f:
+            assert f.read() == b"partial"
+        assert not os.path.exists(path + ".stream")
+
+    def test_should_requeue_dropped_ranges(self, server: str, tmp_path) -> None:
+        Handler.drop = 2
+        path = str(tmp_path / "video.m4s")
+
+        assert Downloader().stream_download(
+            StreamDownloadOptions(url=server, headers={}, save_path=path)
+        )
+
+        with open(path, "rb") as f:
+            assert f.read() == PAYLOAD
+
+    def test_should_split_slow_segments(self, server: str, tmp_path) -> None:
+        Handler.delay = 0.01
+        path = str(tmp_path / "video.m4s")
+        downloader = Downloader()
+        downloader.workers = 2
+        downloader.min_segment = 256 * 1024
+
+        assert downloader.stream_download(
+            StreamDownloadOptions(url=server, headers={}, save_path=path)
+        )
+
+        with open(path, "rb") as f:
+            assert f.read() == PAYLOAD
+        ranges = [r for command, r in Handler.log if command == "GET" and r]
+        assert len(ranges) > 2
+
+
+class TestSegmenter:
+    def test_should_start_with_one_segment_per_connection(self) -> None:
+        segmenter = Segmenter([(0, 8 * 1024 * 1024 - 1)], 4)
+
+        assert [(s.start, s.end) for s in segmenter.pending] == [
+            (i * 2 * 1024 * 1024, (i + 1) * 2 * 1024 * 1024 - 1) for i in range(4)
+        ]
+
+    def test_should_not_split_below_minimum(self) -> None:
+        segmenter = Segmenter([(0, 1024 * 1024 + 10)], 8)
+
+        assert len(segmenter.pending) == 1
+        segment = segmenter.acquire()
+        assert segment is not None
+        assert segmenter.acquire() is None
+
+    def test_should_steal_half_of_slowest_segment(self) -> None:
+        mib = 1024 * 1024
+        segmenter = Segmenter([(0, 16 * mib - 1)], 2)
+        fast = segmenter.acquire()
+        slow = segmenter.acquire()
+        assert fast is not None and slow is not None
+        segmenter.advance(fast, fast.remaining)
+        segmenter.release(fast)
+        segmenter.advance(slow, mib)
+        slow.started -= 10
+
+        stolen = segmenter.acquire()
+
+        assert stolen is not None
+        assert stolen.start == slow.end + 1
+        assert stolen.end == 16 * mib - 1
+        assert slow.remaining == stolen.remaining == 3.5 * mib
+        assert segmenter.splits == 1
+
+    def test_should_retry_then_fail(self) -> None:
+        segmenter = Segmenter([(0, 99)], 1, retries=1)
+        first = segmenter.acquire()
+        assert first is not None
+        segmenter.advance(first, 40)
+        segmenter.release(first)
+
+        retry = segmenter.acquire()
+        assert retry is not None and (retry.start, retry.end) == (40, 99)
+        segmenter.release(retry)
+
+        assert segmenter.acquire() is None
+        assert not segmenter.finished
+
+
+class TestDownloadJournal:
+    def test_should_mark_only_complete_blocks(self, tmp_path) -> None:
+        journal = DownloadJournal(
+            str(tmp_path / "v.m4s"), RemoteFile(size=1000, ranges=True), block=100
+        ).open()
+
+        journal.mark(0, 150)
+        assert journal.missing() == [(100, 999)]
+
+        journal.mark(150, 100)
+        journal.mark(900, 100)
+        assert journal.missing() == [(200, 899)]
+        assert not journal.complete
+
+    def test_should_resume_from_flushed_bitmap(self, tmp_path) -> None:
+        remote = RemoteFile(size=1000, ranges=True, etag='"v1"')
+        journal = DownloadJournal(str(tmp_path / "v.m4s"), remote, block=100).open()
+        journal.mark(0, 500)
+        journal.flush(force=True)
+
+        resumed = DownloadJournal(str(tmp_path / "v.m4s"), remote, block=100).open()
+
+        assert resumed.missing() == [(500, 999)]
+
+    def test_should_discard_stale_partial(self, tmp_path) -> None:
+        path = str(tmp_path / "v.m4s")
+        journal = DownloadJournal(
+            path, RemoteFile(size=1000, ranges=True, etag='"v1"'), block=100
+        ).open()
+        journal.mark(0, 1000)
+        journal.flush(force=True)
+
+        resumed = DownloadJournal(
+            path, RemoteFile(size=1000, ranges=True, etag='"v2"'), block=100
+        ).open()
+
+        assert resumed.missing() == [(0, 999)]
+
+    def test_should_refetch_only_missing_ranges(self, server: str, tmp_path) -> None:
+        path = str(tmp_path / "video.m4s")
+        op = StreamDownloadOptions(url=server, headers={}, save_path=path)
+        Handler.drop = 100
+        failing = Downloader()
+        failing.retries = 0
+        failing.block_size = 64 * 1024
+
+        assert not failing.stream_download(op)
+        assert not os.path.exists(path)
+        partial = DownloadJournal(path, failing.probe(op), block=64 * 1024).open()
+        missing = partial.missing()
+        assert 0 < sum(end - start + 1 for start, end in missing) < len(PAYLOAD)
+
+        Handler.drop = 0
+        Handler.log = []
+        downloader = Downloader()
+        downloader.block_size = 64 * 1024
+
+        assert downloader.stream_download(op)
+        with open(path, "rb") as f:
+            assert f.read() == PAYLOAD
+        assert not os.path.exists(path + ".part")
+        assert not os.path.exists(path + ".part.json")
+        fetched = [r for command, r in Handler.log if command == "GET" and r]
+        for r in fetched:
+            start = int(r.split("=")[1].split("-")[0])
+            assert any(lo <= start <= hi for lo, hi in missing)
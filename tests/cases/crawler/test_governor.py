@@ -0,0 +1,82 @@
+import time
+
+import pytest
+
+from app.modules.bilibili.governor import Governor, TokenBucket
+
+
+@pytest.fixture
+def governor() -> Governor:
+    governor = Governor()
+    yield governor
+    governor.configure({})
+
+
+class TestTokenBucket:
+    def test_should_not_wait_when_unlimited(self) -> None:
+        bucket = TokenBucket()
+
+        assert all(bucket.reserve(1024) == 0 for _ in range(100))
+
+    def test_should_wait_for_debt(self) -> None:
+        bucket = TokenBucket(rate=100, burst=0.1)
+
+        delays = [bucket.reserve(1) for _ in range(20)]
+
+        assert delays[:10] == [0.0] * 10
+        assert delays[-1] == pytest.approx(0.1, abs=0.02)
+
+    def test_should_change_rate(self) -> None:
+        bucket = TokenBucket(rate=1000, burst=1)
+        bucket.set_rate(10)
+
+        assert bucket.capacity == 10
+        assert bucket.reserve(20) == pytest.approx(1.0, abs=0.05)
+
+
+class TestGovernor:
+    def test_should_match_host_caps_by_suffix(self, governor: Governor) -> None:
+        governor.configure(
+            {"hosts": {"bilivideo.com": {"bandwidth": 1000, "requests": 5}}}
+        )
+
+        limit = governor.host("https://upos-sz-mirror.bilivideo.com/a.m4s")
+
+        assert limit.bandwidth.rate == 1000
+        assert limit.requests.rate == 5
+        assert governor.host("https://api.bilibili.com/x").requests.rate == 0
+
+    def test_should_pace_requests(self, governor: Governor) -> None:
+        governor.configure({"requests": 50, "burst": 0.02})
+        started = time.monotonic()
+
+        for _ in range(6):
+            governor.request("https://a.example/1")
+
+        assert time.monotonic() - started >= 0.08
+
+    def test_should_halve_rate_and_pause_on_throttle(self, governor: Governor) -> None:
+        governor.configure({"hosts": {"a.example": {"requests": 8}}, "backoff": 5})
+        url = "https://a.example/1"
+
+        governor.throttle(url, 429, retry_after=0.05)
+        limit = governor.host(url)
+
+        assert limit.requests.rate == 4
+        assert limit.paused > time.monotonic()
+        started = time.monotonic()
+        governor.request(url)
+        assert time.monotonic() - started >= 0.03
+
+    def test_should_recover_towards_base(self, governor: Governor) -> None:
+        governor.configure(
+            {"hosts": {"a.example": {"requests": 8}}, "backoff": 5, "recover": 1.0}
+        )
+        url = "https://a.example/1"
+        governor.throttle(url, 412, retry_after=0)
+        limit = governor.host(url)
+
+        limit.throttled -= 10
+        governor.request(url)
+        assert limit.requests.rate == 8
+        assert limit.throttled == 0
@@ -1,21 +1,33 @@
+import os
+
 import pytest
 from pytest_mock import MockFixture
 from app.core import FileFinder
 from tests.utils.decorator import param
-from tests.utils.walk import mock_os_walk
+
+
+def make_files(root, sources: list[str]) -> None:
+    for source in sources:
+        path = root / source
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.touch()
+
+
+def relative(root, paths: list[str]) -> list[str]:
+    return sorted(os.path.relpath(p, root) for p in paths)
 
 
 class TestFileFinder:
-    def test_should_work(self, mocker: MockFixture) -> None:
-        args = "."
+    @pytest.mark.parametrize("workers", [1, 4])
+    def test_should_work(self, tmp_path, workers: int) -> None:
         expected = ["a.txt", "b.txt"]
-        finder = FileFinder()
-        mocker.patch("os.walk", return_value=mock_os_walk(expected))
+        make_files(tmp_path, expected)
+        finder = FileFinder(workers)
 
-        actual = finder.find(args)
+        actual = finder.find(str(tmp_path))
 
         assert len(actual) == len(expected)
-        assert sorted(actual) == sorted(expected)
+        assert relative(tmp_path, actual) == sorted(expected)
 
     @param(
         "item",
@@ -41,26 +53,48 @@ class TestFileFinder:
             {"sources": ["a.txt", "b.txt"], "expected": ["a.txt", "b.txt"], "depth": 0},
             {
                 "sources": ["a.txt", "config/b.txt"],
-                "expected": ["a.txt", "config\\b.txt"],
+                "expected": ["a.txt", os.path.join("config", "b.txt")],
                 "depth": 1,
             },
             {
                 "sources": ["a.txt", "config/b.txt", "config/c/d.txt"],
-                "expected": ["a.txt", "config\\b.txt", "config\\c\\d.txt"],
+                "expected": [
+                    "a.txt",
+                    os.path.join("config", "b.txt"),
+                    os.path.join("config", "c", "d.txt"),
+                ],
                 "depth": -1,
             },
+            {
+                "sources": ["a.txt", "config/b.txt", "config/c/d.txt"],
+                "expected": ["a.txt"],
+                "depth": 0,
+            },
         ],
         fn=lambda _, i: str(i),
     )
-    def test_should_work_with_depth(self, item, mocker: MockFixture) -> None:
-        args: str = "."
-        sources: list[str] = item["sources"]
-        expected = item["expected"]
+    def test_should_work_with_depth(self, item, tmp_path) -> None:
+        make_files(tmp_path, item["sources"])
         finder = FileFinder()
 
-        mocker.patch("os.path.exists", return_value=True)
-        mocker.patch("os.walk", return_value=mock_os_walk(sources))
+        actual = finder.find(str(tmp_path), item["depth"])
+
+        assert relative(tmp_path, actual) == sorted(item["expected"])
+
+    def test_should_push_down_extensions(self, tmp_path) -> None:
+        make_files(tmp_path, ["a.MP4", "b.txt", "c/d.mkv", "c/e.jpg"])
+        finder = FileFinder()
+
+        actual = finder.find(str(tmp_path), extensions=("mp4", "mkv"))
+
+        assert relative(tmp_path, actual) == ["a.MP4", os.path.join("c", "d.mkv")]
+
+    def test_should_yield_lazily(self, tmp_path, mocker: MockFixture) -> None:
+        make_files(tmp_path, ["a.txt", "c/d.txt"])
+        finder = FileFinder(1)
+        scan = mocker.spy(finder, "scan")
 
-        actual = finder.find(args, item["depth"])
+        iterator = finder.iter(str(tmp_path))
+        next(iterator)
 
-        assert sorted(actual) == sorted(expected)
+        assert scan.call_count == 1
@@ -0,0 +1,124 @@
+import asyncio
+import sys
+import time
+
+from app.core.shell import RingBuffer, ShellRunner
+
+
+def python(code: str) -> str:
+    return f'"{sys.executable}" -c "{code}"'
+
+
+class TestShellRunnerAsync:
+    def test_should_run(self) -> None:
+        runner = ShellRunner()
+
+        ret = asyncio.run(runner.run_async(python("print(42)")))
+
+        assert ret["code"] == 0
+        assert ret["stdout"].strip() == "42"
+
+    def test_should_kill_on_timeout(self) -> None:
+        runner = ShellRunner()
+        start = time.monotonic()
+
+        ret = asyncio.run(
+            runner.run_async(python("import time; time.sleep(30)"), timeout=0.5)
+        )
+
+        assert ret["code"] != 0
+        assert time.monotonic() - start < 10
+
+    def test_should_kill_on_cancel(self) -> None:
+        runner = ShellRunner()
+        processes: list[asyncio.subprocess.Process] = []
+
+        async def main() -> None:
+            original = asyncio.create_subprocess_exec
+
+            async def spy(*args, **kwargs):
+                process = await original(*args, **kwargs)
+                processes.append(process)
+                return process
+
+            asyncio.create_subprocess_exec = spy
+            try:
+                task = asyncio.create_task(
+                    runner.run_async(python("import time; time.sleep(30)"))
+                )
+                await asyncio.sleep(0.5)
+                task.cancel()
+                try:
+                    await task
+                except asyncio.CancelledError:
+                    pass
+            finally:
+                asyncio.create_subprocess_exec = original
+
+        asyncio.run(main())
+
+        assert processes[0].returncode is not None
+
+
+class TestShellRunner:
+    def test_should_run_without_shell(self) -> None:
+        runner = ShellRunner()
+
+        ret = runner.run([sys.executable, "-c", "import sys; print(sys.argv[1])", "a b;c"])
+
+        assert ret["code"] == 0
+        assert ret["stdout"].strip() == "a b;c"
+        assert ret["metrics"].spawn > 0
+
+    def test_should_report_missing_program(self) -> None:
+        runner = ShellRunner()
+
+        ret = runner.run(["sometools-not-exists"])
+
+        assert ret["code"] != 0
+
+    def test_should_bound_output(self) -> None:
+        runner = ShellRunner()
+
+        ret = runner.run(
+            [sys.executable, "-c", "print('x' * 10000, end='')"], limit=100
+        )
+
+        assert ret["stdout"] == "x" * 100
+        assert ret["metrics"].dropped == 9900
+
+    def test_should_kill_process_group_on_timeout(self) -> None:
+        runner = ShellRunner()
+        code = (
+            "import subprocess, sys, time;"
+            "subprocess.Popen([sys.executable, '-c', 'import time; time.sleep(30)']);"
+            "time.sleep(30)"
+        )
+        start = time.monotonic()
+
+        ret = runner.run([sys.executable, "-c", code], timeout=0.5)
+
+        assert ret["metrics"].timed_out
+        assert time.monotonic() - start < 10
+
+    def test_should_stream_lines(self) -> None:
+        runner = ShellRunner()
+        code = "for i in range(3): print(i, flush=True)"
+
+        with runner.stream([sys.executable, "-c", code]) as stream:
+            lines = [line.strip() for line in stream]
+
+        assert lines == ["0", "1", "2"]
+        assert stream.result is not None
+        assert stream.result["code"] == 0
+
+
+class TestRingBuffer:
+    def test_should_keep_tail(self) -> None:
+        buffer = RingBuffer(5)
+
+        for chunk in ["abc", "def", "gh"]:
+            buffer.write(chunk)
+
+        assert buffer.getvalue() == "defgh"
+        assert buffer.dropped == 3
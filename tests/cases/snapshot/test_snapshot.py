@@ -0,0 +1,70 @@
+import os
+
+from pytest_mock import MockFixture
+
+from app.core.path import FileFinder
+from app.core.snapshot import StatCache
+
+
+def build(root) -> None:
+    (root / "a").mkdir()
+    (root / "1.mp4").write_bytes(b"0")
+    (root / "a" / "2.mp4").write_bytes(b"0")
+    (root / "a" / "3.txt").write_bytes(b"0")
+
+
+class TestStatCache:
+    def test_should_pass_through_outside_scope(self, tmp_path) -> None:
+        cache = StatCache()
+        path = tmp_path / "1.mp4"
+
+        assert not cache.exists(str(path))
+        path.write_bytes(b"0")
+        assert cache.exists(str(path))
+        assert cache.stats == {}
+
+    def test_should_answer_from_finder_snapshot(
+        self, tmp_path, mocker: MockFixture
+    ) -> None:
+        build(tmp_path)
+        cache = StatCache()
+        with cache.scope():
+            FileFinder(workers=1).find(str(tmp_path), extensions=(".mp4",))
+            stat = mocker.spy(os, "stat")
+
+            assert cache.exists(str(tmp_path / "1.mp4"))
+            assert cache.exists(str(tmp_path / "a" / "2.mp4"))
+            assert not cache.exists(str(tmp_path / "a" / "missing.mp4"))
+            assert stat.call_count == 0
+
+            assert cache.exists(str(tmp_path / "a" / "3.txt"))
+            assert stat.call_count == 1
+        assert cache.stats == {} and cache.listings == {}
+
+    def test_should_refresh_after_invalidate(self, tmp_path) -> None:
+        build(tmp_path)
+        cache = StatCache()
+        path = str(tmp_path / "#1.mp4")
+        with cache.scope():
+            FileFinder(workers=1).find(str(tmp_path))
+            (tmp_path / "#1.mp4").write_bytes(b"0")
+            assert not cache.exists(path)
+
+            cache.invalidate(path)
+            assert cache.exists(path)
+
+            os.remove(path)
+            cache.invalidate(path)
+            assert not cache.exists(path)
+
+    def test_should_cache_misses_within_scope(
+        self, tmp_path, mocker: MockFixture
+    ) -> None:
+        cache = StatCache()
+        path = str(tmp_path / "1.mp4")
+        with cache.scope():
+            stat = mocker.spy(os, "stat")
+            assert not cache.exists(path)
+            assert not cache.exists(path)
+
+        assert stat.call_count == 1
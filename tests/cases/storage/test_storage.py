@@ -0,0 +1,42 @@
+import os
+
+from app.core.storage import Storage
+
+
+class TestStorage:
+    def test_should_resolve_missing_path_to_parent_device(self, tmp_path) -> None:
+        missing = str(tmp_path / "a" / "b.mp4")
+
+        assert Storage.device(missing) == os.stat(tmp_path).st_dev
+
+    def test_should_deduplicate_devices(self, tmp_path) -> None:
+        first = tmp_path / "1.mp4"
+        first.write_bytes(b"0")
+
+        assert Storage().devices(str(first), str(tmp_path)) == (
+            os.stat(tmp_path).st_dev,
+        )
+
+    def test_should_classify_network_mounts(self, mocker) -> None:
+        storage = Storage()
+        dev = os.makedev(0, 4242)
+        mocker.patch.object(storage, "filesystems", {dev: "nfs4"})
+        mocker.patch.object(storage, "kinds", {})
+
+        assert storage.kind(dev) == "network"
+        assert storage.limit(dev) == storage.limits["network"]
+
+    def test_should_classify_unknown_without_sysfs(self, mocker) -> None:
+        storage = Storage()
+        mocker.patch.object(storage, "filesystems", {})
+        mocker.patch.object(storage, "kinds", {})
+        mocker.patch.object(storage, "_sysfs", "/nonexistent")
+
+        assert storage.kind(os.makedev(0, 4243)) == "unknown"
+
+    def test_should_advise_readahead(self, tmp_path) -> None:
+        path = tmp_path / "1.mp4"
+        path.write_bytes(b"0" * 1024)
+
+        Storage().advise(str(path))
+        Storage().advise(str(tmp_path / "missing.mp4"))
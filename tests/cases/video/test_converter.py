@@ -1,5 +1,15 @@
+import os
+
+from app.core.ffmpeg import FFMpeg
+from app.core.probe import Prober
+from app.core.watch import DirectoryWatcher
 from app.modules.video import Mp4Converter
-from app.modules.video.types import TaskOptions
+from app.modules.video.converter import ConverterManager, SegmentedConverter
+from app.modules.video.filter import MarkerFilter
+from app.modules.video.journal import ConversionJournal
+from app.modules.video.marker import Marker, XattrMarker
+from app.modules.video.remux import StreamPlan
+from app.modules.video.types import ManagerOptions, TaskOptions
 
 
 class TestMp4Converter:
@@ -22,3 +32,117 @@ class TestMp4Converter:
         )
         assert converter.convert(options) is False
         mock_ffmpeg.assert_called_once()
+
+    def test_should_stream_copy_planned_streams(self, mocker) -> None:
+        converter = Mp4Converter()
+        plan = StreamPlan(0, 1, "hevc", "opus", copy_video=True, copy_audio=False)
+        options: TaskOptions = TaskOptions(input_path="input.mkv", plan=plan)
+        invoke = mocker.patch.object(
+            FFMpeg, "invoke", autospec=True, return_value={"code": 0}
+        )
+
+        assert converter.convert(options) is True
+        arguments = " ".join(invoke.call_args.args[0].arguments)
+        assert "-c:v copy -tag:v hvc1 -c:a aac" in arguments
+        assert "-map 0:0 -map 0:1" in arguments
+        assert "hwaccel" not in arguments
+
+    def test_should_override_profile_preset(self, mocker) -> None:
+        converter = Mp4Converter()
+        options = TaskOptions(input_path="input.mkv", encoder="libx264", preset="slow")
+        invoke = mocker.patch.object(
+            FFMpeg, "invoke", autospec=True, return_value={"code": 0}
+        )
+
+        converter.convert(options)
+
+        arguments = invoke.call_args.args[0].arguments
+        assert arguments.count("-preset") == 1
+        assert arguments[arguments.index("-preset") + 1] == "slow"
+
+
+class TestSegmentedConverter:
+    def test_should_not_split_short_file(self, mocker) -> None:
+        mocker.patch.object(
+            Prober, "probe", return_value={"format": {"duration": "60.0"}}
+        )
+        convert = mocker.patch.object(Mp4Converter, "convert", return_value=True)
+        converter = SegmentedConverter()
+        options = TaskOptions(input_path="input.mkv", segments=4)
+
+        assert converter.convert(options) is True
+        convert.assert_called_once_with(options)
+
+    def test_should_split_at_even_times(self, mocker, tmp_path) -> None:
+        execute = mocker.patch.object(
+            FFMpeg, "execute", autospec=True, return_value={"code": 0}
+        )
+        (tmp_path / "source_000.mkv").touch()
+        converter = SegmentedConverter()
+        options = TaskOptions(input_path="input.mkv", segments=4)
+
+        actual = converter.split(options, str(tmp_path), 100)
+
+        arguments = execute.call_args.args[1]
+        times = arguments[arguments.index("-segment_times") + 1]
+        assert times == "25.000,50.000,75.000"
+        assert actual == [str(tmp_path / "source_000.mkv")]
+
+    def test_should_use_and_remove_job_work_dir(self, mocker, tmp_path) -> None:
+        mocker.patch.object(
+            Prober, "probe", return_value={"format": {"duration": "600.0"}}
+        )
+        split = mocker.patch.object(SegmentedConverter, "split", return_value=[])
+        options = TaskOptions(
+            input_path=str(tmp_path / "a.mkv"), to="", segments=4
+        )
+        folder = SegmentedConverter.work_dir(options)
+
+        assert SegmentedConverter().convert(options) is False
+
+        assert split.call_args.args[1] == folder
+        assert os.path.dirname(folder) == str(tmp_path)
+        assert not os.path.exists(folder)
+
+    def test_should_rename_only_segment_file(self, mocker, tmp_path) -> None:
+        invoke = mocker.patch.object(
+            FFMpeg, "invoke", autospec=True, return_value={"code": 0}
+        )
+        folder = tmp_path / "source_videos" / ".segments-1"
+        converter = SegmentedConverter()
+        options = TaskOptions(input_path=str(tmp_path / "source_videos" / "a.mkv"))
+
+        actual = converter.encode_segment(0, str(folder / "source_000.mkv"), options)
+
+        assert actual == str(folder / "encoded_000.mkv")
+        assert invoke.call_args.args[0].arguments[-1] == actual
+
+
+class TestConverterManagerWatch:
+    def test_should_skip_renamed_branded_output(self, mocker, tmp_path) -> None:
+        mocker.patch.object(XattrMarker, "brand", return_value=False)
+        mocker.patch.object(XattrMarker, "is_branded", return_value=False)
+        source, output = tmp_path / "a.mp4", tmp_path / "#b.mp4"
+        source.write_bytes(b"0" * 16)
+        output.write_bytes(b"1" * 16)
+
+        def batches(self):
+            yield [str(source)]
+            Marker().brand(str(output))
+            os.rename(output, tmp_path / "b.mp4")
+            Marker().rename(str(output), str(tmp_path / "b.mp4"))
+            yield [str(tmp_path / "b.mp4")]
+
+        mocker.patch.object(DirectoryWatcher, "watch", batches)
+        mocker.patch.object(ConverterManager, "create_scheduler")
+        schedule = mocker.patch.object(
+            ConverterManager, "schedule", return_value=True
+        )
+        manager = ConverterManager()
+        manager.journal = ConversionJournal(str(tmp_path / ".journal.sqlite3"))
+        manager.set_filter(MarkerFilter(workers=2))
+
+        manager.watch(ManagerOptions(root=str(tmp_path), watch=True))
+        manager.journal.close()
+
+        assert [c.args[1] for c in schedule.call_args_list] == [str(source)]
@@ -1,3 +1,5 @@
+import asyncio
+import io
 import json
 import typing as t
 from unittest.mock import MagicMock
@@ -6,17 +8,97 @@ import pydash
 import pytest
 from pytest_mock import MockFixture
 
-from app.core.ffmpeg import DecoderFinder, FFMpeg, FFProbe
+from app.core.ffmpeg import (
+    Capabilities,
+    CapabilityRegistry,
+    DecoderFinder,
+    EncoderFinder,
+    FFMpeg,
+    FFProbe,
+    ProgressEvent,
+    find_profile,
+)
 from app.core import ffmpeg
 
 
 @pytest.fixture
 def processor(mocker: MockFixture) -> MagicMock:
     mock = mocker.MagicMock()
-    mocker.patch("subprocess.run", return_value=mock)
+    mocker.patch("subprocess.Popen", return_value=mock)
     return mock
 
 
+@pytest.fixture
+def registry(tmp_path) -> t.Iterator[CapabilityRegistry]:
+    CapabilityRegistry._instance.pop(CapabilityRegistry, None)
+    instance: CapabilityRegistry = CapabilityRegistry()
+    instance.path = str(tmp_path / "capabilities.json")
+    yield instance
+    CapabilityRegistry._instance.pop(CapabilityRegistry, None)
+
+
+@pytest.fixture
+def encoder_finder(tmp_path, registry: CapabilityRegistry) -> EncoderFinder:
+    registry.capabilities = Capabilities(
+        key="host", encoders=["h264_nvenc", "libx264", "libx265"]
+    )
+    finder: EncoderFinder = EncoderFinder()
+    finder.path = str(tmp_path / "encoders.json")
+    return finder
+
+
+class TestCapabilityRegistry:
+    def test_should_be_lazy(self, mocker: MockFixture, registry) -> None:
+        discover = mocker.patch.object(CapabilityRegistry, "discover")
+
+        DecoderFinder()
+
+        discover.assert_not_called()
+
+    def test_should_reuse_persisted_capabilities(
+        self, mocker: MockFixture, registry: CapabilityRegistry
+    ) -> None:
+        mocker.patch.object(CapabilityRegistry, "fingerprint", return_value="k")
+        discover = mocker.patch.object(
+            CapabilityRegistry,
+            "discover",
+            return_value=Capabilities(key="k", decoders=["h264_cuvid"]),
+        )
+        assert registry.decoders == ["h264_cuvid"]
+
+        registry.invalidate()
+
+        assert registry.decoders == ["h264_cuvid"]
+        discover.assert_called_once()
+
+    def test_should_rediscover_when_binary_changed(
+        self, mocker: MockFixture, registry: CapabilityRegistry
+    ) -> None:
+        fingerprint = mocker.patch.object(
+            CapabilityRegistry, "fingerprint", return_value="old"
+        )
+        discover = mocker.patch.object(
+            CapabilityRegistry,
+            "discover",
+            side_effect=lambda key: Capabilities(key=key),
+        )
+        registry.load()
+        registry.invalidate()
+        fingerprint.return_value = "new"
+
+        assert registry.load().key == "new"
+        assert discover.call_count == 2
+
+    def test_should_not_swap_codecs(self, mocker: MockFixture, registry) -> None:
+        mocker.patch.object(CapabilityRegistry, "fingerprint", return_value="k")
+        mocker.patch.object(ffmpeg, "find_codecs", side_effect=lambda name: [name])
+        mocker.patch.object(ffmpeg.GPUDevice, "have_nvidia_gpu", return_value=False)
+        mocker.patch.object(ffmpeg.GPUDevice, "have_amd_gpu", return_value=False)
+
+        assert registry.encoders == ["encoders"]
+        assert registry.decoders == ["decoders"]
+
+
 class TestFFProbe:
     def test_should_work_with_mp4(self, processor: MagicMock) -> None:
         probe = FFProbe()
@@ -61,6 +143,104 @@ class TestFFMpeg:
         actual: str = ffmpeg.command
         assert actual == expected
 
+    def test_should_request_progress_output(self) -> None:
+        ffmpeg: FFMpeg = FFMpeg()
+        ffmpeg.option("i", "1.mp4")
+
+        assert ffmpeg.progress_command.startswith("ffmpeg -progress pipe:1 -nostats")
+
+    def test_should_build_arguments_without_quoting(self) -> None:
+        ffmpeg: FFMpeg = FFMpeg()
+        ffmpeg.option("hide_banner")
+        ffmpeg.option("i", "my video.mp4")
+        ffmpeg.option("c", "copy")
+        ffmpeg.option("y", 'say "hi".mp4')
+
+        expected = ["ffmpeg", "-hide_banner", "-i", "my video.mp4", "-c", "copy"]
+        assert ffmpeg.arguments == [*expected, "-y", 'say "hi".mp4']
+
+    def test_should_refine_progress_block(self) -> None:
+        ffmpeg: FFMpeg = FFMpeg()
+        event = ProgressEvent(ffmpeg)
+        lines = [
+            "  Duration: 00:01:40.00, start: 0.000000, bitrate: 1000 kb/s",
+            "frame=250",
+            "fps=50.00",
+            "bitrate=1024.0kbits/s",
+            "total_size=1048576",
+            "out_time_us=10000000",
+            "speed=2.5x",
+            "frame=   51 fps=0.0 q=28.0 Lsize=      83kB time=00:00:02.00",
+        ]
+
+        assert not any(ffmpeg.refine_info(line, event) for line in lines)
+        assert ffmpeg.refine_info("progress=continue", event)
+        assert event.frame == 250
+        assert event.speed == 2.5
+        assert event.current == "00:00:10.00"
+        assert event.duration == "00:01:40.00"
+        assert event.percentage == 10
+
+    def test_should_tolerate_unavailable_values(self) -> None:
+        ffmpeg: FFMpeg = FFMpeg()
+        event = ProgressEvent(ffmpeg, out_time_us=5)
+
+        ffmpeg.refine_info("out_time_us=N/A", event)
+        ffmpeg.refine_info("speed=N/A", event)
+
+        assert event.out_time_us == 5
+        assert event.speed == 0
+
+    def test_should_throttle_progress_actions(self, mocker: MockFixture) -> None:
+        process = mocker.MagicMock()
+        process.stdout = io.StringIO(
+            "out_time_us=1\nprogress=continue\n" * 50 + "progress=end\n"
+        )
+        process.returncode = 0
+        mocker.patch("subprocess.Popen", return_value=process)
+        action = mocker.MagicMock()
+        ffmpeg: FFMpeg = FFMpeg()
+        ffmpeg.throttle.interval = 60
+        ffmpeg.add_progress(action)
+
+        ret = ffmpeg.invoke()
+
+        assert ret["code"] == 0
+        assert "progress=end" in ret["stdout"]
+        assert action.call_count == 2
+        assert action.call_args.args[0].finished is True
+
+    def test_should_stream_progress_async(self, mocker: MockFixture) -> None:
+        class Stream:
+            def __init__(self, lines: list[bytes]) -> None:
+                self.lines = iter(lines)
+
+            def __aiter__(self):
+                return self
+
+            async def __anext__(self) -> bytes:
+                try:
+                    return next(self.lines)
+                except StopIteration:
+                    raise StopAsyncIteration
+
+        process = mocker.MagicMock()
+        process.stdout = Stream([b"out_time_us=1\n", b"progress=end\n"])
+        process.returncode = 0
+        process.wait = mocker.AsyncMock(return_value=0)
+        mocker.patch(
+            "app.core.ffmpeg.ShellRunner.open_async",
+            mocker.AsyncMock(return_value=process),
+        )
+        action = mocker.MagicMock()
+        ffmpeg: FFMpeg = FFMpeg()
+        ffmpeg.add_progress(action)
+
+        ret = asyncio.run(ffmpeg.invoke_async(timeout=5))
+
+        assert ret["code"] == 0
+        assert action.call_args.args[0].out_time_us == 1
+
 
 class TestDecoderFinder:
     def test_find_when_path_not_exists(self, mocker: MockFixture) -> None:
@@ -95,10 +275,7 @@ class TestDecoderFinder:
     def test_find_codec(self, mocker: MockFixture) -> None:
         source: str = r"1.mp4"
         mock_return: dict[str, t.Any] = {"streams": [{"codec_name": "h264"}]}
-        mocker.patch(
-            "app.modules.video.ffmpeg.ShellRunner.run",
-            return_value={"stdout": json.dumps(mock_return)},
-        )
+        mocker.patch("app.core.probe.Prober.probe", return_value=mock_return)
         finder: DecoderFinder = DecoderFinder()
 
         actual: str | None = finder.find_codec(source)
@@ -106,9 +283,9 @@ class TestDecoderFinder:
         assert actual == "h264"
 
     def test_find_supported_coders_with_supported_codec(
-        self, mocker: MockFixture
+        self, mocker: MockFixture, registry: CapabilityRegistry
     ) -> None:
-        mocker.patch.object(ffmpeg, "DECODERS", ["h264_cuvid", "h264_nvenc"])
+        registry.capabilities = Capabilities(decoders=["h264_cuvid", "h264_nvenc"])
 
         finder = DecoderFinder()
         supported_coders = finder.find_supported_coders("h264")
@@ -125,8 +302,10 @@ class TestDecoderFinder:
         supported_coders = finder.find_supported_coders("unsupported_codec")
         assert supported_coders == []
 
-    def test_find_supported_coders_with_empty_output(self, mocker: MockFixture) -> None:
-        mocker.patch.object(ffmpeg, "DECODERS", [])
+    def test_find_supported_coders_with_empty_output(
+        self, mocker: MockFixture, registry: CapabilityRegistry
+    ) -> None:
+        registry.capabilities = Capabilities(decoders=[])
         finder = DecoderFinder()
         supported_coders = finder.find_supported_coders("h264")
         assert supported_coders == []
@@ -168,17 +347,18 @@ class TestDecoderFinder:
 
         assert actual == "h264"
 
-    def test_find_with_no_gpu(self, mocker: MockFixture) -> None:
+    def test_find_with_no_gpu(
+        self, mocker: MockFixture, registry: CapabilityRegistry
+    ) -> None:
         source: str = r"1.mp4"
         mocker.patch("os.path.exists", return_value=True)
         mocker.patch("os.path.isdir", return_value=False)
-        mocker.patch.object(DecoderFinder, "_have_nvidia_gpu", False)
-        mocker.patch.object(DecoderFinder, "_have_amd_gpu", False)
+        registry.capabilities = Capabilities()
         mocker.patch(
-            "app.modules.video.ffmpeg.DecoderFinder.find_codec", return_value="h264"
+            "app.core.ffmpeg.DecoderFinder.find_codec", return_value="h264"
         )
         mocker.patch(
-            "app.modules.video.ffmpeg.DecoderFinder.find_supported_coders",
+            "app.core.ffmpeg.DecoderFinder.find_supported_coders",
             return_value=["h264_cuvid"],
         )
         finder: DecoderFinder = DecoderFinder()
@@ -195,3 +375,75 @@ class TestDecoderFinder:
         actual: str | None = finder.find(source)
 
         assert actual is None
+
+
+class TestEncoderFinder:
+    def test_should_select_fastest_working_encoder(
+        self, mocker: MockFixture, encoder_finder: EncoderFinder
+    ) -> None:
+        timings = {"h264_nvenc": 0.5, "libx264": 1.0, "libx265": 3.0}
+        mocker.patch.object(
+            EncoderFinder, "benchmark", side_effect=lambda p: timings[p.name]
+        )
+
+        actual = encoder_finder.select("auto")
+
+        assert actual is not None
+        assert actual.name == "h264_nvenc"
+        assert ("hwaccel", "cuda") in actual.input_options
+
+    def test_should_fallback_to_cpu(
+        self, mocker: MockFixture, encoder_finder: EncoderFinder
+    ) -> None:
+        timings = {"h264_nvenc": None, "libx264": 1.0, "libx265": 3.0}
+        mocker.patch.object(
+            EncoderFinder, "benchmark", side_effect=lambda p: timings[p.name]
+        )
+
+        actual = encoder_finder.select("auto")
+
+        assert actual is not None
+        assert actual.name == "libx264"
+        assert actual.input_options == []
+
+    def test_should_cache_benchmark_per_host(
+        self, mocker: MockFixture, encoder_finder: EncoderFinder
+    ) -> None:
+        benchmark = mocker.patch.object(EncoderFinder, "benchmark", return_value=1.0)
+
+        encoder_finder.select("auto")
+        encoder_finder.select("auto")
+
+        assert benchmark.call_count == 3
+
+    @pytest.mark.parametrize(
+        "name, pix_fmt",
+        [("libx264", "yuv420p"), ("h264_nvenc", "yuv420p"), ("h264_vaapi", None)],
+    )
+    def test_should_benchmark_with_profile_pixel_format(
+        self,
+        mocker: MockFixture,
+        encoder_finder: EncoderFinder,
+        name: str,
+        pix_fmt: str | None,
+    ) -> None:
+        execute = mocker.patch.object(FFMpeg, "execute", return_value={"code": 0})
+
+        encoder_finder.benchmark(find_profile(name))
+
+        arguments: list[str] = execute.call_args.args[0]
+        actual = arguments[arguments.index("-pix_fmt") + 1] if pix_fmt else None
+        assert actual == pix_fmt
+        assert arguments.count("-pix_fmt") == (1 if pix_fmt else 0)
+
+    def test_should_use_explicit_encoder(
+        self, mocker: MockFixture, encoder_finder: EncoderFinder
+    ) -> None:
+        benchmark = mocker.patch.object(EncoderFinder, "benchmark")
+
+        actual = encoder_finder.select("libx265")
+
+        assert actual is not None
+        assert actual.name == "libx265"
+        assert encoder_finder.select("h264_qsv") is None
+        benchmark.assert_not_called()
@@ -1,3 +1,4 @@
+import time
 from unittest.mock import MagicMock
 
 import pydash
@@ -25,9 +26,43 @@ class TestMarkerFilter:
         marker_filter = MarkerFilter()
 
         mock_marker = mocker.patch("app.modules.video.marker.Marker.is_branded")
-        mock_marker.side_effect = [True, False]
+        mock_marker.side_effect = lambda path: path.startswith("branded")
 
         actual = marker_filter.filter(files, ManagerOptions())
 
         assert len(actual) == 1
         assert actual[0] == "non_branded_video.mp4"
+
+    def test_should_stream_lazily_in_order(self, mocker: MockFixture) -> None:
+        mocker.patch(
+            "app.modules.video.marker.Marker.is_branded",
+            side_effect=lambda path: path.endswith("0.mp4"),
+        )
+        consumed: list[str] = []
+
+        def source():
+            for i in range(100):
+                consumed.append(str(i))
+                yield f"{i}.mp4"
+
+        stream = MarkerFilter(workers=4).stream(source(), ManagerOptions())
+        first = next(stream)
+
+        assert first == "1.mp4"
+        assert len(consumed) <= 8 + 1
+        assert list(stream)[:2] == ["2.mp4", "3.mp4"]
+
+    def test_should_yield_before_window_fills(self, mocker: MockFixture) -> None:
+        mocker.patch("app.modules.video.marker.Marker.is_branded", return_value=False)
+        consumed: list[str] = []
+
+        def source():
+            for i in range(100):
+                consumed.append(str(i))
+                yield f"{i}.mp4"
+                time.sleep(0.05)
+
+        stream = MarkerFilter(workers=16).stream(source(), ManagerOptions())
+
+        assert next(stream) == "0.mp4"
+        assert len(consumed) <= 2
@@ -0,0 +1,182 @@
+import os
+import time
+
+import pytest
+from pytest_mock import MockFixture
+
+from app.modules.video.converter import ConverterManager, SegmentedConverter
+from app.modules.video.journal import ConversionJournal
+from app.modules.video.marker import Marker, XattrMarker
+from app.modules.video.remux import StreamPlan
+from app.modules.video.types import ManagerOptions, TaskOptions
+
+
+@pytest.fixture
+def journal(tmp_path) -> ConversionJournal:
+    instance = ConversionJournal(str(tmp_path / "journal.sqlite3"))
+    yield instance
+    instance.close()
+
+
+def make_task(tmp_path, name: str = "a.mkv") -> TaskOptions:
+    path = tmp_path / "in" / name
+    path.parent.mkdir(exist_ok=True)
+    path.write_bytes(b"0")
+    return TaskOptions(
+        input_path=str(path), to="", plan=StreamPlan(0, 1, "h264", "aac", True)
+    )
+
+
+class TestConversionJournal:
+    def test_should_round_trip_task(self, tmp_path, journal) -> None:
+        task = make_task(tmp_path)
+
+        journal.queue(task)
+        journal.mark(task.input_path, "finishing")
+        journal.advance(task.input_path, 2)
+        actual = journal.get(task.input_path)
+
+        assert actual is not None
+        assert actual.task == task
+        assert actual.state == "finishing"
+        assert actual.action == 2
+
+    def test_should_list_unfinished_under_root(self, tmp_path, journal) -> None:
+        done, pending = make_task(tmp_path, "a.mkv"), make_task(tmp_path, "b.mkv")
+        journal.queue(done)
+        journal.mark(done.input_path, "done")
+        journal.queue(pending)
+
+        actual = journal.unfinished(str(tmp_path / "in"))
+
+        assert [e.task.input_path for e in actual] == [pending.input_path]
+        assert journal.unfinished(str(tmp_path / "other")) == []
+
+    def test_should_prune_done_and_expired_failed(self, tmp_path, journal) -> None:
+        done, failed = make_task(tmp_path, "a.mkv"), make_task(tmp_path, "b.mkv")
+        journal.queue(done)
+        journal.mark(done.input_path, "done")
+        journal.queue(failed)
+        journal.mark(failed.input_path, "failed", "encode")
+
+        journal.prune(time.time() + 1, time.time() - 60)
+        assert journal.get(done.input_path) is None
+        assert journal.get(failed.input_path) is not None
+
+        journal.prune(time.time() + 1, time.time() + 1)
+        assert journal.get(failed.input_path) is None
+
+
+class TestConverterManagerResume:
+    def test_should_clean_partial_and_encode_again(
+        self, mocker: MockFixture, tmp_path, journal
+    ) -> None:
+        task = make_task(tmp_path)
+        journal.queue(task)
+        journal.mark(task.input_path, "encoding")
+        with open(task.output_path, "wb") as f:
+            f.write(b"partial")
+        manager = ConverterManager()
+        manager.journal = journal
+        submit = mocker.patch.object(ConverterManager, "submit")
+        scheduler = mocker.MagicMock()
+
+        options = ManagerOptions(root=str(tmp_path / "in"))
+
+        assert manager.resume(scheduler, options) == 1
+
+        assert not os.path.exists(task.output_path)
+        submit.assert_called_once_with(scheduler, task)
+        assert task.input_path in manager.resumed
+
+    def test_should_rerun_only_unfinished_actions(
+        self, mocker: MockFixture, tmp_path, journal
+    ) -> None:
+        task = make_task(tmp_path)
+        journal.queue(task)
+        journal.mark(task.input_path, "finishing")
+        journal.advance(task.input_path, 1)
+        manager = ConverterManager()
+        manager.journal = journal
+        first, second = mocker.MagicMock(priority=0), mocker.MagicMock(priority=1)
+        manager.after_actions = [first, second]
+        scheduler = mocker.MagicMock()
+
+        manager.resume(scheduler, ManagerOptions(root=str(tmp_path / "in")))
+        _, encode, finish = scheduler.submit.call_args.args
+
+        assert encode(0) is True
+        assert finish(True) is True
+        first.assert_not_called()
+        second.assert_called_once()
+        assert journal.get(task.input_path).state == "done"
+
+    def test_should_skip_unmet_actions_without_clean(self, tmp_path, journal) -> None:
+        task = make_task(tmp_path)
+        task.clean = False
+        with open(task.output_path, "wb") as f:
+            f.write(b"0")
+        journal.queue(task)
+        manager = ConverterManager()
+        manager.journal = journal
+
+        assert manager.finish(task, True) is True
+
+        assert os.path.exists(task.input_path)
+        assert journal.get(task.input_path).state == "done"
+
+    def test_should_not_rename_without_clean(self, tmp_path, journal) -> None:
+        task = make_task(tmp_path)
+        task.swap, task.clean = True, False
+        with open(task.output_path, "wb") as f:
+            f.write(b"0")
+        journal.queue(task)
+        manager = ConverterManager()
+        manager.journal = journal
+
+        assert manager.finish(task, True) is True
+
+        assert os.path.exists(task.output_path)
+        assert not os.path.exists(task.swap_path)
+        assert journal.get(task.input_path).state == "done"
+
+    def test_should_keep_work_dirs_of_resumed_jobs(
+        self, mocker: MockFixture, tmp_path, journal
+    ) -> None:
+        tasks = [make_task(tmp_path, "a.mkv"), make_task(tmp_path, "b.mkv")]
+        for task in tasks:
+            journal.queue(task)
+            journal.mark(task.input_path, "encoding")
+        manager = ConverterManager()
+        manager.journal = journal
+        mocker.patch.object(
+            ConverterManager,
+            "submit",
+            side_effect=lambda _, task: os.makedirs(SegmentedConverter.work_dir(task)),
+        )
+
+        assert manager.resume(mocker.MagicMock(), ManagerOptions(root=str(tmp_path)))
+
+        work_dirs = [SegmentedConverter.work_dir(task) for task in tasks]
+        assert len(set(work_dirs)) == 2
+        assert all(os.path.isdir(folder) for folder in work_dirs)
+
+    def test_should_keep_brand_after_swap(
+        self, mocker: MockFixture, tmp_path, journal
+    ) -> None:
+        mocker.patch.object(XattrMarker, "brand", return_value=False)
+        mocker.patch.object(XattrMarker, "is_branded", return_value=False)
+        mocker.patch("send2trash.send2trash", side_effect=os.remove)
+        task = make_task(tmp_path)
+        task.swap, task.clean = True, True
+        with open(task.output_path, "wb") as f:
+            f.write(b"0" * 16)
+        journal.queue(task)
+        manager = ConverterManager()
+        manager.journal = journal
+        swap_path = task.swap_path
+
+        assert manager.finish(task, True) is True
+
+        assert os.path.exists(swap_path)
+        assert Marker().is_branded(swap_path)
@@ -1,31 +1,48 @@
+import os
+
 import pytest
 from pytest_mock import MockFixture
 
-from app.modules.video.marker import Marker
+from app.modules.video.marker import ByteMarker, Marker, SidecarMarker, XattrMarker
 
 
 @pytest.fixture
 def marker():
-    return Marker()
+    return ByteMarker()
+
+
+@pytest.fixture
+def media(tmp_path) -> str:
+    path = tmp_path / "1.mp4"
+    path.write_bytes(b"0" * 16)
+    return str(path)
+
+
+def xattr_supported(path: str) -> bool:
+    try:
+        os.setxattr(path, "user.sometools.test", b"1")
+        return True
+    except (AttributeError, OSError):
+        return False
 
 
 class TestMarker:
-    def test_symbol_getter(self, marker: Marker):
+    def test_symbol_getter(self, marker: ByteMarker):
         assert marker.symbol == b"C"
 
-    def test_symbol_setter_valid(self, marker: Marker):
+    def test_symbol_setter_valid(self, marker: ByteMarker):
         marker.symbol = b"D"
         assert marker.symbol == b"D"
 
-    def test_symbol_setter_invalid(self, marker: Marker):
+    def test_symbol_setter_invalid(self, marker: ByteMarker):
         with pytest.raises(ValueError):
             marker.symbol = b"AB"
 
-    def test_is_valid_length(self, marker: Marker):
+    def test_is_valid_length(self, marker: ByteMarker):
         assert marker.is_valid_length(b"A")
         assert not marker.is_valid_length(b"AB")
 
-    def test_brand_valid(self, mocker: MockFixture, marker: Marker):
+    def test_brand_valid(self, mocker: MockFixture, marker: ByteMarker):
         mocker.patch("os.path.exists", return_value=True)
         mock_open = mocker.mock_open()
         mocker.patch("builtins.open", mock_open)
@@ -33,14 +50,14 @@ class TestMarker:
         assert marker.brand("test_path", b"B")
         mock_open().write.assert_called_once_with(b"B")
 
-    def test_brand_invalid_length(self, marker: Marker):
+    def test_brand_invalid_length(self, marker: ByteMarker):
         assert not marker.brand("test_path", b"AB")
 
-    def test_brand_file_not_exist(self, mocker: MockFixture, marker: Marker):
+    def test_brand_file_not_exist(self, mocker: MockFixture, marker: ByteMarker):
         mocker.patch("os.path.exists", return_value=False)
         assert not marker.brand("test_path", b"B")
 
-    def test_is_branded_valid(self, mocker: MockFixture, marker: Marker):
+    def test_is_branded_valid(self, mocker: MockFixture, marker: ByteMarker):
         mocker.patch("os.path.exists", return_value=True)
         mock_open = mocker.mock_open(read_data=b"B")
         mocker.patch("builtins.open", mock_open)
@@ -48,14 +65,14 @@ class TestMarker:
         assert marker.is_branded("test_path", b"B")
         mock_open().read.assert_called_once_with(1)
 
-    def test_is_branded_invalid_length(self, marker: Marker):
+    def test_is_branded_invalid_length(self, marker: ByteMarker):
         assert not marker.is_branded("test_path", b"AB")
 
-    def test_is_branded_file_not_exist(self, mocker: MockFixture, marker: Marker):
+    def test_is_branded_file_not_exist(self, mocker: MockFixture, marker: ByteMarker):
         mocker.patch("os.path.exists", return_value=False)
         assert not marker.is_branded("test_path", b"B")
 
-    def test_brand_default_symbol(self, mocker: MockFixture, marker: Marker):
+    def test_brand_default_symbol(self, mocker: MockFixture, marker: ByteMarker):
         mocker.patch("os.path.exists", return_value=True)
         mock_open = mocker.mock_open()
         mocker.patch("builtins.open", mock_open)
@@ -63,7 +80,7 @@ class TestMarker:
         assert marker.brand("test_path")
         mock_open().write.assert_called_once_with(b"C")
 
-    def test_is_branded_default_symbol(self, mocker: MockFixture, marker: Marker):
+    def test_is_branded_default_symbol(self, mocker: MockFixture, marker: ByteMarker):
         mocker.patch("os.path.exists", return_value=True)
         mock_open = mocker.mock_open(read_data=b"C")
         mocker.patch("builtins.open", mock_open)
@@ -71,14 +88,86 @@ class TestMarker:
         assert marker.is_branded("test_path")
         mock_open().read.assert_called_once_with(1)
 
-    def test_brand_exception(self, mocker: MockFixture, marker: Marker):
+    def test_brand_exception(self, mocker: MockFixture, marker: ByteMarker):
         mocker.patch("os.path.exists", return_value=True)
         mocker.patch("builtins.open", side_effect=Exception("Test Exception"))
 
         assert not marker.brand("test_path", b"B")
 
-    def test_is_branded_exception(self, mocker: MockFixture, marker: Marker):
+    def test_is_branded_exception(self, mocker: MockFixture, marker: ByteMarker):
         mocker.patch("os.path.exists", return_value=True)
         mocker.patch("builtins.open", side_effect=Exception("Test Exception"))
 
         assert not marker.is_branded("test_path", b"B")
+
+
+class TestXattrMarker:
+    def test_should_brand_without_touching_data(self, media: str) -> None:
+        if not xattr_supported(media):
+            pytest.skip("xattr not supported")
+        marker = XattrMarker()
+
+        assert not marker.is_branded(media)
+        assert marker.brand(media)
+        assert marker.is_branded(media)
+        with open(media, "rb") as f:
+            assert f.read() == b"0" * 16
+
+    def test_should_fail_when_unsupported(
+        self, mocker: MockFixture, media: str
+    ) -> None:
+        mocker.patch("os.setxattr", side_effect=OSError(95, "Not supported"))
+
+        assert not XattrMarker().brand(media)
+
+
+class TestSidecarMarker:
+    def test_should_brand_and_follow_rename(self, media: str) -> None:
+        marker = SidecarMarker()
+
+        assert marker.brand(media)
+        renamed = os.path.join(os.path.dirname(media), "2.mp4")
+        os.rename(media, renamed)
+        assert marker.rename(media, renamed)
+
+        assert SidecarMarker().is_branded(renamed)
+        assert not SidecarMarker().is_branded(media)
+
+    def test_should_not_match_copy_with_same_stat(self, media: str) -> None:
+        marker = SidecarMarker()
+        marker.brand(media)
+        copy = os.path.join(os.path.dirname(media), "copy.mp4")
+        with open(copy, "wb") as f:
+            f.write(b"0" * 16)
+        stat = os.stat(media)
+        os.utime(copy, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+
+        assert marker.is_branded(media)
+        assert not marker.is_branded(copy)
+
+    def test_should_miss_when_modified(self, media: str) -> None:
+        marker = SidecarMarker()
+        marker.brand(media)
+
+        with open(media, "ab") as f:
+            f.write(b"1")
+
+        assert not marker.is_branded(media)
+
+
+class TestMarkerFacade:
+    def test_should_fallback_to_next_backend(
+        self, mocker: MockFixture, media: str
+    ) -> None:
+        mocker.patch.object(XattrMarker, "brand", return_value=False)
+        mocker.patch.object(XattrMarker, "is_branded", return_value=False)
+        marker = Marker([XattrMarker(), SidecarMarker()], legacy=False)
+
+        assert marker.brand(media)
+        assert marker.is_branded(media)
+
+    def test_should_read_legacy_byte_marker(self, media: str) -> None:
+        ByteMarker().brand(media)
+
+        assert Marker([], legacy=True).is_branded(media)
+        assert not Marker([], legacy=False).is_branded(media)
@@ -0,0 +1,94 @@
+import os
+
+from pytest_mock import MockFixture
+
+from app.core.ffmpeg import FFMpeg
+from app.modules.video.merge import MergeManager
+from app.modules.video.types import BiliBiliEf2Info, MergeManagerOptions, ZipperInfo
+
+
+def make_task(tmp_path, *names: str) -> ZipperInfo:
+    videos = [
+        BiliBiliEf2Info(video_input=str(tmp_path), download_name=name)
+        for name in names
+    ]
+    return ZipperInfo(output=str(tmp_path), name="out", videos=videos)
+
+
+def streams(*types: str) -> dict:
+    return {"streams": [{"codec_type": codec_type} for codec_type in types]}
+
+
+class TestMergeManager:
+    def test_should_concat_parts_with_listing(
+        self, tmp_path, mocker: MockFixture
+    ) -> None:
+        manager = MergeManager()
+        mocker.patch.object(
+            manager.prober, "probe", return_value=streams("video", "audio")
+        )
+        listing: list[str] = []
+
+        def execute(this, command, *args, **kwargs):
+            listing.append(open(manager.listing_path(task), encoding="utf-8").read())
+            return {"code": 0}
+
+        mocker.patch.object(FFMpeg, "execute", autospec=True, side_effect=execute)
+        mocker.patch("app.modules.video.merge.RemoveCacheAction")
+        task = make_task(tmp_path, "1.mp4", "2.mp4")
+        command = manager.build(task).arguments
+
+        assert command[command.index("-f") + 1] == "concat"
+        assert command[command.index("-c") + 1] == "copy"
+        assert manager.do_zipper(task, MergeManagerOptions())
+        assert listing[0].splitlines() == [
+            f"file '{os.path.join(tmp_path, '1.mp4')}'",
+            f"file '{os.path.join(tmp_path, '2.mp4')}'",
+        ]
+        assert not os.path.exists(manager.listing_path(task))
+
+    def test_should_mux_complementary_streams(
+        self, tmp_path, mocker: MockFixture
+    ) -> None:
+        manager = MergeManager()
+        mocker.patch.object(
+            manager.prober,
+            "probe",
+            side_effect=lambda path: streams(
+                "video" if path.endswith("v.mp4") else "audio"
+            ),
+        )
+        command = manager.build(make_task(tmp_path, "v.mp4", "a.mp4")).arguments
+
+        assert "concat" not in command
+        assert command.count("-i") == 2
+        assert command.count("-map") == 2
+
+    def test_should_remove_output_on_failure(
+        self, tmp_path, mocker: MockFixture
+    ) -> None:
+        manager = MergeManager()
+        mocker.patch.object(manager.prober, "probe", return_value=streams("video"))
+        mocker.patch.object(FFMpeg, "execute", return_value={"code": 1, "stdout": ""})
+        remove = mocker.patch("app.modules.video.merge.RemoveCacheAction")
+        task = make_task(tmp_path, "1.mp4", "2.mp4")
+
+        assert not manager.do_zipper(task, MergeManagerOptions())
+        options = remove.return_value.call_args.kwargs["options"]
+        assert remove.return_value.call_count == 1
+        assert options.output_path == task.output_path
+
+    def test_should_merge_groups_concurrently(
+        self, tmp_path, mocker: MockFixture
+    ) -> None:
+        manager = MergeManager()
+        tasks = [make_task(tmp_path, f"{i}.mp4") for i in range(4)]
+        mocker.patch.object(manager, "find_ef2_paths", return_value=[])
+        mocker.patch.object(manager, "find_ef2_infos", return_value=[])
+        mocker.patch.object(manager.zipper, "invoke", return_value=tasks)
+        do_task = mocker.patch.object(
+            manager, "do_task", side_effect=[True, True, False, True]
+        )
+
+        assert not manager.start(MergeManagerOptions(jobs=2))
+        assert do_task.call_count == 4
@@ -0,0 +1,124 @@
+import os
+import typing as t
+
+import pytest
+from pytest_mock import MockFixture
+
+from app.core import probe
+from app.core.probe import (
+    FallbackProbeBackend,
+    ProbeCache,
+    Prober,
+    PyAVProbeBackend,
+    SubprocessProbeBackend,
+    create_backend,
+)
+
+
+@pytest.fixture
+def prober(tmp_path) -> t.Iterator[Prober]:
+    Prober._instance.pop(Prober, None)
+    instance: Prober = Prober()
+    instance.cache = ProbeCache(str(tmp_path / "probe.sqlite3"))
+    yield instance
+    instance.cache.close()
+    Prober._instance.pop(Prober, None)
+
+
+@pytest.fixture
+def media(tmp_path) -> str:
+    path = tmp_path / "1.mkv"
+    path.write_bytes(b"0" * 16)
+    return str(path)
+
+
+class TestProbeCache:
+    def test_should_miss_when_stat_changed(self, tmp_path) -> None:
+        cache = ProbeCache(str(tmp_path / "probe.sqlite3"))
+        cache.put("a.mp4", 1, 1, {"streams": []})
+
+        assert cache.get("a.mp4", 1, 1) == {"streams": []}
+        assert cache.get("a.mp4", 2, 1) is None
+        assert cache.get("a.mp4", 1, 2) is None
+
+    def test_should_invalidate(self, tmp_path) -> None:
+        cache = ProbeCache(str(tmp_path / "probe.sqlite3"))
+        cache.put("a.mp4", 1, 1, {"streams": []})
+
+        cache.invalidate("a.mp4")
+
+        assert cache.get("a.mp4", 1, 1) is None
+
+
+class TestProber:
+    def test_should_probe_once(
+        self, mocker: MockFixture, prober: Prober, media: str
+    ) -> None:
+        invoke = mocker.patch.object(
+            Prober, "invoke", return_value={"streams": [{"codec_name": "h264"}]}
+        )
+
+        prober.probe(media)
+        actual = prober.probe(media)
+
+        assert actual["streams"][0]["codec_name"] == "h264"
+        invoke.assert_called_once()
+
+    def test_should_probe_again_when_modified(
+        self, mocker: MockFixture, prober: Prober, media: str
+    ) -> None:
+        invoke = mocker.patch.object(Prober, "invoke", return_value={"streams": []})
+
+        prober.probe(media)
+        with open(media, "ab") as f:
+            f.write(b"1")
+        prober.probe(media)
+
+        assert invoke.call_count == 2
+
+    def test_should_refresh_once_per_run(
+        self, mocker: MockFixture, prober: Prober, media: str
+    ) -> None:
+        invoke = mocker.patch.object(Prober, "invoke", return_value={"streams": []})
+        prober.probe(media)
+
+        prober.set_refresh(True)
+        prober.probe(media)
+        prober.probe(media)
+
+        assert invoke.call_count == 2
+
+    def test_should_not_probe_missing_file(
+        self, mocker: MockFixture, prober: Prober
+    ) -> None:
+        invoke = mocker.patch.object(Prober, "invoke")
+
+        assert prober.probe(os.path.join("not", "exists.mp4")) == {}
+        invoke.assert_not_called()
+
+
+class TestProbeBackend:
+    def test_should_fallback_on_error(self, mocker: MockFixture) -> None:
+        primary = mocker.MagicMock()
+        primary.probe.side_effect = RuntimeError("unsupported")
+        fallback = mocker.MagicMock()
+        fallback.probe.return_value = {"streams": [{"codec_name": "h264"}]}
+        backend = FallbackProbeBackend(primary, fallback)
+
+        actual = backend.probe("1.mp4")
+
+        assert actual["streams"][0]["codec_name"] == "h264"
+
+    def test_should_use_subprocess_without_pyav(self, mocker: MockFixture) -> None:
+        mocker.patch.object(probe, "av", None)
+
+        assert isinstance(create_backend("auto"), SubprocessProbeBackend)
+        assert isinstance(create_backend("pyav"), SubprocessProbeBackend)
+
+    def test_should_prefer_pyav(self, mocker: MockFixture) -> None:
+        mocker.patch.object(probe, "av", mocker.MagicMock())
+
+        actual = create_backend("auto")
+
+        assert isinstance(actual, FallbackProbeBackend)
+        assert isinstance(actual.primary, PyAVProbeBackend)
@@ -0,0 +1,51 @@
+from app.modules.video.refiner import BiliBiliEf2Refiner
+from app.modules.video.types import MergeManagerOptions
+
+EPISODE = """<
+https://upos.example.com/a/b/123-1-30080.m4s?e=ig8euxZM&deadline=1
+ referer: https://www.bilibili.com
+ User-Agent: Mozilla/5.0 (X11; Linux x86_64)
+ filename: Title 01.mp4
+>
+"""
+
+
+class TestBiliBiliEf2Refiner:
+    def test_should_parse_episode_fields(self, tmp_path) -> None:
+        path = tmp_path / "list.ef2"
+        path.write_text(EPISODE * 3, encoding="utf-8")
+        options = MergeManagerOptions(video_input="in", output="out")
+
+        infos = list(BiliBiliEf2Refiner().parse(str(path), options))
+
+        assert len(infos) == 3
+        assert infos[0].link.startswith("https://upos.example.com/a/b/")
+        assert infos[0].referer == "https://www.bilibili.com"
+        assert infos[0].user_agent == "Mozilla/5.0 (X11; Linux x86_64)"
+        assert infos[0].filename == "Title 01.mp4"
+        assert infos[0].download_name == "123-1-30080.mp4"
+        assert infos[0].output == "out"
+
+    def test_should_parse_lazily(self, tmp_path) -> None:
+        path = tmp_path / "list.ef2"
+        path.write_text(EPISODE * 2, encoding="utf-8")
+
+        infos = BiliBiliEf2Refiner().parse(str(path), MergeManagerOptions())
+
+        assert next(infos).filename == "Title 01.mp4"
+        assert len(list(infos)) == 1
+
+    def test_should_default_missing_fields(self) -> None:
+        infos = BiliBiliEf2Refiner().refine(
+            "noise <\nfilename: a.mp4\n> <\n>", MergeManagerOptions()
+        )
+
+        assert [info.filename for info in infos] == ["a.mp4", ""]
+        assert infos[0].link == ""
+        assert infos[0].download_name == ""
+
+    def test_should_handle_empty_file(self, tmp_path) -> None:
+        path = tmp_path / "empty.ef2"
+        path.write_bytes(b"")
+
+        assert list(BiliBiliEf2Refiner().parse(str(path), MergeManagerOptions())) == []
@@ -0,0 +1,47 @@
+from app.modules.video.remux import RemuxPlanner
+
+
+def probe(*streams: tuple[str, str]) -> dict:
+    return {
+        "streams": [
+            {"index": i, "codec_type": kind, "codec_name": name}
+            for i, (kind, name) in enumerate(streams)
+        ]
+    }
+
+
+class TestRemuxPlanner:
+    def test_should_copy_compatible_streams(self) -> None:
+        planner = RemuxPlanner()
+
+        actual = planner.plan(probe(("video", "h264"), ("audio", "aac")), "mp4")
+
+        assert actual.copy_video and actual.copy_audio
+        assert actual.remux
+
+    def test_should_transcode_only_incompatible_stream(self) -> None:
+        planner = RemuxPlanner()
+
+        actual = planner.plan(probe(("video", "h264"), ("audio", "opus")), "mp4")
+
+        assert actual.copy_video
+        assert not actual.copy_audio
+        assert not actual.remux
+
+    def test_should_skip_cover_art(self) -> None:
+        planner = RemuxPlanner()
+
+        actual = planner.plan(
+            probe(("video", "mjpeg"), ("video", "hevc"), ("audio", "aac")), "mp4"
+        )
+
+        assert actual.video_index == 1
+        assert actual.video_codec == "hevc"
+        assert actual.copy_video
+
+    def test_should_transcode_unknown_container(self) -> None:
+        planner = RemuxPlanner()
+
+        actual = planner.plan(probe(("video", "h264"), ("audio", "aac")), "avi")
+
+        assert not actual.copy_video and not actual.copy_audio
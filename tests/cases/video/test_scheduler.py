@@ -0,0 +1,127 @@
+import threading
+import time
+import typing as t
+
+from app.modules.video.scheduler import DeviceLimiter, JobScheduler
+
+
+class TestJobScheduler:
+    def test_should_run_encodes_concurrently(self) -> None:
+        barrier = threading.Barrier(2, timeout=5)
+
+        def encode(slot: int) -> bool:
+            barrier.wait()
+            return True
+
+        with JobScheduler(2) as scheduler:
+            for i in range(2):
+                scheduler.submit(str(i), encode, lambda encoded: encoded)
+
+        assert scheduler.stats.succeeded == 2
+
+    def test_should_bound_running_slots(self) -> None:
+        lock = threading.Lock()
+        running: list[int] = []
+        peak: list[int] = [0]
+        slots: set[int] = set()
+
+        def encode(slot: int) -> bool:
+            with lock:
+                running.append(slot)
+                slots.add(slot)
+                peak[0] = max(peak[0], len(running))
+            time.sleep(0.01)
+            with lock:
+                running.remove(slot)
+            return True
+
+        with JobScheduler(2) as scheduler:
+            for i in range(8):
+                scheduler.submit(str(i), encode, lambda encoded: encoded)
+
+        assert peak[0] <= 2
+        assert slots <= {0, 1}
+
+    def test_should_finish_outside_encode_slot(self) -> None:
+        names: list[str] = []
+
+        def finish(encoded: bool) -> bool:
+            names.append(threading.current_thread().name)
+            return encoded
+
+        with JobScheduler(2) as scheduler:
+            scheduler.submit("1", lambda slot: True, finish)
+
+        assert names[0].startswith("finish")
+
+    def test_should_count_failures(self) -> None:
+        finished: list[bool] = []
+
+        def encode(slot: int) -> bool:
+            raise RuntimeError("boom")
+
+        def finish(encoded: bool) -> bool:
+            finished.append(encoded)
+            return True
+
+        with JobScheduler() as scheduler:
+            scheduler.submit("1", encode, finish)
+            scheduler.submit("2", lambda slot: True, finish)
+
+        assert sorted(finished) == [False, True]
+        assert scheduler.stats.succeeded == 1
+        assert scheduler.stats.failed == 1
+
+    def test_should_limit_jobs_per_device(self) -> None:
+        lock = threading.Lock()
+        running: dict[int, int] = {1: 0, 2: 0}
+        peak: dict[int, int] = {1: 0, 2: 0}
+
+        def encode(dev: int) -> t.Callable[[int], bool]:
+            def run(slot: int) -> bool:
+                with lock:
+                    running[dev] += 1
+                    peak[dev] = max(peak[dev], running[dev])
+                time.sleep(0.01)
+                with lock:
+                    running[dev] -= 1
+                return True
+
+            return run
+
+        limiter = DeviceLimiter(lambda dev: 1 if dev == 1 else 0)
+        with JobScheduler(3, limiter=limiter) as scheduler:
+            for i in range(4):
+                scheduler.submit(f"hdd{i}", encode(1), lambda e: e, (1,))
+            for i in range(4):
+                scheduler.submit(f"ssd{i}", encode(2), lambda e: e, (2,))
+
+        assert scheduler.stats.succeeded == 8
+        assert peak[1] == 1
+        assert peak[2] >= 2
+
+    def test_should_not_block_behind_busy_device(self) -> None:
+        order: list[str] = []
+        release = threading.Event()
+
+        def slow(slot: int) -> bool:
+            release.wait(5)
+            order.append("slow")
+            return True
+
+        def fast(name: str) -> t.Callable[[int], bool]:
+            def run(slot: int) -> bool:
+                order.append(name)
+                return True
+
+            return run
+
+        limiter = DeviceLimiter(lambda dev: 1)
+        with JobScheduler(2, limiter=limiter) as scheduler:
+            scheduler.submit("a", slow, lambda e: e, (1,))
+            scheduler.submit("b", fast("b"), lambda e: e, (1,))
+            scheduler.submit("c", fast("c"), lambda e: e, (2,))
+            time.sleep(0.1)
+            release.set()
+
+        assert order == ["c", "slow", "b"]
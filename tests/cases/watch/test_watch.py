@@ -0,0 +1,106 @@
+import os
+
+import pytest
+
+from app.core.watch import (
+    IN_Q_OVERFLOW,
+    Debouncer,
+    InotifyWatcher,
+    PollingWatcher,
+)
+
+
+def write(path, data: bytes = b"0") -> None:
+    with open(path, "ab") as f:
+        f.write(data)
+
+
+class TestDebouncer:
+    def test_should_wait_until_file_settles(self, tmp_path) -> None:
+        path = str(tmp_path / "1.mp4")
+        write(path)
+        debouncer = Debouncer(5)
+
+        debouncer.add(path, now=0)
+        assert debouncer.ready(now=3) == []
+        assert debouncer.ready(now=5) == [path]
+        assert debouncer.ready(now=10) == []
+
+    def test_should_restart_when_growing(self, tmp_path) -> None:
+        path = str(tmp_path / "1.mp4")
+        write(path)
+        debouncer = Debouncer(5)
+        debouncer.add(path, now=0)
+
+        write(path)
+
+        assert debouncer.ready(now=6) == []
+        assert debouncer.ready(now=11) == [path]
+
+    def test_should_drop_removed_file(self, tmp_path) -> None:
+        path = str(tmp_path / "1.mp4")
+        write(path)
+        debouncer = Debouncer(0)
+        debouncer.add(path, now=0)
+
+        os.remove(path)
+
+        assert debouncer.ready(now=1) == []
+        assert debouncer.pending == {}
+
+
+class TestPollingWatcher:
+    def test_should_report_new_and_modified_files(self, tmp_path) -> None:
+        write(tmp_path / "old.mp4")
+        watcher = PollingWatcher(str(tmp_path))
+
+        write(tmp_path / "old.mp4")
+        os.makedirs(tmp_path / "sub")
+        write(tmp_path / "sub" / "new.mp4")
+        write(tmp_path / ".hidden.mp4")
+
+        actual = watcher.poll(0)
+
+        assert sorted(os.path.relpath(p, tmp_path) for p in actual) == [
+            "old.mp4",
+            os.path.join("sub", "new.mp4"),
+        ]
+
+
+@pytest.mark.skipif(not InotifyWatcher.is_available(), reason="inotify only")
+class TestInotifyWatcher:
+    def test_should_report_files_in_new_folders(self, tmp_path) -> None:
+        watcher = InotifyWatcher(str(tmp_path))
+        try:
+            write(tmp_path / "1.mp4")
+            os.makedirs(tmp_path / "sub")
+            write(tmp_path / "sub" / "2.mp4")
+            os.makedirs(tmp_path / ".segments")
+            write(tmp_path / ".segments" / "3.mkv")
+
+            actual: set[str] = set()
+            for _ in range(5):
+                actual.update(watcher.poll(0.1))
+                write(tmp_path / "sub" / "2.mp4")
+        finally:
+            watcher.close()
+
+        assert {os.path.relpath(p, tmp_path) for p in actual} == {
+            "1.mp4",
+            os.path.join("sub", "2.mp4"),
+        }
+
+    def test_should_rescan_on_queue_overflow(self, tmp_path) -> None:
+        write(tmp_path / "1.mp4")
+        os.makedirs(tmp_path / "sub")
+        write(tmp_path / "sub" / "2.mp4")
+        watcher = InotifyWatcher(str(tmp_path))
+        try:
+            actual = watcher.parse(InotifyWatcher._event.pack(-1, IN_Q_OVERFLOW, 0, 0))
+        finally:
+            watcher.close()
+
+        assert sorted(os.path.relpath(p, tmp_path) for p in actual) == [
+            "1.mp4",
+            os.path.join("sub", "2.mp4"),
+        ]